@@ -1,3 +1,6 @@
+import 'dart:convert';
+import 'package:http/http.dart' as http;
+
 class SearchService {
   List<String> search(String query) {
     // For now, mock results
@@ -8,4 +11,29 @@ class SearchService {
       "Quantum Display Review: $query"
     ];
   }
+
+  // Streams events from POST /search/stream (NDJSON, one event per line):
+  // classification -> improved_query -> result (one per hit) -> done,
+  // or invalid / error. Lets the UI render the first result early.
+  Stream<Map<String, dynamic>> searchStream(String baseUrl, String query) async* {
+    final client = http.Client();
+    try {
+      final request = http.Request('POST', Uri.parse('$baseUrl/search/stream'))
+        ..headers['Content-Type'] = 'application/json'
+        ..body = jsonEncode({"query": query});
+      final response = await client.send(request);
+      if (response.statusCode != 200) {
+        throw Exception("Server returned ${response.statusCode}");
+      }
+      final lines = response.stream
+          .transform(utf8.decoder)
+          .transform(const LineSplitter());
+      await for (final line in lines) {
+        if (line.trim().isEmpty) continue;
+        yield jsonDecode(line) as Map<String, dynamic>;
+      }
+    } finally {
+      client.close();
+    }
+  }
 }
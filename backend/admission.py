@@ -0,0 +1,185 @@
+"""Admission control: per-client rate limits and a bounded, prioritised queue.
+
+Requests hold one of `max_active` slots while the pipeline runs. Beyond
+that they wait in a queue of at most `max_queue`, ordered by priority
+(lower first), and give up after `queue_timeout` seconds. Shed requests get
+an Overloaded error carrying a Retry-After hint instead of timing out late.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+
+import config
+from metrics import Counter, Gauge
+
+# Request priorities, cheapest first
+CHEAP = 0        # answerable from keywords and caches alone
+STANDARD = 1     # verdict known locally, still needs improve / search
+EXPENSIVE = 2    # needs a Gemini verdict, or is a whole batch
+
+ADMISSION_QUEUED = Gauge("techsearch_admission_queued", "Requests waiting for a pipeline slot")
+ADMISSION_ACTIVE = Gauge("techsearch_admission_active", "Requests holding a pipeline slot")
+ADMISSION_SHED = Counter("techsearch_admission_shed_total", "Requests refused by admission control", ("reason",))
+
+
+class Overloaded(Exception):
+    def __init__(self, reason, retry_after, status_code):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class RateLimiter:
+    """Token bucket per client: `rate` requests/s sustained, `burst` at once"""
+
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_clients = max_clients
+        # client -> (tokens, last refill); least recently seen first
+        self._buckets = OrderedDict()
+        self.limited = 0
+
+    def check(self, client):
+        """Takes a token; raises Overloaded (429) when the client is out"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[client] = (tokens, now)
+            self.limited += 1
+            ADMISSION_SHED.inc("rate_limited")
+            raise Overloaded("Rate limit exceeded", math.ceil((1 - tokens) / self.rate), 429)
+        self._buckets[client] = (tokens - 1, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "clients": len(self._buckets),
+            "limited": self.limited,
+        }
+
+
+class AdmissionController:
+    def __init__(self, max_active, max_queue, queue_timeout):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        # (priority, seq, future); futures that are done are skipped
+        self._waiters = []
+        self._seq = itertools.count()
+        # Smoothed time a request holds its slot, for Retry-After
+        self._hold_time = 0.5
+        self.admitted = 0
+        self.bypassed = 0
+        self.shed = {"queue_full": 0, "queue_timeout": 0, "displaced": 0}
+
+    def retry_after(self):
+        backlog = (self.queued + 1) / max(1, self.max_active)
+        return max(1, math.ceil(backlog * self._hold_time))
+
+    def _shed(self, reason):
+        self.shed[reason] += 1
+        ADMISSION_SHED.inc(reason)
+        return Overloaded("Server overloaded, try again later", self.retry_after(), 503)
+
+    def _displace(self, priority):
+        """Drops the worst queued waiter if it ranks below `priority`"""
+        live = [w for w in self._waiters if not w[2].done()]
+        if not live:
+            return False
+        worst = max(live)
+        if worst[0] <= priority:
+            return False
+        worst[2].set_exception(self._shed("displaced"))
+        self.queued -= 1
+        return True
+
+    async def acquire(self, priority):
+        if self.active < self.max_active and self.queued == 0:
+            self.active += 1
+            return
+        if self.queued >= self.max_queue and not self._displace(priority):
+            raise self._shed("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        self.queued += 1
+        ADMISSION_QUEUED.set(self.queued)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.queued -= 1
+            raise self._shed("queue_timeout")
+        except asyncio.CancelledError:
+            if not waiter.done() or waiter.cancelled():
+                self.queued -= 1
+            elif waiter.exception() is None:
+                # Slot was handed over just as the caller went away
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                # Hand the slot straight to the best waiter
+                self.queued -= 1
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    async def enter(self, priority):
+        """Waits for a slot; returns a ticket for leave(). CHEAP requests skip the queue."""
+        if priority == CHEAP or self.max_active <= 0:
+            self.bypassed += 1
+            return None
+        await self.acquire(priority)
+        self.admitted += 1
+        ADMISSION_QUEUED.set(self.queued)
+        ADMISSION_ACTIVE.set(self.active)
+        return time.monotonic()
+
+    def leave(self, ticket):
+        if ticket is None:
+            return
+        self._hold_time = 0.9 * self._hold_time + 0.1 * (time.monotonic() - ticket)
+        self.release()
+        ADMISSION_QUEUED.set(self.queued)
+        ADMISSION_ACTIVE.set(self.active)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "max_active": self.max_active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "admitted": self.admitted,
+            "bypassed": self.bypassed,
+            "shed": dict(self.shed),
+            "retry_after": self.retry_after(),
+        }
+
+
+ADMISSION = AdmissionController(
+    max_active=config.ADMISSION_MAX_ACTIVE,
+    max_queue=config.ADMISSION_MAX_QUEUE,
+    queue_timeout=config.ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+)
+RATE_LIMITER = RateLimiter(
+    rate=config.RATE_LIMIT_PER_S,
+    burst=config.RATE_LIMIT_BURST,
+    max_clients=config.RATE_LIMIT_MAX_CLIENTS,
+)
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from metrics import Counter, Gauge
+from resilience import ResilientCaller
+from langchain_logic import (
+    API_KEY, GEMINI_HEADERS, GEMINI_URL, batch_classify_prompt, classify_prompt, gemini_payload, gemini_text,
+    iter_ddg, parse_batch_classification, parse_classification,
+)
+
+logger = logging.getLogger("TechSearch")
+
+ORPHANED_CALLS = Counter(
+    "techsearch_orphaned_blocking_calls_total", "Blocking calls whose caller gave up while the thread ran on",
+    ("call",),
+)
+ORPHANS_RUNNING = Gauge("techsearch_orphaned_blocking_calls", "Abandoned blocking calls still holding a worker")
+BLOCKING_STATS = {"calls": 0, "orphaned": 0, "orphans_running": 0}
+
+# --- SHARED CLIENTS ---
+# Opened once at app startup and closed at shutdown (see main.lifespan)
+_client = None
+_executor = None
+_search_slots = None
+
+# Breaker, adaptive timeout and hedging for every Gemini call
+GEMINI_GUARD = ResilientCaller(
+    "gemini",
+    max_timeout=config.GEMINI_TIMEOUT,
+    min_timeout=config.GEMINI_MIN_TIMEOUT,
+    timeout_multiplier=config.GEMINI_TIMEOUT_MULTIPLIER,
+    adaptive=config.GEMINI_ADAPTIVE_TIMEOUT,
+    window=config.GEMINI_LATENCY_WINDOW,
+    min_samples=config.GEMINI_MIN_SAMPLES,
+    failure_threshold=config.GEMINI_BREAKER_FAILURES,
+    reset_timeout=config.GEMINI_BREAKER_RESET,
+    hedge=config.GEMINI_HEDGE_ENABLED,
+    hedge_percentile=config.GEMINI_HEDGE_PERCENTILE,
+    hedge_min_delay=config.GEMINI_HEDGE_MIN_DELAY_MS / 1000,
+    hedge_max_ratio=config.GEMINI_HEDGE_MAX_RATIO,
+)
+
+
+async def startup():
+    """Opens the pooled Gemini client and the DDG worker pool"""
+    global _client, _executor, _search_slots
+    if _client is None:
+        # Imported here so it counts against the lifespan, not module import
+        import httpx
+        # Key goes in a header so it never shows up in logged request URLs
+        _client = httpx.AsyncClient(
+            headers={**GEMINI_HEADERS, "x-goog-api-key": API_KEY or ""},
+            timeout=config.GEMINI_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=config.SEARCH_WORKERS, thread_name_prefix="ddg")
+        # Callers wait here instead of piling up in the executor's queue
+        _search_slots = asyncio.Semaphore(config.SEARCH_WORKERS)
+
+
+async def shutdown():
+    """Closes pooled connections and stops the DDG workers"""
+    global _client, _executor, _search_slots
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _search_slots = None
+
+
+async def _ensure_started():
+    # Lets the engine be used outside the app lifespan (scripts, REPL)
+    if _client is None or _executor is None:
+        await startup()
+
+
+# --- ASYNC PIPELINE STAGES ---
+async def _post_gemini(prompt, timeout, json_output=False):
+    response = await _client.post(GEMINI_URL, json=gemini_payload(prompt, json_output), timeout=timeout)
+    response.raise_for_status()
+    return gemini_text(response.json())
+
+
+async def call_gemini_async(prompt, json_output=False):
+    """Async twin of call_gemini; same "ERROR: ..." contract on failure.
+
+    Fails fast with "ERROR: gemini circuit open" while the breaker is open.
+    json_output asks Gemini for a JSON response (responseMimeType).
+    """
+    await _ensure_started()
+    try:
+        return await GEMINI_GUARD.call(lambda timeout: _post_gemini(prompt, timeout, json_output))
+    except Exception as e:
+        return f"ERROR: {str(e)}"
+
+
+async def _classify_one(query):
+    raw = await call_gemini_async(classify_prompt(query))
+    return None if raw.startswith("ERROR") else parse_classification(raw)
+
+
+async def classify_batch_async(queries):
+    """Labels many queries with one Gemini call; None marks a failed label"""
+    unique = list(dict.fromkeys(queries))
+    if len(unique) == 1:
+        labels = [await _classify_one(unique[0])]
+    else:
+        raw = await call_gemini_async(batch_classify_prompt(unique))
+        if raw.startswith("ERROR"):
+            labels = [None] * len(unique)
+        else:
+            labels = parse_batch_classification(raw, len(unique))
+            if labels is None:
+                # Model ignored the format: fall back to one call per query
+                logger.warning(f"Unparseable batch answer for {len(unique)} queries")
+                labels = await asyncio.gather(*(_classify_one(q) for q in unique))
+    by_query = dict(zip(unique, labels))
+    return [by_query[q] for q in queries]
+
+
+async def run_blocking(fn, *args, slots=None):
+    """Runs blocking work on the bounded worker pool.
+
+    The worker slot, and the `slots` semaphore if given, are held until the
+    thread finishes rather than until the caller stops waiting: cancelling
+    the caller cannot stop a thread blocked on DDG, so releasing early
+    would let abandoned calls pile up past SEARCH_WORKERS. Such calls are
+    counted as orphaned until their thread returns.
+    """
+    await _ensure_started()
+    loop = asyncio.get_running_loop()
+    held = []
+    try:
+        for slot in (_search_slots, slots):
+            if slot is not None:
+                await slot.acquire()
+                held.append(slot)
+        future = _executor.submit(fn, *args)
+    except BaseException:
+        for slot in held:
+            slot.release()
+        raise
+    BLOCKING_STATS["calls"] += 1
+    orphaned = []
+
+    def release():
+        for slot in held:
+            slot.release()
+        if orphaned:
+            BLOCKING_STATS["orphans_running"] -= 1
+            ORPHANS_RUNNING.dec()
+
+    def finished(_):
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            pass  # Loop already closed; nothing is waiting on the slots
+
+    future.add_done_callback(finished)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # A queued call is simply dropped; a running one carries on alone
+        if not future.cancel() and not future.done():
+            orphaned.append(True)
+            BLOCKING_STATS["orphaned"] += 1
+            BLOCKING_STATS["orphans_running"] += 1
+            ORPHANED_CALLS.inc(getattr(fn, "__name__", "call"))
+            ORPHANS_RUNNING.inc()
+        raise
+
+
+def blocking_stats():
+    return {**BLOCKING_STATS, "workers": config.SEARCH_WORKERS}
+
+
+async def stream_blocking(make_iter, *args):
+    """Drains a blocking iterator on the worker pool, yielding items as they arrive.
+
+    When the consumer stops early (client gone, deadline), the worker stops
+    pulling at its next item and closes the iterator, freeing the thread.
+    """
+    await _ensure_started()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        iterator = make_iter(*args)
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    job = asyncio.ensure_future(run_blocking(produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        if not job.done():
+            job.cancel()
+
+
+async def search_ddg_stream(query):
+    """Async twin of search_ddg that yields each result as DDGS returns it"""
+    try:
+        async for result in stream_blocking(iter_ddg, query):
+            yield result
+    except Exception as e:
+        # Same contract as search_ddg: a failed search just ends early
+        logger.error(f"DDG Search Error: {e}")
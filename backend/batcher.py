@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+logger = logging.getLogger("TechSearch")
+
+
+class MicroBatcher:
+    """Collects items for up to `window` seconds or `max_batch` items and
+    hands them to one async `handler(items) -> results` call.
+
+    Each submit() waits for its own result; a handler failure is raised in
+    every waiter of that batch. A waiter that gives up (is cancelled) simply
+    drops out; the rest of its batch is unaffected.
+    """
+
+    def __init__(self, handler, max_batch, window):
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.window = window
+        self._pending = []
+        self._timer = None
+        self._running = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [(item, future) for item, future in self._pending if not future.done()]
+        self._pending = []
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        task = asyncio.create_task(self._run(batch))
+        # Hold a reference so the task is not garbage collected mid-flight
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "window_ms": round(self.window * 1000, 3),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0,
+            "largest_batch": self.largest_batch,
+            "pending": len(self._pending),
+        }
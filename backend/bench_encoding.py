@@ -0,0 +1,83 @@
+"""Benchmark: CPU and bytes per /search response, old encoding vs new.
+
+Builds representative /search bodies (N results with realistic snippets)
+and compares, per response:
+  - serialisation: FastAPI's jsonable_encoder + stdlib JSONResponse.render
+    (what a returned dict used to go through) vs responses.json_bytes;
+  - size on the wire: identity vs gzip (and brotli, if installed), with the
+    CPU each compression costs.
+
+Usage:
+    python bench_encoding.py [--results 5,10,25] [--snippet 300] [--iterations 2000]
+"""
+import argparse
+import random
+import string
+import time
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+import config
+from responses import brotli, compress, json_bytes, orjson
+
+
+def make_response(results, snippet_length, rng):
+    def text(n):
+        words = []
+        while sum(len(w) + 1 for w in words) < n:
+            words.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10))))
+        return " ".join(words)[:n]
+
+    items = [
+        {"title": text(60), "snippet": text(snippet_length), "url": f"https://example.com/{text(30).replace(' ', '/')}"}
+        for _ in range(results)
+    ]
+    return {
+        "status": "success",
+        "query_type": "TECH",
+        "original_query": "pls help python list index out of range in for loop",
+        "improved_query": "python list index out of range for loop",
+        "results": items,
+        "count": len(items),
+        "llm_path": "combined",
+    }
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response encoding benchmark")
+    parser.add_argument("--results", default="5,10,25")
+    parser.add_argument("--snippet", type=int, default=300, help="Characters per snippet")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    print(f"orjson={'yes' if orjson else 'no'}  brotli={'yes' if brotli else 'no'}")
+
+    for count in (int(n) for n in args.results.split(",")):
+        content = make_response(count, args.snippet, rng)
+        stdlib = JSONResponse(None)
+        old_us = per_call_us(lambda: stdlib.render(jsonable_encoder(content)), args.iterations)
+        new_us = per_call_us(lambda: json_bytes(content), args.iterations)
+        body = json_bytes(content)
+        line = (f"results={count:<3} serialise old={old_us:7.1f}us new={new_us:6.1f}us ({old_us / new_us:4.1f}x)  "
+                f"identity={len(body):6d}B")
+        for encoding in ("gzip", "br") if brotli else ("gzip",):
+            size = len(compress(body, encoding, config.COMPRESSION_GZIP_LEVEL, config.COMPRESSION_BROTLI_QUALITY))
+            cost = per_call_us(
+                lambda: compress(body, encoding, config.COMPRESSION_GZIP_LEVEL, config.COMPRESSION_BROTLI_QUALITY),
+                max(1, args.iterations // 4),
+            )
+            line += f"  {encoding}={size:6d}B ({size / len(body):.0%}, {cost:6.1f}us)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
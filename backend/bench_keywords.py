@@ -0,0 +1,94 @@
+"""Micro-benchmark: linear keyword scan vs the compiled KeywordMatcher.
+
+Grows a synthetic taxonomy from the real keyword lists into the thousands
+and reports matcher throughput (queries/sec) at each size.
+
+Usage:
+    python bench_keywords.py [--sizes 300,1000,3000,10000] [--queries 2000]
+"""
+import argparse
+import random
+import string
+import time
+
+from keyword_matcher import KeywordMatcher
+from langchain_logic import NON_TECH_KEYWORDS, TECH_KEYWORDS
+
+SAMPLE_QUERIES = [
+    "Samsung flash ROM",
+    "how to fix python import error in docker container",
+    "best pasta recipe for dinner",
+    "why is my laptop fan so loud when idle",
+    "kubernetes pod stuck in crashloopbackoff",
+    "cheap hotel near the beach",
+    "what does this stack trace mean",
+    "history of the roman empire",
+]
+
+
+def _synthetic_keywords(count, rng):
+    words = []
+    while len(words) < count:
+        size = rng.randint(3, 10)
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(size))
+        if rng.random() < 0.2:
+            word += " " + "".join(rng.choice(string.ascii_lowercase) for _ in range(4))
+        words.append(word)
+    return words
+
+
+def _build_taxonomy(size, rng):
+    base_tech = list(dict.fromkeys(TECH_KEYWORDS))
+    base_non_tech = list(dict.fromkeys(NON_TECH_KEYWORDS))
+    extra = max(0, size - len(base_tech) - len(base_non_tech))
+    filler = _synthetic_keywords(extra, rng)
+    half = len(filler) // 2
+    return base_non_tech + filler[:half], base_tech + filler[half:]
+
+
+def _linear_classify(query, non_tech, tech):
+    # The pre-matcher implementation: a substring scan per keyword
+    q = query.lower().strip()
+    for word in non_tech:
+        if word in q:
+            return "NON_TECH"
+    for word in tech:
+        if word in q:
+            return "TECH"
+    return None
+
+
+def _throughput(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    elapsed = time.perf_counter() - start
+    return len(queries) / elapsed, elapsed / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="300,1000,3000,10000")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    queries = [rng.choice(SAMPLE_QUERIES) for _ in range(args.queries)]
+
+    print(f"{'keywords':>9} {'build ms':>9} {'linear q/s':>12} {'matcher q/s':>12} {'matcher us/q':>13} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        non_tech, tech = _build_taxonomy(size, rng)
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher({"NON_TECH": non_tech, "TECH": tech})
+        build_ms = (time.perf_counter() - start) * 1000
+
+        linear_qps, _ = _throughput(lambda q: _linear_classify(q, non_tech, tech), queries)
+        matcher_qps, matcher_us = _throughput(matcher.classify, queries)
+        print(f"{matcher.size:>9} {build_ms:>9.1f} {linear_qps:>12.0f} {matcher_qps:>12.0f} "
+              f"{matcher_us:>13.1f} {matcher_qps / linear_qps:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
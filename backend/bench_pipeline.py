@@ -0,0 +1,276 @@
+"""Offline benchmark of the full /search pipeline.
+
+Starts the fake Gemini and DuckDuckGo servers from fakes.py plus the real
+FastAPI app as local subprocesses, drives /search at several concurrency
+levels with a configurable query mix, and writes latency percentiles,
+throughput and per-stage upstream call counts to JSON. No network needed.
+The app is restarted before each level, so every level starts on cold
+in-process caches (anything persisted via --env paths survives).
+
+Usage:
+    python bench_pipeline.py --concurrency 1,8,32 --requests 300 \\
+        --mix keyword=0.5,ambiguous=0.3,non_tech=0.2 \\
+        --gemini-latency 300 --ddg-latency 400 --out bench_results.json
+    python bench_pipeline.py --env SPECULATIVE_MODE=full --compare bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Query pools per mix bucket; repeats are deliberate (head queries)
+QUERY_POOLS = {
+    "keyword": [
+        "python list comprehension", "docker container keeps restarting", "flutter hot reload not working",
+        "linux kernel panic on boot", "git merge conflict", "postgresql index slow", "android adb device offline",
+    ],
+    "ambiguous": [
+        "my laptop is very slow after update", "phone battery drains overnight", "printer says offline",
+        "why do magnets stick to fridges", "how do tides work", "best way to learn chess openings",
+    ],
+    "non_tech": [
+        "how to cook rice", "cheap hotel near the beach", "best football match ever", "chocolate cake recipe",
+    ],
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start(app, port, env, log):
+    cmd = [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=HERE, env={**os.environ, **env}, stdout=log, stderr=log)
+
+
+def _wait_ready(port, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def _parse_pairs(text, cast=str):
+    pairs = {}
+    for item in filter(None, (text or "").split(",")):
+        key, value = item.split("=", 1)
+        pairs[key.strip()] = cast(value)
+    return pairs
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 2)
+
+
+def build_workload(mix, count, unique, rng, first=0):
+    """`count` (bucket, query) pairs; unique suffixes are numbered from `first`"""
+    buckets = list(mix)
+    weights = [mix[b] for b in buckets]
+    workload = []
+    for i in range(first, first + count):
+        bucket = rng.choices(buckets, weights)[0]
+        query = rng.choice(QUERY_POOLS[bucket])
+        if unique:
+            # Defeats every cache so each request pays full upstream cost
+            query = f"{query} {i}"
+        workload.append((bucket, query))
+    return workload
+
+
+async def run_level(client, base_url, workload, concurrency):
+    queue = asyncio.Queue()
+    for item in workload:
+        queue.put_nowait(item)
+    samples = []
+
+    async def worker():
+        while not queue.empty():
+            bucket, query = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/search", json={"query": query})
+                status = response.json().get("status", str(response.status_code)) if response.status_code == 200 else str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            samples.append((bucket, status, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    def summarise(rows):
+        latencies = sorted(r[2] for r in rows)
+        statuses = {}
+        for _, status, _ in rows:
+            statuses[status] = statuses.get(status, 0) + 1
+        return {
+            "requests": len(rows),
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "p99_ms": _percentile(latencies, 99),
+            "max_ms": _percentile(latencies, 100),
+            "statuses": statuses,
+        }
+
+    report = summarise(samples)
+    report["throughput_rps"] = round(len(samples) / wall, 2) if wall else None
+    report["wall_s"] = round(wall, 3)
+    report["by_mix"] = {b: summarise([r for r in samples if r[0] == b]) for b in sorted({r[0] for r in samples})}
+    return report
+
+
+async def run_benchmark(args, gemini_url, ddg_url, app_url, restart_app):
+    rng = random.Random(args.seed)
+    mix = _parse_pairs(args.mix, float)
+    levels = []
+    limits = httpx.Limits(max_connections=max(args.concurrency_levels) * 2)
+    async with httpx.AsyncClient(timeout=args.client_timeout, limits=limits) as client:
+        for index, concurrency in enumerate(args.concurrency_levels):
+            # Cold app per level, so upstream call counts compare across levels
+            await asyncio.to_thread(restart_app)
+            await client.post(f"{gemini_url}/stats/reset")
+            await client.post(f"{ddg_url}/stats/reset")
+            workload = build_workload(mix, args.requests, args.unique, rng, first=index * args.requests)
+            report = await run_level(client, app_url, workload, concurrency)
+            report["concurrency"] = concurrency
+            report["upstream_calls"] = {
+                "gemini": (await client.get(f"{gemini_url}/stats")).json(),
+                "ddg": (await client.get(f"{ddg_url}/stats")).json(),
+            }
+            levels.append(report)
+            print(f"c={concurrency:<4} rps={report['throughput_rps']:<8} p50={report['p50_ms']}ms "
+                  f"p95={report['p95_ms']}ms p99={report['p99_ms']}ms statuses={report['statuses']}")
+    return levels
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    old_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"\nCompared with {baseline_path} (rev {baseline.get('revision')}):")
+    for level in current["levels"]:
+        old = old_levels.get(level["concurrency"])
+        if not old:
+            continue
+        deltas = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if old.get(key) and level.get(key) is not None:
+                deltas.append(f"{key} {(level[key] - old[key]) / old[key] * 100:+.1f}%")
+        print(f"  c={level['concurrency']:<4} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline /search pipeline benchmark")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--mix", default="keyword=0.5,ambiguous=0.3,non_tech=0.2")
+    parser.add_argument("--unique", action="store_true", help="make every query unique (cold caches)")
+    parser.add_argument("--gemini-latency", type=float, default=300.0, help="median ms")
+    parser.add_argument("--gemini-sigma", type=float, default=0.4)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-timeout-rate", type=float, default=0.0)
+    parser.add_argument("--ddg-latency", type=float, default=400.0, help="median ms")
+    parser.add_argument("--ddg-sigma", type=float, default=0.4)
+    parser.add_argument("--ddg-error-rate", type=float, default=0.0)
+    parser.add_argument("--ddg-timeout-rate", type=float, default=0.0)
+    parser.add_argument("--upstream-timeout", type=float, default=15.0, help="how long a fake 'timeout' hangs (s)")
+    parser.add_argument("--client-timeout", type=float, default=60.0)
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the app under test")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    parser.add_argument("--app-log", help="file for server output (default: discarded)")
+    args = parser.parse_args()
+    args.concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+
+    fake_env = {}
+    for prefix, name in (("FAKE_GEMINI", "gemini"), ("FAKE_DDG", "ddg")):
+        fake_env[f"{prefix}_LATENCY_MS"] = str(getattr(args, f"{name}_latency"))
+        fake_env[f"{prefix}_LATENCY_SIGMA"] = str(getattr(args, f"{name}_sigma"))
+        fake_env[f"{prefix}_ERROR_RATE"] = str(getattr(args, f"{name}_error_rate"))
+        fake_env[f"{prefix}_TIMEOUT_RATE"] = str(getattr(args, f"{name}_timeout_rate"))
+        fake_env[f"{prefix}_TIMEOUT_S"] = str(args.upstream_timeout)
+
+    gemini_port, ddg_port, app_port = _free_port(), _free_port(), _free_port()
+    gemini_url = f"http://127.0.0.1:{gemini_port}"
+    ddg_url = f"http://127.0.0.1:{ddg_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    app_env = {
+        "GEMINI_URL": f"{gemini_url}/generate",
+        "DDG_URL": f"{ddg_url}/search",
+        "GEMINI_API_KEY": "offline-benchmark",
+        # Every bench client is 127.0.0.1; measure the pipeline, not the shedding
+        "RATE_LIMIT_PER_S": "0",
+        "ADMISSION_MAX_ACTIVE": "0",
+        **{k: v for k, v in (item.split("=", 1) for item in args.env)},
+    }
+
+    log = open(args.app_log, "w") if args.app_log else subprocess.DEVNULL
+    processes = [
+        _start("fakes:gemini_app", gemini_port, fake_env, log),
+        _start("fakes:ddg_app", ddg_port, fake_env, log),
+    ]
+
+    def restart_app():
+        # The app is always last in processes, after the two fakes
+        if len(processes) > 2:
+            app = processes.pop()
+            app.terminate()
+            app.wait(timeout=10)
+        processes.append(_start("main:app", app_port, app_env, log))
+        _wait_ready(app_port)
+
+    try:
+        for port in (gemini_port, ddg_port):
+            _wait_ready(port)
+        levels = asyncio.run(run_benchmark(args, gemini_url, ddg_url, app_url, restart_app))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+        if args.app_log:
+            log.close()
+
+    result = {
+        "revision": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+        "app_env": {k: v for k, v in app_env.items() if k != "GEMINI_API_KEY"},
+        "levels": levels,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved results to {args.out}")
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: cache hit rate and latency with 1, 4 and 16 worker processes.
+
+Simulates uvicorn workers as separate processes, each serving its share of
+one Zipf-distributed query stream through a TieredCache (miss -> "fetch"
+-> set). Run once with private memory caches, as every worker has today,
+and once with the shared SQLite tier (SHARED_CACHE_PATH), then compare the
+overall hit rate and p50 / p99 cache time per request (the lookup, plus the
+write on a miss). Unpaced workers hammer the write lock far harder than
+real traffic does; --rate paces each worker to a realistic request rate.
+
+Usage:
+    python bench_shared_cache.py [--workers 1,4,16] [--requests 40000] [--keys 20000] [--rate 500]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from cache import MISS, TieredCache
+
+
+def zipf_stream(count, keys, skew, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank ** skew) for rank in range(1, keys + 1)]
+    return [f"query {i}" for i in rng.choices(range(keys), weights, k=count)]
+
+
+def worker(queries, db_path, memory_size, rate, start, results):
+    logging.getLogger("TechSearch").setLevel(logging.ERROR)
+    interval = 1.0 / rate if rate > 0 else 0.0
+    cache = TieredCache("search", max_entries=memory_size, ttl=3600, db_path=db_path, db_busy_timeout=0.05)
+    value = [{"title": "t", "snippet": "s" * 200, "url": "https://example.com"}] * 5
+    start.wait()
+    hits, latencies = 0, []
+    for key in queries:
+        tick = time.perf_counter()
+        state, _ = cache.lookup(key)
+        if state == MISS:
+            cache.set(key, value)
+        else:
+            hits += 1
+        elapsed = time.perf_counter() - tick
+        latencies.append(elapsed)
+        if interval:
+            time.sleep(max(0.0, interval - elapsed))
+    errors = cache.disk.errors if cache.disk is not None else 0
+    cache.close()
+    results.put((hits, latencies, errors))
+
+
+def run(workers, stream, shared, memory_size, rate):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "shared.db") if shared else None
+        if db_path:
+            # Create the schema before the workers race to
+            TieredCache("search", 1, 1, db_path=db_path).close()
+        start = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        # Round-robin, like connections spread across workers
+        procs = [
+            multiprocessing.Process(target=worker, args=(stream[i::workers], db_path, memory_size, rate, start, results))
+            for i in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+        tick = time.perf_counter()
+        start.set()
+        outcomes = [results.get() for _ in procs]
+        elapsed = time.perf_counter() - tick
+        for proc in procs:
+            proc.join()
+
+    hits = sum(h for h, _, _ in outcomes)
+    latencies = sorted(x for _, lat, _ in outcomes for x in lat)
+    errors = sum(e for _, _, e in outcomes)
+    print(
+        f"workers={workers:<3} {'shared ' if shared else 'private'}  hit_rate={hits / len(stream):.3f}  "
+        f"p50={latencies[len(latencies) // 2] * 1e6:6.1f}us  p99={latencies[int(len(latencies) * 0.99)] * 1e6:7.1f}us  "
+        f"throughput={len(stream) / elapsed:8.0f}/s  write_errors={errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared cache benchmark across worker processes")
+    parser.add_argument("--workers", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=40000)
+    parser.add_argument("--keys", type=int, default=20000)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--memory-size", type=int, default=2048, help="Per-worker LRU entries (SEARCH_CACHE_SIZE)")
+    parser.add_argument("--rate", type=float, default=0, help="Requests/s per worker; 0 = as fast as possible")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    stream = zipf_stream(args.requests, args.keys, args.skew, args.seed)
+    for workers in (int(w) for w in args.workers.split(",")):
+        for shared in (False, True):
+            run(workers, stream, shared, args.memory_size, args.rate)
+
+
+if __name__ == "__main__":
+    main()
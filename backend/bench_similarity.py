@@ -0,0 +1,79 @@
+"""Micro-benchmark: SimilarityCache lookup latency and recall as it grows.
+
+Fills the cache with synthetic tech-ish queries, then times lookups for
+reworded versions of stored queries (expected hits) and unrelated queries
+(expected misses), reporting p50 / p99 latency and the hit rate.
+
+Usage:
+    python bench_similarity.py [--sizes 10000,100000,300000] [--lookups 5000]
+"""
+import argparse
+import random
+import resource
+import time
+
+from similarity import SimilarityCache
+
+VOCAB = (
+    "python java rust docker kubernetes linux windows android iphone laptop router wifi "
+    "postgres mysql redis nginx apache flutter react django flask git ssh vpn printer "
+    "error crash install update slow memory leak timeout permission denied segfault "
+    "build compile deploy network driver kernel battery screen keyboard bluetooth "
+    "container image port socket certificate proxy cache thread async import module"
+).split()
+# Stop words only, so a rewording keeps exactly the same content words
+FILLER = ["how", "to", "my", "the", "why", "is", "on", "in", "a", "what", "does", "with"]
+
+
+def make_query(rng):
+    words = rng.sample(VOCAB, rng.randint(3, 5)) + rng.sample(FILLER, 2)
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def reword(query, rng):
+    # Same content words, different order and filler
+    words = [w for w in query.split() if w not in FILLER]
+    rng.shuffle(words)
+    return " ".join(rng.sample(FILLER, 2) + words)
+
+
+def run(size, lookups, rng):
+    cache = SimilarityCache(max_entries=size, ttl=3600)
+    queries = [make_query(rng) for _ in range(size)]
+    start = time.perf_counter()
+    for query in queries:
+        cache.remember(query, query, rewrite=query)
+    fill_s = time.perf_counter() - start
+
+    probes = [(reword(rng.choice(queries), rng), True) for _ in range(lookups // 2)]
+    probes += [(" ".join(rng.sample(VOCAB, 4)), False) for _ in range(lookups // 2)]
+    rng.shuffle(probes)
+    latencies, hits = [], 0
+    for query, expected in probes:
+        start = time.perf_counter()
+        found = cache.find(query, "rewrite")
+        latencies.append(time.perf_counter() - start)
+        hits += expected and found is not None
+    latencies.sort()
+    print(
+        f"entries={size:<8} fill={size / fill_s:>9.0f}/s  "
+        f"p50={latencies[len(latencies) // 2] * 1e6:6.1f}us  p99={latencies[int(len(latencies) * 0.99)] * 1e6:6.1f}us  "
+        f"paraphrase_recall={hits / (lookups // 2):.3f}  "
+        f"maxrss={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimilarityCache micro-benchmark")
+    parser.add_argument("--sizes", default="10000,100000,300000")
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    for size in (int(s) for s in args.sizes.split(",")):
+        run(size, args.lookups, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+import asyncio
+import contextvars
+import json
+import logging
+import sqlite3
+import string
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("TechSearch")
+
+# Lookup states reported by TieredCache.lookup
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+# "+" and "#" carry meaning in tech terms (c++, c#), so they are kept
+_EDGE_PUNCTUATION = "".join(ch for ch in string.punctuation if ch not in "+#")
+# Longer queries are not worth a memo slot; it also bounds key memory
+MAX_KEY_LENGTH = 256
+
+
+def canonical_query(query):
+    """Canonical form used as a cache key: "PYTHON  loops?" -> "python loops"
+
+    Returns None for queries too long to be worth caching.
+    """
+    tokens = (token.strip(_EDGE_PUNCTUATION) for token in query.lower().split())
+    key = " ".join(token for token in tokens if token)
+    return key if len(key) <= MAX_KEY_LENGTH else None
+
+
+class LRUCache:
+    """In-process LRU with a per-entry TTL and a hard size bound.
+
+    Each entry is fresh until `ttl` runs out and then stale for another
+    `stale_ttl` seconds; after that it is treated as absent.
+    """
+
+    def __init__(self, max_entries, ttl, stale_ttl=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def lookup(self, key, now=None):
+        """Returns (state, value); value is None on a miss"""
+        now = time.time() if now is None else now
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISS, None
+        value, fresh_until, stale_until = entry
+        if now >= stale_until:
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISS, None
+        self._data.move_to_end(key)
+        if now < fresh_until:
+            self.hits += 1
+            return FRESH, value
+        self.stale_hits += 1
+        return STALE, value
+
+    def peek(self, key):
+        """Value if present and not expired, without touching stats or LRU order"""
+        entry = self._data.get(key)
+        if entry is None or time.time() >= entry[2]:
+            return None
+        return entry[0]
+
+    def set(self, key, value, ttl=None, now=None):
+        now = time.time() if now is None else now
+        fresh_until = now + (self.ttl if ttl is None else ttl)
+        self.put_entry(key, value, fresh_until, fresh_until + self.stale_ttl)
+
+    def put_entry(self, key, value, fresh_until, stale_until):
+        self._data[key] = (value, fresh_until, stale_until)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def stats(self):
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SqliteTier:
+    """Persistent second tier that survives restarts; values are JSON.
+
+    Safe to share between worker processes on one host: WAL lets readers
+    run alongside the single writer, and each put is one atomic statement.
+    Puts and pruning run on a single background thread with their own
+    connection, like LocalIndex, so the event loop never waits on the
+    write lock or an fsync; a put that cannot get the lock within
+    `busy_timeout` seconds, or finds `max_pending` puts queued, is dropped.
+    Reads are WAL point lookups on the caller's connection. Several caches
+    can live in one file, one table each.
+    """
+
+    def __init__(self, path, max_rows, table="cache", busy_timeout=5.0, max_pending=1000):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        self.path = path
+        self.max_rows = max_rows
+        self.table = table
+        self.max_pending = max_pending
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self.dropped = 0
+        self._writes = 0
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._write_conn = self._connect(busy_timeout)
+        self._write_conn.execute("PRAGMA journal_mode=WAL")
+        self._write_conn.execute("PRAGMA synchronous=NORMAL")
+        self._write_conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " fresh_until REAL NOT NULL, stale_until REAL NOT NULL)"
+        )
+        # Keeps prune() from sorting the whole table while holding the write lock
+        self._write_conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_fresh_until ON {table} (fresh_until)")
+        self._conn = self._connect(busy_timeout)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"cache-{table}")
+
+    def _connect(self, busy_timeout):
+        return sqlite3.connect(self.path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+
+    def get(self, key, now=None):
+        """Returns (value, fresh_until, stale_until) or None"""
+        now = time.time() if now is None else now
+        row = None
+        if self._conn is not None:
+            try:
+                row = self._conn.execute(
+                    f"SELECT value, fresh_until, stale_until FROM {self.table} WHERE key = ? AND stale_until > ?",
+                    (key, now),
+                ).fetchone()
+            except sqlite3.Error as e:
+                self._failed("read", e)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), row[1], row[2]
+
+    def put(self, key, value, fresh_until, stale_until):
+        """Queues the write; never blocks the caller"""
+        if self._writer is None or self._pending >= self.max_pending:
+            self.dropped += 1
+            return
+        with self._pending_lock:
+            self._pending += 1
+        self._writer.submit(self._put, key, json.dumps(value), fresh_until, stale_until)
+
+    def _put(self, key, value, fresh_until, stale_until):
+        try:
+            self._write_conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, fresh_until, stale_until) VALUES (?, ?, ?, ?)",
+                (key, value, fresh_until, stale_until),
+            )
+            self._writes += 1
+            # Pruning on every write would dominate; do it every few hundred
+            if self._writes % 256 == 0:
+                self.prune()
+        except sqlite3.Error as e:
+            # e.g. another worker holding the write lock; the entry is only a cache
+            self._failed("write", e)
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    def flush(self):
+        """Blocks until every queued put has been written"""
+        if self._writer is not None:
+            self._writer.submit(lambda: None).result()
+
+    def _failed(self, action, error):
+        self.errors += 1
+        # Under lock contention this can fire on every request; log a sample
+        if self.errors == 1 or self.errors % 1000 == 0:
+            logger.warning(f"Cache {action} failed on {self.path}:{self.table} ({self.errors} so far): {error}")
+
+    def prune(self, now=None):
+        """Writer thread only: drops expired rows, then the oldest past max_rows"""
+        now = time.time() if now is None else now
+        removed = self._write_conn.execute(f"DELETE FROM {self.table} WHERE stale_until <= ?", (now,)).rowcount
+        removed += self._write_conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f" SELECT key FROM {self.table} ORDER BY fresh_until DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        ).rowcount
+        self.evictions += max(removed, 0)
+
+    def close(self):
+        """Writes out queued puts, then closes both connections"""
+        if self._writer is None:
+            return
+        self._writer.shutdown(wait=True)
+        self._writer = None
+        self._conn.close()
+        self._write_conn.close()
+        self._conn = self._write_conn = None
+
+    def stats(self):
+        rows = None
+        if self._conn is not None:
+            try:
+                rows = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            except sqlite3.Error as e:
+                self._failed("read", e)
+        return {
+            "path": self.path,
+            "table": self.table,
+            "rows": rows,
+            "max_rows": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "pending": self._pending,
+            "dropped": self.dropped,
+        }
+
+
+class TieredCache:
+    """Memory LRU in front of an optional SQLite tier, with stale-while-revalidate.
+
+    get_or_fetch serves fresh entries directly, serves stale entries
+    immediately while one background refresh runs per key, and only makes
+    the caller wait on a full miss.
+    """
+
+    def __init__(self, name, max_entries, ttl, stale_ttl=0.0, db_path=None, db_max_rows=100_000,
+                 db_busy_timeout=5.0):
+        self.name = name
+        self.memory = LRUCache(max_entries, ttl, stale_ttl)
+        self.disk = SqliteTier(db_path, db_max_rows, name, db_busy_timeout) if db_path else None
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._refreshing = {}
+
+    def lookup(self, key):
+        state, value = self.memory.lookup(key)
+        if state != MISS or self.disk is None:
+            return state, value
+        row = self.disk.get(key)
+        if row is None:
+            return MISS, None
+        value, fresh_until, stale_until = row
+        # Promote so the next hit stays in memory
+        self.memory.put_entry(key, value, fresh_until, stale_until)
+        return (FRESH if time.time() < fresh_until else STALE), value
+
+    def peek(self, key):
+        # Memory tier only; a disk hit is still cheap compared to a fetch
+        return self.memory.peek(key)
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        fresh_until = now + (self.memory.ttl if ttl is None else ttl)
+        stale_until = fresh_until + self.memory.stale_ttl
+        self.memory.put_entry(key, value, fresh_until, stale_until)
+        if self.disk is not None:
+            self.disk.put(key, value, fresh_until, stale_until)
+
+    async def get_or_fetch(self, key, fetch, should_store=bool):
+        """Cached value for `key`, calling the async `fetch()` when needed"""
+        state, value = self.lookup(key)
+        if state == FRESH:
+            return value
+        if state == STALE:
+            self.revalidate(key, fetch, should_store)
+            return value
+        value = await fetch()
+        if should_store(value):
+            self.set(key, value)
+        return value
+
+    def revalidate(self, key, fetch, should_store=bool):
+        """Starts a background refresh of `key` unless one is already running"""
+        if key not in self._refreshing:
+            # Fresh context: the refresh outlives the request that noticed the
+            # stale entry, so it must not inherit its deadline or stage timings
+            self._refreshing[key] = asyncio.create_task(
+                self._refresh(key, fetch, should_store), context=contextvars.Context()
+            )
+
+    async def _refresh(self, key, fetch, should_store):
+        try:
+            value = await fetch()
+            if should_store(value):
+                self.set(key, value)
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.error(f"Cache refresh failed for {self.name}: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    def close(self):
+        for task in self._refreshing.values():
+            task.cancel()
+        self._refreshing.clear()
+        if self.disk is not None:
+            self.disk.close()
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refreshing": len(self._refreshing),
+        }
@@ -0,0 +1,229 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# All tunables are read from the environment (or backend/.env) once at import.
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_str(name, default):
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+# --- ASYNC ENGINE ---
+# Gemini calls share one pooled keep-alive client
+GEMINI_TIMEOUT = env_float("GEMINI_TIMEOUT", 10.0)
+HTTP_MAX_CONNECTIONS = env_int("HTTP_MAX_CONNECTIONS", 100)
+HTTP_MAX_KEEPALIVE = env_int("HTTP_MAX_KEEPALIVE", 20)
+HTTP_KEEPALIVE_EXPIRY = env_float("HTTP_KEEPALIVE_EXPIRY", 30.0)
+# GEMINI_TIMEOUT is the ceiling; once GEMINI_MIN_SAMPLES calls have been
+# seen the per-call timeout follows p99 latency * GEMINI_TIMEOUT_MULTIPLIER
+GEMINI_ADAPTIVE_TIMEOUT = env_bool("GEMINI_ADAPTIVE_TIMEOUT", True)
+GEMINI_MIN_TIMEOUT = env_float("GEMINI_MIN_TIMEOUT", 1.0)
+GEMINI_TIMEOUT_MULTIPLIER = env_float("GEMINI_TIMEOUT_MULTIPLIER", 3.0)
+GEMINI_LATENCY_WINDOW = env_int("GEMINI_LATENCY_WINDOW", 200)
+GEMINI_MIN_SAMPLES = env_int("GEMINI_MIN_SAMPLES", 20)
+# Consecutive failures that open the breaker, and how long it stays open
+GEMINI_BREAKER_FAILURES = env_int("GEMINI_BREAKER_FAILURES", 5)
+GEMINI_BREAKER_RESET = env_float("GEMINI_BREAKER_RESET", 30.0)
+# Fire a duplicate call when the first outlives the p95 latency; at most
+# GEMINI_HEDGE_MAX_RATIO of calls may be hedged
+GEMINI_HEDGE_ENABLED = env_bool("GEMINI_HEDGE_ENABLED", False)
+GEMINI_HEDGE_PERCENTILE = env_float("GEMINI_HEDGE_PERCENTILE", 95.0)
+GEMINI_HEDGE_MIN_DELAY_MS = env_float("GEMINI_HEDGE_MIN_DELAY_MS", 50.0)
+GEMINI_HEDGE_MAX_RATIO = env_float("GEMINI_HEDGE_MAX_RATIO", 0.1)
+# DDGS is blocking, so it runs on a bounded thread pool
+SEARCH_WORKERS = env_int("SEARCH_WORKERS", 8)
+# Worker threads one search provider may hold at once. A call the request
+# deadline gave up on keeps its thread until DDG answers, so a stalled
+# provider cannot take every worker from pages, streams and the others.
+SEARCH_PROVIDER_MAX_INFLIGHT = env_int("SEARCH_PROVIDER_MAX_INFLIGHT", 6)
+
+# --- SPECULATIVE EXECUTION ---
+# When the keyword pass is inconclusive, start work before the LLM verdict:
+#   off     - classify, then improve, then search (strictly in order)
+#   improve - run improve_query alongside the LLM classifier
+#   full    - also search DDG with the raw query alongside both
+SPECULATIVE_MODE = env_str("SPECULATIVE_MODE", "off").lower()
+
+# --- COMBINED LLM CALL ---
+# For a query the keywords miss, ask Gemini for the verdict, a confidence
+# and the rewrite in one JSON answer instead of two sequential calls. An
+# unusable answer falls back to the two calls. While this is on,
+# SPECULATIVE_MODE has no effect: speculation only overlaps the two
+# sequential calls, so set LLM_COMBINED_ENABLED=false to use it.
+LLM_COMBINED_ENABLED = env_bool("LLM_COMBINED_ENABLED", True)
+
+# --- SEARCH PROVIDERS ---
+# Comma-separated providers queried together and merged by rank fusion:
+#   ddg (web), ddg_news, corpus (JSONL file at SEARCH_CORPUS_PATH)
+SEARCH_PROVIDERS = env_str("SEARCH_PROVIDERS", "ddg")
+SEARCH_PROVIDER_WEIGHTS = env_str("SEARCH_PROVIDER_WEIGHTS", "")  # e.g. "ddg=1,ddg_news=0.5"
+SEARCH_CORPUS_PATH = env_str("SEARCH_CORPUS_PATH", "")
+# Answer with whatever is in once the deadline passes, or earlier when
+# SEARCH_EARLY_RESULTS distinct results have arrived (0 waits for all)
+SEARCH_DEADLINE_MS = env_float("SEARCH_DEADLINE_MS", 6000.0)
+SEARCH_EARLY_RESULTS = env_int("SEARCH_EARLY_RESULTS", 10)
+
+# --- LOCAL FULL-TEXT INDEX ---
+# Every fetched result is indexed (SQLite FTS5) at LOCAL_INDEX_PATH; leave
+# empty to disable. A query is answered locally when LOCAL_INDEX_MIN_HITS
+# fresh results each contain LOCAL_INDEX_MIN_COVERAGE of its terms.
+LOCAL_INDEX_PATH = env_str("LOCAL_INDEX_PATH", "")
+LOCAL_INDEX_MIN_HITS = env_int("LOCAL_INDEX_MIN_HITS", 5)
+LOCAL_INDEX_MIN_COVERAGE = env_float("LOCAL_INDEX_MIN_COVERAGE", 0.8)
+# Rows older than LOCAL_INDEX_MAX_AGE are never served; every
+# LOCAL_INDEX_COMPACT_EVERY writes, expired and overflow rows are deleted
+LOCAL_INDEX_MAX_AGE = env_float("LOCAL_INDEX_MAX_AGE", 7 * 86400.0)
+LOCAL_INDEX_MAX_DOCS = env_int("LOCAL_INDEX_MAX_DOCS", 200_000)
+LOCAL_INDEX_COMPACT_EVERY = env_int("LOCAL_INDEX_COMPACT_EVERY", 1000)
+
+# --- SEARCH RESULT CACHE ---
+# Fresh for SEARCH_CACHE_TTL, then served stale (and refreshed in the
+# background) for another SEARCH_CACHE_STALE_TTL seconds
+SEARCH_CACHE_SIZE = env_int("SEARCH_CACHE_SIZE", 2048)
+SEARCH_CACHE_TTL = env_float("SEARCH_CACHE_TTL", 600.0)
+SEARCH_CACHE_STALE_TTL = env_float("SEARCH_CACHE_STALE_TTL", 3600.0)
+# Optional persistent tier; leave empty to keep the cache in memory only
+# (or to use SHARED_CACHE_PATH when that is set)
+SEARCH_CACHE_DB = env_str("SEARCH_CACHE_DB", "")
+SEARCH_CACHE_DB_MAX_ROWS = env_int("SEARCH_CACHE_DB_MAX_ROWS", 100_000)
+
+# --- SHARED CACHE ---
+# Every uvicorn worker keeps its own memory caches. Point SHARED_CACHE_PATH
+# at a file on local disk and verdicts, rewrites and search results are also
+# written to one SQLite (WAL) database that all workers on the host read on
+# a memory miss. Writes that wait longer than the busy timeout are dropped.
+SHARED_CACHE_PATH = env_str("SHARED_CACHE_PATH", "")
+SHARED_CACHE_MAX_ROWS = env_int("SHARED_CACHE_MAX_ROWS", 100_000)  # per cache
+SHARED_CACHE_BUSY_TIMEOUT_MS = env_float("SHARED_CACHE_BUSY_TIMEOUT_MS", 50.0)
+
+# --- LLM ANSWER MEMO ---
+# Verdicts change far less often than the best rewrite for a query
+VERDICT_CACHE_SIZE = env_int("VERDICT_CACHE_SIZE", 20_000)
+VERDICT_CACHE_TTL = env_float("VERDICT_CACHE_TTL", 86400.0)
+REWRITE_CACHE_SIZE = env_int("REWRITE_CACHE_SIZE", 10_000)
+REWRITE_CACHE_TTL = env_float("REWRITE_CACHE_TTL", 21600.0)
+
+# --- LOCAL QUERY REWRITER ---
+# Rule-based rewrites (abbreviations, filler, pasted error output) are tried
+# before Gemini; Gemini is only asked when no rule improves the query
+LOCAL_REWRITE_ENABLED = env_bool("LOCAL_REWRITE_ENABLED", True)
+
+# --- NEAR-DUPLICATE QUERY CACHE ---
+# Paraphrases whose stemmed-word Jaccard similarity reaches
+# SIMILAR_CACHE_THRESHOLD reuse a stored verdict and rewrite.
+# SIMILAR_CACHE_SIZE=0 disables it; CHAR_NGRAMS also matches small typos.
+SIMILAR_CACHE_SIZE = env_int("SIMILAR_CACHE_SIZE", 50_000)  # ~1.3 KB per entry
+SIMILAR_CACHE_TTL = env_float("SIMILAR_CACHE_TTL", 21600.0)
+SIMILAR_CACHE_THRESHOLD = env_float("SIMILAR_CACHE_THRESHOLD", 0.8)
+SIMILAR_CACHE_CHAR_NGRAMS = env_bool("SIMILAR_CACHE_CHAR_NGRAMS", False)
+
+# --- LLM MICRO-BATCHING ---
+# Ambiguous queries wait up to LLM_BATCH_WINDOW_MS (or until LLM_BATCH_MAX
+# are queued) and are classified together in one Gemini request
+LLM_BATCH_ENABLED = env_bool("LLM_BATCH_ENABLED", False)
+LLM_BATCH_MAX = env_int("LLM_BATCH_MAX", 16)
+LLM_BATCH_WINDOW_MS = env_float("LLM_BATCH_WINDOW_MS", 15.0)
+
+# --- LOCAL INTENT MODEL ---
+# Trained with train_classifier.py; Gemini is only asked when the model's
+# confidence is below LOCAL_MODEL_THRESHOLD. Leave the path empty to disable.
+LOCAL_MODEL_PATH = env_str("LOCAL_MODEL_PATH", "")
+LOCAL_MODEL_THRESHOLD = env_float("LOCAL_MODEL_THRESHOLD", 0.85)
+# Every Gemini verdict is appended here as training data for the next model
+VERDICT_LOG_PATH = env_str("VERDICT_LOG_PATH", "")
+
+# --- REQUEST DEADLINE ---
+# End-to-end budget for /search, overridable per request with "deadline_ms"
+# (capped at REQUEST_DEADLINE_MAX_MS; 0 disables it). Stages that cannot
+# finish in time are skipped or cut short, and the response lists them in
+# "degraded". LLM stages give up early enough to leave
+# DEADLINE_SEARCH_RESERVE_MS for the search itself; a query that misses
+# the LLM gets the local model's verdict if it is confident, else
+# DEADLINE_FALLBACK_VERDICT. Keep that NON_TECH: anything else lets
+# unclassified queries through the filter whenever Gemini is slow.
+REQUEST_DEADLINE_MS = env_float("REQUEST_DEADLINE_MS", 10000.0)
+REQUEST_DEADLINE_MAX_MS = env_float("REQUEST_DEADLINE_MAX_MS", 30000.0)
+DEADLINE_SEARCH_RESERVE_MS = env_float("DEADLINE_SEARCH_RESERVE_MS", 2000.0)
+# Smallest deadline_ms a client may ask for (422 below it), so nobody can
+# pick a budget that leaves the LLM stages no time at all
+REQUEST_DEADLINE_MIN_MS = env_float("REQUEST_DEADLINE_MIN_MS", DEADLINE_SEARCH_RESERVE_MS + 3000.0)
+DEADLINE_FALLBACK_VERDICT = env_str("DEADLINE_FALLBACK_VERDICT", "NON_TECH").upper()
+
+# --- ADMISSION CONTROL ---
+# Pipelines allowed to run at once; the rest queue (at most
+# ADMISSION_MAX_QUEUE) and are shed with 503 after ADMISSION_QUEUE_TIMEOUT_MS.
+# ADMISSION_MAX_ACTIVE=0 turns admission control off
+ADMISSION_MAX_ACTIVE = env_int("ADMISSION_MAX_ACTIVE", 64)
+ADMISSION_MAX_QUEUE = env_int("ADMISSION_MAX_QUEUE", 256)
+ADMISSION_QUEUE_TIMEOUT_MS = env_float("ADMISSION_QUEUE_TIMEOUT_MS", 2000.0)
+# Per-client token bucket (429 when empty); RATE_LIMIT_PER_S=0 disables it.
+# Clients are told apart by the connecting address only, so everyone behind
+# one proxy or NAT shares a bucket: off by default, turn it on where the
+# app sees real client addresses
+RATE_LIMIT_PER_S = env_float("RATE_LIMIT_PER_S", 0.0)
+RATE_LIMIT_BURST = env_int("RATE_LIMIT_BURST", 20)
+RATE_LIMIT_MAX_CLIENTS = env_int("RATE_LIMIT_MAX_CLIENTS", 10_000)
+
+# --- QUERY LOG AND WARM-UP ---
+# Every incoming query is appended to QUERY_LOG_PATH (empty disables it).
+# On startup the WARMUP_TOP_N most frequent queries in WARMUP_LOG_PATHS
+# (comma-separated JSONL files) are replayed at WARMUP_RATE_PER_S; /ready
+# returns 503 until WARMUP_READY_FRACTION of them are done or
+# WARMUP_READY_TIMEOUT seconds have passed.
+QUERY_LOG_PATH = env_str("QUERY_LOG_PATH", "")
+# Past this size the log is rotated to QUERY_LOG_PATH.1 (0 = never);
+# warm-up reads both files
+QUERY_LOG_MAX_BYTES = env_int("QUERY_LOG_MAX_BYTES", 50_000_000)
+WARMUP_LOG_PATHS = env_str("WARMUP_LOG_PATHS", QUERY_LOG_PATH)
+WARMUP_TOP_N = env_int("WARMUP_TOP_N", 500)
+WARMUP_RATE_PER_S = env_float("WARMUP_RATE_PER_S", 2.0)
+WARMUP_READY_FRACTION = env_float("WARMUP_READY_FRACTION", 0.8)
+WARMUP_READY_TIMEOUT = env_float("WARMUP_READY_TIMEOUT", 300.0)
+
+# --- BATCH SEARCH ---
+# /search/batch rejects larger batches outright (422) rather than truncating
+BATCH_MAX_ITEMS = env_int("BATCH_MAX_ITEMS", 500)
+# Items improved + searched at once within one batch
+BATCH_CONCURRENCY = env_int("BATCH_CONCURRENCY", 8)
+
+# --- PAGINATED SEARCH ---
+PAGE_SIZE = env_int("PAGE_SIZE", 5)
+PAGE_MAX_SIZE = env_int("PAGE_MAX_SIZE", 25)
+# Results requested from DDG per upstream page, and the hard cap per query
+PAGE_FETCH_SIZE = env_int("PAGE_FETCH_SIZE", 10)
+PAGE_MAX_RESULTS = env_int("PAGE_MAX_RESULTS", 100)
+# DDGS sessions are reused across page fetches for the same query
+PAGE_MAX_SESSIONS = env_int("PAGE_MAX_SESSIONS", 256)
+PAGE_SESSION_IDLE_TTL = env_float("PAGE_SESSION_IDLE_TTL", 300.0)
+PAGE_SESSION_MAX_LIFETIME = env_float("PAGE_SESSION_MAX_LIFETIME", 1800.0)
+# Signs cursors; set it when cursors must survive restarts or span workers
+CURSOR_SECRET = env_str("CURSOR_SECRET", "")
+
+# --- RESPONSE ENCODING ---
+# Bodies at least this big are gzip / brotli compressed when the client
+# accepts it; brotli needs the optional "brotli" package
+COMPRESSION_MIN_BYTES = env_int("COMPRESSION_MIN_BYTES", 1024)
+COMPRESSION_GZIP_LEVEL = env_int("COMPRESSION_GZIP_LEVEL", 6)
+COMPRESSION_BROTLI_QUALITY = env_int("COMPRESSION_BROTLI_QUALITY", 5)
+# Cache-Control max-age on GET /search; clients revalidate with the ETag after
+SEARCH_HTTP_MAX_AGE = env_int("SEARCH_HTTP_MAX_AGE", 60)
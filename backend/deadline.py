@@ -0,0 +1,98 @@
+"""Per-request latency budget, and the degradations taken to stay inside it.
+
+An endpoint opens a budget around the pipeline:
+
+    with deadline.budget(8.0) as budget:
+        outcome = await run_search(query)
+    budget.degraded  # e.g. ["improve_skipped"]
+
+and stages read it through a ContextVar, the same way metrics.stage finds
+the request's timings. Outside a budget every helper here is a no-op.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from metrics import Counter
+
+DEGRADATIONS = Counter(
+    "techsearch_degradations_total", "Stages skipped or cut short to meet a request deadline", ("degradation",),
+)
+
+_BUDGET = ContextVar("request_budget", default=None)
+
+
+class BudgetExhausted(Exception):
+    """The deadline, less the time reserved for later stages, has passed"""
+
+
+class Budget:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.degraded = []
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def degrade(self, name):
+        if name not in self.degraded:
+            self.degraded.append(name)
+            DEGRADATIONS.inc(name)
+
+
+@contextmanager
+def budget(seconds):
+    """Deadline for everything awaited inside; seconds <= 0 means none"""
+    current = Budget(seconds) if seconds and seconds > 0 else None
+    token = _BUDGET.set(current)
+    try:
+        yield current
+    finally:
+        _BUDGET.reset(token)
+
+
+def remaining(reserve=0.0):
+    """Seconds left once `reserve` is kept back, or None without a budget"""
+    current = _BUDGET.get()
+    return None if current is None else current.remaining() - reserve
+
+
+def degrade(name):
+    current = _BUDGET.get()
+    if current is not None:
+        current.degrade(name)
+
+
+def degradations():
+    current = _BUDGET.get()
+    return current.degraded if current is not None else []
+
+
+def _retrieve(task):
+    if not task.cancelled():
+        task.exception()
+
+
+async def within(fn, reserve=0.0):
+    """Result of `await fn()`, or BudgetExhausted when only `reserve` is left.
+
+    The work is shielded from the deadline: when time runs out it carries
+    on in the background, so a late LLM answer still lands in the memo for
+    next time. Cancelling the caller (e.g. dropped speculation) cancels it.
+    """
+    left = remaining(reserve)
+    if left is None:
+        return await fn()
+    if left <= 0:
+        raise BudgetExhausted
+    task = asyncio.ensure_future(fn())
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), left)
+    except asyncio.TimeoutError:
+        task.add_done_callback(_retrieve)
+        raise BudgetExhausted from None
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
@@ -0,0 +1,131 @@
+"""Local stand-ins for upstream services, for tests and benchmarks.
+
+Run the fakes and point the backend at them:
+
+    uvicorn fakes:gemini_app --port 8001
+    uvicorn fakes:ddg_app --port 8002
+    GEMINI_URL=http://127.0.0.1:8001/generate DDG_URL=http://127.0.0.1:8002/search \\
+        uvicorn main:app
+
+Each fake's behaviour is read from the environment at startup, e.g. for
+Gemini (swap the prefix to FAKE_DDG_ for the search fake):
+
+    FAKE_GEMINI_LATENCY_MS     median latency (default 0)
+    FAKE_GEMINI_LATENCY_SIGMA  log-normal spread; 0 = fixed latency
+    FAKE_GEMINI_ERROR_RATE     fraction of calls answered with HTTP 500
+    FAKE_GEMINI_TIMEOUT_RATE   fraction of calls that hang for ..._TIMEOUT_S
+"""
+import asyncio
+import json
+import random
+import re
+
+from fastapi import FastAPI, HTTPException
+
+from config import env_float
+
+# Words that make the fake Gemini answer TECH for an otherwise unknown query
+FAKE_TECH_HINTS = {
+    "app", "apps", "laptop", "phone", "computer", "pc", "website", "wifi",
+    "screen", "keyboard", "printer", "update", "install", "crash", "pixel",
+    "bluetooth", "usb", "chrome", "email", "password", "fan", "battery",
+}
+
+
+class FakeUpstream:
+    """Latency / error / timeout behaviour shared by the fakes"""
+
+    def __init__(self, prefix):
+        self.latency = env_float(f"{prefix}_LATENCY_MS", 0.0) / 1000
+        self.sigma = env_float(f"{prefix}_LATENCY_SIGMA", 0.0)
+        self.error_rate = env_float(f"{prefix}_ERROR_RATE", 0.0)
+        self.timeout_rate = env_float(f"{prefix}_TIMEOUT_RATE", 0.0)
+        self.timeout = env_float(f"{prefix}_TIMEOUT_S", 30.0)
+        self.stats = {}
+        self.reset()
+
+    def reset(self):
+        self.stats.clear()
+        self.stats.update({"calls": 0, "errors": 0, "timeouts": 0})
+
+    async def behave(self):
+        """Sleeps like the real service would, then maybe fails"""
+        self.stats["calls"] += 1
+        roll = random.random()
+        if roll < self.timeout_rate:
+            self.stats["timeouts"] += 1
+            await asyncio.sleep(self.timeout)
+        elif self.latency:
+            jitter = random.lognormvariate(0, self.sigma) if self.sigma else 1.0
+            await asyncio.sleep(self.latency * jitter)
+        if roll >= 1 - self.error_rate:
+            self.stats["errors"] += 1
+            raise HTTPException(status_code=500, detail="Injected upstream error")
+
+
+def _add_stats_routes(app, upstream):
+    @app.get("/stats")
+    def stats():
+        return upstream.stats
+
+    @app.post("/stats/reset")
+    def reset():
+        upstream.reset()
+        return upstream.stats
+
+
+# --- FAKE GEMINI ---
+gemini_app = FastAPI(title="Fake Gemini")
+gemini = FakeUpstream("FAKE_GEMINI")
+_add_stats_routes(gemini_app, gemini)
+
+
+def fake_label(query):
+    words = set(re.findall(r"[a-z0-9]+", query.lower()))
+    return "TECH" if words & FAKE_TECH_HINTS else "NON_TECH"
+
+
+def fake_answer(prompt, stats=None):
+    """What the fake model says for each prompt shape langchain_logic sends"""
+    stats = gemini.stats if stats is None else stats
+    if prompt.startswith("Classify each numbered"):
+        queries = re.findall(r"^\d+\. (.*)$", prompt, flags=re.MULTILINE)
+        stats["classify_batch"] = stats.get("classify_batch", 0) + 1
+        stats["batched_queries"] = stats.get("batched_queries", 0) + len(queries)
+        labels = ", ".join(f'"{fake_label(q)}"' for q in queries)
+        return f"[{labels}]"
+    if prompt.startswith("Classify this search query"):
+        query = prompt.rsplit("\nQuery: ", 1)[-1]
+        stats["combined"] = stats.get("combined", 0) + 1
+        label = fake_label(query)
+        rewrite = f"{query} stackoverflow" if label == "TECH" else ""
+        return json.dumps({"label": label, "confidence": 0.9, "rewritten_query": rewrite})
+    query = prompt.split(": ", 1)[-1]
+    if prompt.startswith("Classify"):
+        stats["classify"] = stats.get("classify", 0) + 1
+        return fake_label(query)
+    stats["improve"] = stats.get("improve", 0) + 1
+    return f"{query} stackoverflow"
+
+
+@gemini_app.post("/{path:path}")
+async def generate(path: str, body: dict):
+    await gemini.behave()
+    prompt = body["contents"][0]["parts"][0]["text"]
+    return {"candidates": [{"content": {"parts": [{"text": fake_answer(prompt)}]}}]}
+
+
+# --- FAKE DUCKDUCKGO ---
+ddg_app = FastAPI(title="Fake DuckDuckGo")
+ddg = FakeUpstream("FAKE_DDG")
+_add_stats_routes(ddg_app, ddg)
+
+
+@ddg_app.get("/search")
+async def search(q: str, max_results: int = 5, page: int = 1):
+    await ddg.behave()
+    first = (page - 1) * max_results
+    return [
+        {"title": f"{q} result {i}", "body": f"Snippet {i} about {q}", "href": f"https://example.com/{i}?q={q}"}
+        for i in range(first, first + max_results)
+    ]
@@ -0,0 +1,134 @@
+from collections import deque, namedtuple
+
+# One match of a taxonomy keyword inside a query.
+# start/end are offsets into the lowercased, whitespace-collapsed query.
+KeywordHit = namedtuple("KeywordHit", ["keyword", "category", "start", "end"])
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+# Endings that leave a keyword's meaning intact: "flash" -> "flashing"
+_SUFFIXES = ("es", "ed", "er", "ers", "ing", "ings")
+_VOWELS = set("aeiou")
+
+
+def _inflection(keyword, tail):
+    """True if keyword + tail is a version or inflected form of keyword.
+
+    Short keywords only take digits: "go" must not fire in "going".
+    """
+    if tail.isdigit():
+        # Versions: "python3", "ios17", "windows11"
+        return True
+    if len(keyword) < 3 or not keyword[-1].isalpha():
+        return False
+    if keyword[-1] == "e" and tail in ("d", "r", "rs"):
+        # "compile" -> "compiled", "code" -> "coder"
+        return True
+    if tail[:1] == keyword[-1] and keyword[-1] not in _VOWELS and tail[1:] in _SUFFIXES:
+        # Doubled final consonant: "debug" -> "debugging", "log" -> "logged"
+        return True
+    return len(keyword) >= 4 and tail in _SUFFIXES
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over every keyword of every category.
+
+    The automaton is compiled once, so matching a query is a single pass over
+    its characters no matter how many keywords the taxonomy holds. Hits only
+    count on word boundaries ("go" does not fire inside "google"), with an
+    optional plural "s" so "databases" still hits "database". Keywords of
+    the `inflected` categories (all, by default) also match with a version
+    number or a verb ending: "python3", "rooting", "debugging".
+    """
+
+    def __init__(self, taxonomy, inflected=None):
+        # taxonomy: {"CATEGORY": [keywords, ...]}; insertion order is priority
+        self.categories = list(taxonomy)
+        self.inflected = set(taxonomy if inflected is None else inflected)
+        self.duplicates = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        seen = {}
+        for category, keywords in taxonomy.items():
+            for raw in keywords:
+                keyword = " ".join(raw.lower().split())
+                if not keyword:
+                    continue
+                if keyword in seen:
+                    self.duplicates.append((keyword, seen[keyword], category))
+                    if seen[keyword] == category:
+                        continue
+                else:
+                    seen[keyword] = category
+                self._insert(keyword, category)
+        self.size = len(seen)
+        self._build_failure_links()
+
+    def _insert(self, keyword, category):
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((keyword, category))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                # Inherit the outputs of the longest proper suffix
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text):
+        """Returns every keyword hit in `text`, in order of where it ends."""
+        text = " ".join(text.lower().split())
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = []
+        node = 0
+        length = len(text)
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            for keyword, category in out[node]:
+                start = i + 1 - len(keyword)
+                if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(keyword[0]):
+                    continue
+                end = i + 1
+                if end < length and _is_word_char(text[end]) and _is_word_char(keyword[-1]):
+                    word_end = end
+                    while word_end < length and _is_word_char(text[word_end]):
+                        word_end += 1
+                    tail = text[end:word_end]
+                    # Allow a plain plural: "database" -> "databases"
+                    if tail != "s" and not (category in self.inflected and _inflection(keyword, tail)):
+                        continue
+                    end = word_end
+                hits.append(KeywordHit(keyword, category, start, end))
+        return hits
+
+    def classify(self, text):
+        """Returns the highest-priority category with a hit, or None."""
+        found = {hit.category for hit in self.find(text)}
+        for category in self.categories:
+            if category in found:
+                return category
+        return None
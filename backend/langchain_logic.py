@@ -24,27 +24,42 @@
         # return f"ERROR: {str(e)}"
 import os
 import re
-import requests
+import json
 from dotenv import load_dotenv
-from ddgs import DDGS
+from keyword_matcher import KeywordMatcher
 
 load_dotenv()
 
 # --- CONFIGURATION ---
 API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_ID = "gemini-2.0-flash" 
-GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{MODEL_ID}:generateContent"
+# GEMINI_URL can point at a local stand-in (see fakes.py) for tests/benchmarks
+GEMINI_URL = os.getenv("GEMINI_URL") or f"https://generativelanguage.googleapis.com/v1beta/models/{MODEL_ID}:generateContent"
+# DDG_URL swaps DuckDuckGo for a local JSON stand-in (see fakes.py)
+DDG_URL = os.getenv("DDG_URL")
+
+GEMINI_HEADERS = {"Content-Type": "application/json"}
+
+def gemini_payload(prompt, json_output=False):
+    """Request body for a single-prompt generateContent call"""
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if json_output:
+        payload["generationConfig"] = {"responseMimeType": "application/json"}
+    return payload
+
+def gemini_text(data):
+    """Pulls the generated text out of a generateContent response"""
+    return data["candidates"][0]["content"]["parts"][0]["text"]
 
 def call_gemini(prompt):
     """Internal helper to talk to Gemini API"""
-    headers = {"Content-Type": "application/json"}
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    # Imported here: the server talks to Gemini through async_engine's httpx client
+    import requests
     try:
         # Added a 10s timeout to prevent Flutter from waiting forever
-        response = requests.post(f"{GEMINI_URL}?key={API_KEY}", headers=headers, json=payload, timeout=10)
+        response = requests.post(f"{GEMINI_URL}?key={API_KEY}", headers=GEMINI_HEADERS, json=gemini_payload(prompt), timeout=10)
         response.raise_for_status()
-        data = response.json()
-        return data["candidates"][0]["content"]["parts"][0]["text"]
+        return gemini_text(response.json())
     except Exception as e:
         return f"ERROR: {str(e)}"
 
@@ -69,6 +84,8 @@ TECH_KEYWORDS = [
     # --- Software Engineering ---
     "api", "sdk", "library", "framework", "microservices", "backend",
     "frontend", "fullstack", "rest", "graphql", "http", "json", "xml",
+    # Forms the matcher's suffix rules cannot reach from "code" / "program"
+    "coding", "programmer",
 
     # --- Databases ---
     "database", "sql", "mysql", "postgresql", "sqlite", "mongodb",
@@ -109,13 +126,13 @@ TECH_KEYWORDS = [
     "pull request", "repository", "clone",
 
     # --- Build & Tools ---
-    "compiler", "interpreter", "build", "gradle", "maven",
+    "compiler", "compile", "compiling", "interpreter", "build", "gradle", "maven",
     "npm", "pip", "yarn", "webpack", "vite",
 
     # --- General Tech Terms ---
     "software", "hardware", "technology", "automation",
     "virtualization", "virtual machine", "vm", "hypervisor",
-    "blockchain", "cryptocurrency", "iot", "embedded system"
+    "blockchain", "cryptocurrency", "iot", "embedded system",
      "TV","AC","Smart Watch","Air Fryer","Home Appliances "
 ]
 
@@ -124,7 +141,7 @@ NON_TECH_KEYWORDS = [
     "cook", "recipe", "food", "restaurant", "hotel", "movie",
     "song", "celebrity", "price", "buy", "review", "travel",
     "tourism", "sports", "match", "cricket", "football",
-    "diet", "health tips", "beauty", "fashion"
+    "diet", "health tips", "beauty", "fashion",
     # 🍔 Food & Cooking
     "cook", "cooking", "recipe", "recipes", "bake", "baking", "food",
     "meal", "dish", "dinner", "lunch", "breakfast", "snack", "restaurant",
@@ -238,50 +255,172 @@ NON_TECH_KEYWORDS = [
 #         print(f"DDG Search Error: {e}")
 #         return []
 
+# Compiled once at import: a single pass over the query finds every hit.
+# Category order is priority, so an obvious non-tech hit still blocks first.
+# Only TECH keywords take inflections ("rooting", "python3"): NON_TECH lists
+# its own variants, and "match" must not block "pattern matching".
+KEYWORD_MATCHER = KeywordMatcher({
+    "NON_TECH": NON_TECH_KEYWORDS,
+    "TECH": TECH_KEYWORDS,
+}, inflected=("TECH",))
+
+def match_keywords(query):
+    """Returns every keyword hit in the query along with its category"""
+    return KEYWORD_MATCHER.find(query)
+
 def classify_query(query):
     """Refined for Flutter: Returns clean categories"""
-    q = query.lower().strip()
+    # 🚫 Hard block obvious non-tech / ✅ Hard allow obvious tech
+    verdict = KEYWORD_MATCHER.classify(query)
+    if verdict:
+        return verdict
 
-    # 🚫 Hard block obvious non-tech
-    for word in NON_TECH_KEYWORDS:
-        if word in q:
-            return "NON_TECH"
+    # 🧠 AI Decision with cleaning
+    return parse_classification(call_gemini(classify_prompt(query)))
 
-    # ✅ Hard allow obvious tech
-    for word in TECH_KEYWORDS:
-        if word in q:
-            return "TECH"
+def classify_prompt(query):
+    return f"Classify this as TECH or NON_TECH only: {query}"
 
-    # 🧠 AI Decision with cleaning
-    prompt = f"Classify this as TECH or NON_TECH only: {query}"
-    ai_raw = call_gemini(prompt).strip().upper()
-    
+def parse_classification(ai_raw):
+    """Maps a raw Gemini answer onto TECH / NON_TECH"""
     # Regex clean: Removes stars, dots, or extra words like 'The category is TECH'
-    ai_clean = re.sub(r'[^A-Z_]', '', ai_raw)
+    ai_clean = re.sub(r'[^A-Z_]', '', ai_raw.strip().upper())
 
     return "TECH" if "TECH" in ai_clean and "NON" not in ai_clean else "NON_TECH"
 
+def batch_classify_prompt(queries):
+    """One structured prompt that classifies several queries at once"""
+    lines = "\n".join(f"{i}. {q}" for i, q in enumerate(queries, 1))
+    return (
+        "Classify each numbered search query as TECH or NON_TECH.\n"
+        "TECH = technology, software, hardware, IT. NON_TECH = anything else.\n"
+        "Reply with only a JSON array of labels in the same order, "
+        'e.g. ["TECH", "NON_TECH"].\n'
+        f"{lines}"
+    )
+
+def parse_batch_classification(ai_raw, count):
+    """Labels from a batch answer, or None if it is not exactly `count` labels"""
+    start, end = ai_raw.find("["), ai_raw.rfind("]")
+    if start == -1 or end < start:
+        return None
+    try:
+        labels = json.loads(ai_raw[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(labels, list) or len(labels) != count:
+        return None
+    if not all(isinstance(label, str) for label in labels):
+        return None
+    return [parse_classification(label) for label in labels]
+
+def combined_prompt(query):
+    """Classification and rewrite in one structured prompt"""
+    return (
+        "Classify this search query as TECH or NON_TECH and, if TECH, convert it into a "
+        "professional technical search query for StackOverflow.\n"
+        "TECH = technology, software, hardware, IT. NON_TECH = anything else.\n"
+        'Reply with only a JSON object: {"label": "TECH" or "NON_TECH", '
+        '"confidence": a number from 0 to 1, "rewritten_query": the search query, or "" if NON_TECH}.\n'
+        f"Query: {query}"
+    )
+
+def parse_combined(ai_raw):
+    """(label, confidence, rewritten_query) from a combined answer, or None if malformed"""
+    text = ai_raw.strip()
+    # Asked for bare JSON, but a ```json fence is common enough to allow
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    try:
+        answer = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(answer, dict):
+        return None
+    label, confidence, rewrite = answer.get("label"), answer.get("confidence"), answer.get("rewritten_query")
+    if label not in ("TECH", "NON_TECH"):
+        return None
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 1:
+        return None
+    if label == "TECH" and not (isinstance(rewrite, str) and rewrite.strip()):
+        return None
+    return label, float(confidence), rewrite.strip() if isinstance(rewrite, str) else ""
+
 def improve_query(query):
     """Optimizes the query for StackOverflow/Docs style results"""
-    prompt = f"Convert this into a professional technical search query for StackOverflow: {query}"
-    result = call_gemini(prompt).strip()
+    return pick_improved(query, call_gemini(improve_prompt(query)))
+
+def improve_prompt(query):
+    return f"Convert this into a professional technical search query for StackOverflow: {query}"
+
+def pick_improved(query, result):
+    """Uses the rewrite unless the AI failed or rambled"""
+    result = result.strip()
     # If AI fails, fallback to original query so search still works
     return query if "ERROR" in result or len(result) > 100 else result
 
+def format_ddg_result(r):
+    """Shapes one raw DDGS hit for Flutter ListViews"""
+    return {
+        "title": r.get('title', 'No Title'),
+        "snippet": r.get('body', 'No Description'),
+        "url": r.get('href', '')
+    }
+
+def iter_ddg(query, max_results=5):
+    """Yields formatted results one at a time, for streaming responses"""
+    # Imported on first search rather than at startup; both are slow to import
+    import requests
+    from ddgs import DDGS
+    if DDG_URL:
+        response = requests.get(DDG_URL, params={"q": query, "max_results": max_results}, timeout=10)
+        response.raise_for_status()
+        for r in response.json():
+            yield format_ddg_result(r)
+        return
+    with DDGS() as ddgs:
+        for r in ddgs.text(query, region='wt-wt', safesearch='moderate', max_results=max_results):
+            yield format_ddg_result(r)
+
+def iter_ddg_news(query, max_results=5):
+    """Like iter_ddg, over DuckDuckGo News; fresher for release / outage queries"""
+    import requests
+    from ddgs import DDGS
+    if DDG_URL:
+        response = requests.get(DDG_URL, params={"q": query, "max_results": max_results, "kind": "news"}, timeout=10)
+        response.raise_for_status()
+        for r in response.json():
+            yield format_ddg_result(r)
+        return
+    with DDGS() as ddgs:
+        for r in ddgs.news(query, region='wt-wt', safesearch='moderate', max_results=max_results):
+            # News hits carry the link under "url" rather than "href"
+            yield format_ddg_result({**r, "href": r.get('url', '')})
+
+def ddg_page(query, page, max_results, ddgs=None):
+    """One upstream page of formatted results, from the same source as iter_ddg.
+
+    DDGS returns a page as a list, so a page is always fetched whole.
+    Pass `ddgs` to reuse one client across pages. Errors propagate.
+    """
+    import requests
+    if DDG_URL:
+        params = {"q": query, "max_results": max_results, "page": page}
+        response = requests.get(DDG_URL, params=params, timeout=10)
+        response.raise_for_status()
+        return [format_ddg_result(r) for r in response.json()]
+    if ddgs is None:
+        from ddgs import DDGS
+        with DDGS() as ddgs:
+            return ddg_page(query, page, max_results, ddgs)
+    raw = ddgs.text(query, region='wt-wt', safesearch='moderate', max_results=max_results, page=page)
+    return [format_ddg_result(r) for r in raw]
+
 def search_ddg(query):
     """Fetches results formatted specifically for Flutter ListViews"""
-    results = []
     try:
-        with DDGS() as ddgs:
-            # max_results=5 is ideal for mobile screens to avoid lag
-            ddgs_results = list(ddgs.text(query, region='wt-wt', safesearch='moderate', max_results=5))
-            for r in ddgs_results:
-                results.append({
-                    "title": r.get('title', 'No Title'),
-                    "snippet": r.get('body', 'No Description'),
-                    "url": r.get('href', '')
-                })
-        return results
+        # max_results=5 is ideal for mobile screens to avoid lag
+        return list(iter_ddg(query, max_results=5))
     except Exception as e:
         print(f"DDG Search Error: {e}")
         return []
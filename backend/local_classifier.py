@@ -0,0 +1,180 @@
+import time
+import zlib
+
+import numpy as np
+
+LABELS = ("NON_TECH", "TECH")
+
+
+def _ngrams(query, n_min, n_max):
+    text = f" {' '.join(query.lower().split())} "
+    for n in range(n_min, n_max + 1):
+        for i in range(len(text) - n + 1):
+            yield text[i:i + n]
+
+
+def featurize(queries, dim, n_min=2, n_max=4):
+    """Hashed character n-gram counts for a batch of queries, in CSR form.
+
+    Returns (indices, values, offsets): row i owns
+    indices[offsets[i]:offsets[i + 1]]. Values are L2-normalised per row.
+    """
+    indices, values, offsets = [], [], [0]
+    mask = dim - 1
+    for query in queries:
+        counts = {}
+        for gram in _ngrams(query, n_min, n_max):
+            # crc32 is stable across processes, unlike hash()
+            slot = zlib.crc32(gram.encode("utf-8")) & mask
+            counts[slot] = counts.get(slot, 0) + 1
+        row = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        norm = float(np.sqrt((row * row).sum())) or 1.0
+        indices.extend(counts)
+        values.extend((row / norm).tolist())
+        offsets.append(len(indices))
+    return (
+        np.asarray(indices, dtype=np.int64),
+        np.asarray(values, dtype=np.float32),
+        np.asarray(offsets, dtype=np.int64),
+    )
+
+
+class LocalClassifier:
+    """Linear model over hashed character n-grams, scored with NumPy.
+
+    CPU-only and small enough to load at startup; predict() returns the
+    label and a confidence in [0.5, 1] so callers can defer to Gemini when
+    the model is unsure.
+    """
+
+    def __init__(self, weights, bias=0.0, dim=None, n_min=2, n_max=4):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.dim = dim or len(self.weights)
+        self.n_min = n_min
+        self.n_max = n_max
+        self.confident = 0
+        self.deferred = 0
+
+    @classmethod
+    def train(cls, queries, labels, dim=2 ** 18, epochs=100, lr=0.5, l2=1e-6, n_min=2, n_max=4):
+        """Fits logistic regression with full-batch AdaGrad.
+
+        Per-coordinate step sizes matter here: rare n-grams would barely move
+        under a single global learning rate while the bias overshoots.
+        """
+        if dim & (dim - 1):
+            raise ValueError("dim must be a power of two")
+        indices, values, offsets = featurize(queries, dim, n_min, n_max)
+        y = np.asarray([LABELS.index(label) for label in labels], dtype=np.float32)
+        rows = np.repeat(np.arange(len(queries)), np.diff(offsets))
+        # Balance classes so a skewed log does not just learn the majority
+        positive = max(y.mean(), 1e-6)
+        sample_weight = np.where(y == 1, 0.5 / positive, 0.5 / max(1 - positive, 1e-6)).astype(np.float32)
+
+        weights = np.zeros(dim, dtype=np.float32)
+        squared = np.zeros(dim, dtype=np.float32)
+        bias, bias_squared = 0.0, 0.0
+        for _ in range(epochs):
+            scores = np.bincount(rows, weights=weights[indices] * values, minlength=len(queries)) + bias
+            probs = 1.0 / (1.0 + np.exp(-scores))
+            error = (probs - y) * sample_weight / len(queries)
+            grad = np.zeros(dim, dtype=np.float32)
+            np.add.at(grad, indices, error[rows] * values)
+            grad += l2 * weights
+            squared += grad * grad
+            weights -= lr * grad / (np.sqrt(squared) + 1e-8)
+            bias_grad = float(error.sum())
+            bias_squared += bias_grad * bias_grad
+            bias -= lr * bias_grad / (bias_squared ** 0.5 + 1e-8)
+        return cls(weights, bias, dim, n_min, n_max)
+
+    def probabilities(self, queries):
+        """P(TECH) for each query"""
+        indices, values, offsets = featurize(queries, self.dim, self.n_min, self.n_max)
+        rows = np.repeat(np.arange(len(queries)), np.diff(offsets))
+        scores = np.bincount(rows, weights=self.weights[indices] * values, minlength=len(queries)) + self.bias
+        return 1.0 / (1.0 + np.exp(-scores))
+
+    def predict(self, query):
+        """Returns (label, confidence)"""
+        p = float(self.probabilities([query])[0])
+        return (LABELS[1], p) if p >= 0.5 else (LABELS[0], 1.0 - p)
+
+    def classify(self, query, threshold):
+        """Label if the model is at least `threshold` confident, else None"""
+        label, confidence = self.predict(query)
+        if confidence >= threshold:
+            self.confident += 1
+            return label
+        self.deferred += 1
+        return None
+
+    def classify_many(self, queries, threshold):
+        """classify() for a whole batch in one vectorised scoring pass"""
+        if not queries:
+            return []
+        probs = self.probabilities(queries)
+        labels = []
+        for p in probs:
+            confidence = max(p, 1.0 - p)
+            if confidence >= threshold:
+                self.confident += 1
+                labels.append(LABELS[1] if p >= 0.5 else LABELS[0])
+            else:
+                self.deferred += 1
+                labels.append(None)
+        return labels
+
+    def save(self, path):
+        # float16 halves the file; the precision loss is far below the noise
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float16),
+            bias=np.float32(self.bias),
+            meta=np.asarray([self.dim, self.n_min, self.n_max], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            dim, n_min, n_max = (int(v) for v in data["meta"])
+            return cls(data["weights"].astype(np.float32), float(data["bias"]), dim, n_min, n_max)
+
+    def stats(self):
+        total = self.confident + self.deferred
+        return {
+            "confident": self.confident,
+            "deferred_to_llm": self.deferred,
+            "avoidance_rate": round(self.confident / total, 4) if total else 0,
+        }
+
+
+def evaluate(model, queries, labels, threshold):
+    """Accuracy overall and on the confident subset, plus inference latency"""
+    start = time.perf_counter()
+    probs = model.probabilities(queries)
+    batch_us = (time.perf_counter() - start) / max(len(queries), 1) * 1e6
+
+    start = time.perf_counter()
+    for query in queries[:500]:
+        model.predict(query)
+    single_us = (time.perf_counter() - start) / max(min(len(queries), 500), 1) * 1e6
+
+    y = np.asarray([LABELS.index(label) for label in labels])
+    predicted = (probs >= 0.5).astype(int)
+    confidence = np.maximum(probs, 1 - probs)
+    confident = confidence >= threshold
+    report = {
+        "samples": len(queries),
+        "accuracy": round(float((predicted == y).mean()), 4) if len(y) else 0,
+        "coverage_at_threshold": round(float(confident.mean()), 4) if len(y) else 0,
+        "accuracy_at_threshold": round(float((predicted[confident] == y[confident]).mean()), 4) if confident.any() else None,
+        "latency_us_single": round(single_us, 1),
+        "latency_us_batched": round(batch_us, 1),
+    }
+    for index, label in enumerate(LABELS):
+        hits = (predicted == index) & (y == index)
+        report[f"{label.lower()}_precision"] = round(float(hits.sum() / max((predicted == index).sum(), 1)), 4)
+        report[f"{label.lower()}_recall"] = round(float(hits.sum() / max((y == index).sum(), 1)), 4)
+    return report
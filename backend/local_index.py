@@ -0,0 +1,234 @@
+"""On-disk full-text index (SQLite FTS5) of every search result we fetch.
+
+Results are written on a single background thread so the request path
+never waits on disk; reads use their own WAL connection and take about a
+millisecond. A query is answered locally only when enough fresh rows cover
+(nearly) all of its meaningful terms.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from metrics import Counter
+
+logger = logging.getLogger("TechSearch")
+
+LOCAL_INDEX_LOOKUPS = Counter("techsearch_local_index_lookups_total", "Local index lookups by result", ("result",))
+
+_TOKEN = re.compile(r"[a-z0-9+#]+")
+# Filler words that say nothing about what a result must contain
+STOP_WORDS = {
+    "a", "an", "and", "are", "can", "do", "does", "for", "from", "how", "i", "in", "is", "it",
+    "my", "of", "on", "or", "the", "to", "what", "when", "why", "with",
+}
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS docs ("
+    " id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL, title TEXT, snippet TEXT,"
+    " query TEXT, source TEXT, fetched_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS docs_fetched_at ON docs (fetched_at)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5("
+    " title, snippet, query, content='docs', content_rowid='id', tokenize='porter unicode61')",
+    # Keep the FTS table in step with docs (external-content pattern)
+    "CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN"
+    " INSERT INTO docs_fts (rowid, title, snippet, query) VALUES (new.id, new.title, new.snippet, new.query); END",
+    "CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN"
+    " INSERT INTO docs_fts (docs_fts, rowid, title, snippet, query)"
+    " VALUES ('delete', old.id, old.title, old.snippet, old.query); END",
+    "CREATE TRIGGER IF NOT EXISTS docs_au AFTER UPDATE ON docs BEGIN"
+    " INSERT INTO docs_fts (docs_fts, rowid, title, snippet, query)"
+    " VALUES ('delete', old.id, old.title, old.snippet, old.query);"
+    " INSERT INTO docs_fts (rowid, title, snippet, query) VALUES (new.id, new.title, new.snippet, new.query); END",
+)
+
+
+def stem(word):
+    # Just enough folding that "restarting" covers "restart" and "errors" "error"
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def query_terms(text):
+    return [t for t in dict.fromkeys(_TOKEN.findall(text.lower())) if t not in STOP_WORDS]
+
+
+class LocalIndex:
+    def __init__(self, path, max_docs, max_age, min_hits=5, min_coverage=0.8,
+                 compact_every=1000, max_pending=1000):
+        self.path = path
+        self.max_docs = max_docs
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.min_coverage = min_coverage
+        self.compact_every = compact_every
+        self.max_pending = max_pending
+        self.hits = 0
+        self.misses = 0
+        self.written = 0
+        self.dropped = 0
+        self.compactions = 0
+        self.pruned = 0
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._since_compact = 0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-index")
+        self._write_conn = self._connect()
+        for statement in SCHEMA:
+            self._write_conn.execute(statement)
+        # Read connection for the event loop; WAL lets it read during writes
+        self._read_conn = self._connect()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- WRITES (background thread) ---
+    def feed(self, query, results, source="ddg"):
+        """Queues results for indexing; never blocks the caller"""
+        if not results:
+            return
+        if self._writer is None or self._pending >= self.max_pending:
+            self.dropped += len(results)
+            return
+        with self._pending_lock:
+            self._pending += 1
+        rows = [(r["url"], r.get("title", ""), r.get("snippet", ""), query, source, time.time())
+                for r in results if r.get("url")]
+        self._writer.submit(self._write, rows)
+
+    def _write(self, rows):
+        try:
+            conn = self._write_conn
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO docs (url, title, snippet, query, source, fetched_at) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(url) DO UPDATE SET title = excluded.title, snippet = excluded.snippet,"
+                " source = excluded.source, fetched_at = excluded.fetched_at,"
+                # Every query that surfaced the URL makes it findable later
+                " query = CASE WHEN instr(docs.query, excluded.query) THEN docs.query"
+                " ELSE substr(docs.query || ' | ' || excluded.query, 1, 1000) END",
+                rows,
+            )
+            conn.execute("COMMIT")
+            self.written += len(rows)
+            self._since_compact += len(rows)
+            if self._since_compact >= self.compact_every:
+                self.compact()
+        except Exception as e:
+            logger.error(f"Local index write failed: {e}")
+            if self._write_conn.in_transaction:
+                self._write_conn.execute("ROLLBACK")
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    def compact(self):
+        """Drops expired and overflow rows, then merges the FTS segments"""
+        conn = self._write_conn
+        removed = conn.execute("DELETE FROM docs WHERE fetched_at < ?", (time.time() - self.max_age,)).rowcount
+        removed += conn.execute(
+            "DELETE FROM docs WHERE id IN (SELECT id FROM docs ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_docs,),
+        ).rowcount
+        conn.execute("INSERT INTO docs_fts (docs_fts) VALUES ('optimize')")
+        self.pruned += max(removed, 0)
+        self.compactions += 1
+        self._since_compact = 0
+
+    # --- READS (event loop) ---
+    def search(self, query, limit=5):
+        """Best fresh matches for any of the query's terms, best first"""
+        return [doc for doc, _ in self._candidates(query, limit)][:limit]
+
+    def _candidates(self, query, limit):
+        """(doc, term coverage) for the best-ranked fresh rows matching any term"""
+        terms = query_terms(query)
+        if not terms or self._read_conn is None:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        rows = self._read_conn.execute(
+            "SELECT d.title, d.snippet, d.url, d.query FROM docs_fts f JOIN docs d ON d.id = f.rowid"
+            " WHERE docs_fts MATCH ? AND d.fetched_at >= ?"
+            " ORDER BY bm25(docs_fts, 2.0, 1.0, 3.0) LIMIT ?",
+            (match, time.time() - self.max_age, max(limit * 4, 20)),
+        ).fetchall()
+        stems = {stem(t) for t in terms}
+        candidates = []
+        for title, snippet, url, source_query in rows:
+            words = {stem(w) for w in _TOKEN.findall(f"{title} {snippet} {source_query}".lower())}
+            coverage = len(stems & words) / len(stems)
+            candidates.append(({"title": title, "snippet": snippet, "url": url}, coverage))
+        return candidates
+
+    def answer(self, query, limit=5):
+        """Results if the index alone can answer `query`, else None"""
+        try:
+            candidates = self._candidates(query, limit)
+        except sqlite3.Error as e:
+            logger.error(f"Local index lookup failed: {e}")
+            candidates = []
+        relevant = [doc for doc, coverage in candidates if coverage >= self.min_coverage]
+        if len(relevant) >= min(self.min_hits, limit):
+            self.hits += 1
+            LOCAL_INDEX_LOOKUPS.inc("hit")
+            return relevant[:limit]
+        self.misses += 1
+        LOCAL_INDEX_LOOKUPS.inc("miss")
+        return None
+
+    def close(self):
+        """Writes out queued results, then closes both connections"""
+        if self._writer is None:
+            return
+        self._writer.shutdown(wait=True)
+        self._writer = None
+        self._write_conn.close()
+        self._read_conn.close()
+        self._write_conn = self._read_conn = None
+
+    def stats(self):
+        docs = None
+        if self._read_conn is not None:
+            docs = self._read_conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        return {
+            "path": self.path,
+            "docs": docs,
+            "max_docs": self.max_docs,
+            "max_age": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "written": self.written,
+            "pending_writes": self._pending,
+            "dropped": self.dropped,
+            "pruned": self.pruned,
+            "compactions": self.compactions,
+        }
+
+
+def _open_local_index():
+    if not config.LOCAL_INDEX_PATH:
+        return None
+    try:
+        return LocalIndex(
+            config.LOCAL_INDEX_PATH,
+            max_docs=config.LOCAL_INDEX_MAX_DOCS,
+            max_age=config.LOCAL_INDEX_MAX_AGE,
+            min_hits=config.LOCAL_INDEX_MIN_HITS,
+            min_coverage=config.LOCAL_INDEX_MIN_COVERAGE,
+            compact_every=config.LOCAL_INDEX_COMPACT_EVERY,
+        )
+    except sqlite3.Error as e:
+        # e.g. an SQLite build without FTS5
+        logger.error(f"Local index disabled: {e}")
+        return None
+
+
+LOCAL_INDEX = _open_local_index()
@@ -0,0 +1,175 @@
+"""Deterministic query rewriter tried before asking Gemini to improve a query.
+
+Most rewrites Gemini makes are mechanical: spell out "k8s", drop "pls help",
+strip the file paths and addresses out of a pasted traceback, add the
+language an exception name gives away. These rules do the same in tens of
+microseconds. A rewrite is only used when a rule fired and the result
+still hits TECH_KEYWORDS; anything else returns None and goes to the LLM.
+
+    >>> LocalRewriter().rewrite("pls help k8s pod CrashLoopBackOff??")
+    'kubernetes pod CrashLoopBackOff'
+"""
+import re
+import time
+
+from langchain_logic import KEYWORD_MATCHER
+from resilience import LatencyTracker
+
+# Same ceiling pick_improved applies to Gemini's answers
+MAX_LENGTH = 100
+
+# Matched as whole tokens, so "node.js" and "c#" are left alone. Only
+# spellings with one meaning in any context: "ts" is also a file type or
+# timestamp, "ml" millilitres, "env" a file, so those are left to the LLM.
+ABBREVIATIONS = {
+    "k8s": "kubernetes", "js": "javascript", "py": "python",
+    "postgres": "postgresql", "mongo": "mongodb",
+    "repo": "repository", "repos": "repositories",
+    "pkg": "package", "pkgs": "packages", "func": "function", "impl": "implementation",
+    "err": "error", "msg": "message", "pwsh": "powershell",
+    "osx": "macos", "vscode": "vs code", "win7": "windows 7", "win10": "windows 10",
+    "win11": "windows 11", "cant": "cannot", "doesnt": "does not", "dont": "do not",
+    "isnt": "is not", "wont": "will not", "wouldnt": "would not", "didnt": "did not",
+}
+
+# Chatter that never helps a search engine; longest phrases first. Words
+# that can carry meaning ("hello world", "just in time", "really simple
+# syndication") are not here: greetings are only dropped by _GREETING.
+FILLER = sorted((
+    "can someone help me with", "can someone help me", "can anyone help me", "can you help me",
+    "can someone help", "can anyone help", "please help me", "please help", "help me",
+    "pls help", "plz help", "help pls", "help plz",
+    "i need help with", "i need help", "does anyone know", "anyone know", "any idea",
+    "any ideas", "thanks in advance", "thank you", "thanks", "please", "pls", "plz",
+    "guys", "urgent", "asap", "kindly", "btw", "idk", "lol",
+    "um", "uh", "i am getting", "i'm getting",
+    "im getting", "i keep getting", "i got", "i get",
+), key=len, reverse=True)
+
+# Exception names that give the language away; first match wins, so the
+# JavaScript messages come before Python's generic TypeError
+LANGUAGE_HINTS = (
+    (re.compile(r"\bcannot read propert(?:y|ies) of (?:undefined|null)\b|\bis not a function\b|"
+                r"\bReferenceError\b|\bUnhandledPromiseRejection", re.I), "javascript"),
+    (re.compile(r"\b(?:Type|Value|Key|Index|Attribute|Name|Import|ModuleNotFound|Indentation|"
+                r"ZeroDivision|Recursion|FileNotFound|Syntax)Error\b|\bTraceback\b"), "python"),
+    (re.compile(r"\b(?:NullPointer|ClassNotFound|ArrayIndexOutOfBounds|ClassCast|IllegalArgument|"
+                r"IllegalState|ConcurrentModification|NumberFormat)Exception\b|\bNoClassDefFoundError\b"), "java"),
+    (re.compile(r"\b(?:NullReference|InvalidOperation|ArgumentNull)Exception\b"), "c#"),
+    (re.compile(r"\bsegmentation fault\b|\bcore dumped\b", re.I), "c++"),
+    (re.compile(r"\bborrow of moved value\b|\berror\[E\d{4}\]"), "rust"),
+    (re.compile(r"\bLateInitializationError\b|\bRenderFlex overflowed\b"), "flutter"),
+)
+LANGUAGES = {"python", "java", "javascript", "typescript", "c", "c++", "c#", "rust", "go", "kotlin",
+             "swift", "dart", "flutter", "php", "ruby", "node", "react", "django", "scala"}
+
+# Noise in pasted error output: nothing in it is searchable
+_NOISE = (
+    re.compile(r'\bFile "[^"]*", line \d+(?:, in \S+)?'),
+    re.compile(r"\bTraceback \(most recent call last\):?"),
+    re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"),
+    re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I),
+    # Memory addresses; 8-digit codes like 0x80070005 are kept
+    re.compile(r"\bat 0x[0-9a-f]+\b|\b0x[0-9a-f]{9,}\b", re.I),
+    # File paths, with any :line:column after them
+    re.compile(r"(?<![\w/])(?:[a-z]:)?[\\/](?:[\w.@~-]+[\\/])+[\w.@~-]*(?::\d+){0,2}", re.I),
+    re.compile(r"\bline \d+\b", re.I),
+    # Java / JS stack frames: "at com.foo.Bar.run(Bar.java:12)", "(app.js:3:14)"
+    re.compile(r"\bat [\w$.<>]+\([\w.]+:\d+(?::\d+)?\)|\([\w.-]+\.\w+:\d+(?::\d+)?\)|\bat [\w$.]+\.\w+(?=\s|$)"),
+    re.compile(r"^\s*\[?(?:error|fatal|err)\]?:\s*|\[(?:error|fatal|warn(?:ing)?)\]", re.I),
+)
+# Windows HRESULTs, errno, compiler / database codes (CS1002, TS2304, ORA-00942)
+_ERROR_CODE = re.compile(r"\b0x[0-9a-f]{8}\b|\berrno\s*\d+|\b(?:CS|TS|LNK|MSB|E|C)\d{4}\b|\bORA-\d{5}\b", re.I)
+# A greeting opening the query: "hi, ...", "hey guys ...", never "hello, world"
+_GREETING = re.compile(r"^(?:hi|hello|hey)(?![\s,!.;:]*world\b)(?:\s+(?:guys|all|everyone|folks|there)\b|\s*[,!.;:])[\s,!.;:]*", re.I)
+_ERROR_WORDS = {"error", "exception", "crash", "bug", "stack trace"}
+_EDGE = r"(?<![\w.#+'-]){}(?![\w.#+'-])"
+
+
+def _pattern(words):
+    return re.compile(_EDGE.format("(" + "|".join(map(re.escape, words)) + ")"), re.I)
+
+
+class LocalRewriter:
+    def __init__(self, abbreviations=ABBREVIATIONS, filler=FILLER):
+        self.abbreviations = abbreviations
+        self._abbreviation = _pattern(abbreviations)
+        self._filler = _pattern(filler)
+        self.attempts = 0
+        self.rewritten = 0
+        self.rules = {"abbreviation": 0, "error": 0, "filler": 0, "language": 0, "qualifier": 0}
+        self.latency = LatencyTracker(1000)
+
+    def rewrite(self, query):
+        """Improved query, or None if the rules cannot improve it"""
+        start = time.perf_counter()
+        self.attempts += 1
+        improved, fired = self._apply(query)
+        ok = bool(fired) and improved.lower() != " ".join(query.lower().split())
+        if ok:
+            hits = KEYWORD_MATCHER.find(improved)
+            ok = (2 <= len(improved.split()) and len(improved) <= MAX_LENGTH
+                  and any(hit.category == "TECH" for hit in hits)
+                  and not any(hit.category == "NON_TECH" for hit in hits))
+        if ok:
+            self.rewritten += 1
+            for rule in fired:
+                self.rules[rule] += 1
+        self.latency.add(time.perf_counter() - start)
+        return improved if ok else None
+
+    def _apply(self, query):
+        fired = []
+        text = " ".join(query.split())
+
+        cleaned = text
+        for pattern in _NOISE:
+            cleaned = pattern.sub(" ", cleaned)
+        cleaned = " ".join(cleaned.split())
+        if cleaned != text:
+            fired.append("error")
+        text = cleaned
+
+        expanded = self._abbreviation.sub(lambda m: self.abbreviations[m.group(1).lower()], text)
+        if expanded != text:
+            fired.append("abbreviation")
+        text = expanded
+
+        greeted = _GREETING.sub("", text)
+        # Keyword spans are over the lowercased text, which now lines up with ours
+        spans = [(hit.start, hit.end) for hit in KEYWORD_MATCHER.find(greeted) if hit.category == "TECH"]
+        kept = self._filler.sub(
+            lambda m: m.group(0) if any(s < m.end() and m.start() < e for s, e in spans) else " ", greeted,
+        )
+        kept = " ".join(kept.split())
+        if kept != text:
+            fired.append("filler")
+        text = kept
+
+        text = re.sub(r"([?!.,;:])\1+", r"\1", text).strip(" ?!.,;:-")
+        text = " ".join(text.split())
+
+        keywords = {hit.keyword for hit in KEYWORD_MATCHER.find(text)}
+        if not keywords & LANGUAGES:
+            for pattern, language in LANGUAGE_HINTS:
+                if pattern.search(query):
+                    text = f"{text} {language}"
+                    fired.append("language")
+                    break
+        if _ERROR_CODE.search(text) and not keywords & _ERROR_WORDS:
+            text = f"{text} error"
+            fired.append("qualifier")
+        return text, fired
+
+    def stats(self):
+        def us(seconds):
+            return round(seconds * 1e6, 1) if seconds is not None else None
+
+        return {
+            "attempts": self.attempts,
+            "rewritten": self.rewritten,
+            "deferred_to_llm": self.attempts - self.rewritten,
+            "avoidance_rate": round(self.rewritten / self.attempts, 4) if self.attempts else 0,
+            "rules": dict(self.rules),
+            "latency_us": {"p50": us(self.latency.percentile(50)), "p99": us(self.latency.percentile(99))},
+        }
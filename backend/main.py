@@ -1,17 +1,67 @@
+# Before anything else, so every import after this one is timed
+from startup import STARTUP
+STARTUP.install()
+
 import logging
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from typing import List, Optional
 from pydantic import BaseModel, Field
-from langchain_logic import classify_query, improve_query, search_ddg
+import async_engine
+import config
+import deadline
+import metrics
+from admission import ADMISSION, EXPENSIVE, RATE_LIMITER, STANDARD, Overloaded
+from pipeline import (
+    CLASSIFY_BATCHER, COMBINED_STATS, FLIGHTS, LOCAL_MODEL, LOCAL_REWRITER, REWRITE_CACHE, SEARCH_CACHE,
+    SIMILAR_CACHE, SPECULATIVE_MODES, VERDICT_CACHE, VERDICT_LOG,
+    prepare_query, request_priority, run_search, run_search_batch, stream_search
+)
+from local_index import LOCAL_INDEX
+from search_providers import SEARCH_FANOUT
+from pagination import PAGE_SESSIONS, InvalidCursor, PageFetchFailed, decode_cursor
+from responses import CompressionMiddleware, FastJSONResponse, etag, etag_matches, json_bytes
+from warmup import QUERY_LOG, WARMUP
 
 # --- LOGGING SETUP ---
 # This helps you see what's happening in your terminal in real-time
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TechSearch")
 
+# --- LIFESPAN ---
+# Pooled upstream connections live for the whole app, not per request
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.LLM_COMBINED_ENABLED and config.SPECULATIVE_MODE in SPECULATIVE_MODES:
+        logger.warning(
+            f"SPECULATIVE_MODE={config.SPECULATIVE_MODE} is ignored while LLM_COMBINED_ENABLED is on"
+        )
+    with STARTUP.phase("engine"):
+        await async_engine.startup()
+    with STARTUP.phase("warmup"):
+        WARMUP.start(run_search)
+    STARTUP.mark_ready()
+    try:
+        yield
+    finally:
+        WARMUP.stop()
+        QUERY_LOG.close()
+        VERDICT_LOG.close()
+        PAGE_SESSIONS.close()
+        SEARCH_CACHE.close()
+        VERDICT_CACHE.close()
+        REWRITE_CACHE.close()
+        if LOCAL_INDEX is not None:
+            LOCAL_INDEX.close()
+        await async_engine.shutdown()
+
 app = FastAPI(
     title="Tech Search Engine API",
-    description="A filtered search engine that only allows technical queries."
+    description="A filtered search engine that only allows technical queries.",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # --- CORS SETUP ---
@@ -22,11 +72,102 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=config.COMPRESSION_MIN_BYTES,
+    gzip_level=config.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=config.COMPRESSION_BROTLI_QUALITY,
+)
+# Added last so it wraps everything, CORS included
+app.add_middleware(metrics.MetricsMiddleware, on_first_request=STARTUP.mark_first_request)
 
 # --- MODELS ---
 class QueryRequest(BaseModel):
     # Added validation: Query must be at least 2 characters long
     query: str = Field(..., min_length=2, description="The search term entered by the user")
+    # End-to-end budget for /search; REQUEST_DEADLINE_MS when omitted
+    deadline_ms: Optional[float] = Field(
+        None, ge=config.REQUEST_DEADLINE_MIN_MS, description="Answer within this many milliseconds"
+    )
+
+class BatchQueryRequest(BaseModel):
+    # Oversized batches are rejected with 422, never silently truncated
+    queries: List[QueryRequest] = Field(..., min_length=1, max_length=config.BATCH_MAX_ITEMS)
+
+class PagedQueryRequest(QueryRequest):
+    page_size: int = Field(config.PAGE_SIZE, ge=1, le=config.PAGE_MAX_SIZE)
+
+async def admit(request, priority):
+    """Rate-limits the client, then waits for a pipeline slot.
+
+    Returns a ticket for ADMISSION.leave(); sheds with 429 (client over its
+    rate) or 503 (queue full / waited too long), both with Retry-After.
+    """
+    client = request.client.host if request.client else "unknown"
+    try:
+        RATE_LIMITER.check(client)
+        return await ADMISSION.enter(priority)
+    except Overloaded as e:
+        logger.warning(f"Shed request from {client}: {e.reason}")
+        raise HTTPException(
+            status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)}
+        )
+
+@asynccontextmanager
+async def admitted(request, priority):
+    ticket = await admit(request, priority)
+    try:
+        yield
+    finally:
+        ADMISSION.leave(ticket)
+
+class AdmittedStreamingResponse(StreamingResponse):
+    # Holds the admission slot until the stream ends, even if the client
+    # disconnects before the first chunk
+    def __init__(self, *args, ticket=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            ADMISSION.leave(self.ticket)
+
+NON_TECH_MESSAGE = "This is a Tech-Only search engine. Please ask a technology-related question."
+
+def build_response(user_query, outcome):
+    """Shapes a pipeline outcome into the JSON the Flutter app expects"""
+    category = outcome["category"]
+    if "ERROR" in category:
+        return {"status": "error", "message": "AI Classification service unavailable"}
+    if category == "NON_TECH":
+        response = {
+            "status": "invalid",
+            "message": NON_TECH_MESSAGE,
+            "results": []
+        }
+    elif outcome.get("error"):
+        response = {"status": "error", "message": "Search failed for this query."}
+    else:
+        results = outcome["results"]
+        response = {
+            "status": "success",
+            "query_type": "TECH",
+            "original_query": user_query,
+            "improved_query": outcome["improved_query"],
+            "results": results,
+            "count": len(results)
+        }
+
+    # Lets us weigh latency saved against wasted upstream calls
+    if outcome["speculation"]:
+        response["speculation"] = outcome["speculation"]
+    if outcome["llm_path"]:
+        response["llm_path"] = outcome["llm_path"]
+    if outcome["degraded"]:
+        response["degraded"] = outcome["degraded"]
+    return response
 
 @app.get("/")
 def home():
@@ -36,14 +177,81 @@ def home():
         "version": "1.0.0"
     }
 
-@app.post("/search")
-async def search_endpoint(request_data: QueryRequest):
-    user_query = request_data.query.strip()
+@app.get("/ready")
+def ready():
+    # Readiness probe: 503 while the startup cache warm-up is still early on
+    warmup = WARMUP.stats()
+    if not warmup["ready"]:
+        return FastJSONResponse(status_code=503, content={"status": "warming", "warmup": warmup})
+    return {"status": "ready", "warmup": warmup}
+
+@app.get("/cache/stats")
+def cache_stats():
+    # Hit / miss / eviction counters for sizing the caches
+    return {
+        "search": SEARCH_CACHE.stats(),
+        "verdicts": VERDICT_CACHE.stats(),
+        "rewrites": REWRITE_CACHE.stats(),
+        "similar": SIMILAR_CACHE.stats()
+    }
+
+@app.get("/llm/stats")
+def llm_stats():
+    # How often Gemini was avoided or shared across queries, and its health
+    return {
+        "gemini": async_engine.GEMINI_GUARD.stats(),
+        "classify_batcher": CLASSIFY_BATCHER.stats(),
+        "combined": COMBINED_STATS,
+        "local_model": LOCAL_MODEL.stats() if LOCAL_MODEL else None,
+        "local_rewriter": LOCAL_REWRITER.stats() if LOCAL_REWRITER else None
+    }
+
+@app.get("/pipeline/stats")
+def pipeline_stats():
+    # Requests that piggybacked on an identical in-flight stage
+    return {
+        "coalescing": {stage: flight.stats() for stage, flight in FLIGHTS.items()},
+        "search_providers": SEARCH_FANOUT.stats(),
+        "local_index": LOCAL_INDEX.stats() if LOCAL_INDEX else None,
+        "page_sessions": PAGE_SESSIONS.stats(),
+        "admission": ADMISSION.stats(),
+        "warmup": WARMUP.stats(),
+        "query_log": QUERY_LOG.stats(),
+        "verdict_log": VERDICT_LOG.stats(),
+        "rate_limit": RATE_LIMITER.stats(),
+        "blocking_pool": async_engine.blocking_stats()
+    }
+
+@app.get("/startup/stats")
+def startup_stats():
+    # Where cold start went: imports per package / module, lifespan phases, first request
+    return STARTUP.stats()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Prometheus text exposition format
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+async def search(user_query, deadline_ms, request):
+    """Shared by POST and GET /search; returns the outcome (None on a
+    system error) and the response body"""
     logger.info(f"Received query: {user_query}")
+    QUERY_LOG.write(user_query)
 
+    budget_ms = min(deadline_ms or config.REQUEST_DEADLINE_MS, config.REQUEST_DEADLINE_MAX_MS)
+    if budget_ms > 0:
+        # The request models enforce the floor for clients; this covers config
+        budget_ms = max(budget_ms, config.REQUEST_DEADLINE_MIN_MS)
     try:
-        # 1. Classification Step
-        category = classify_query(user_query)
+        # 1-3. Classification, Improvement and Search (see pipeline.py);
+        # cheap queries skip the admission queue. Time spent queued counts
+        # against the deadline too
+        with deadline.budget(budget_ms / 1000) as budget:
+            async with admitted(request, request_priority(user_query)):
+                outcome = await run_search(user_query)
+        if budget is not None:
+            outcome["degraded"] = budget.degraded
+        category = outcome["category"]
         
         if "ERROR" in category:
             logger.error(f"Classification AI Error: {category}")
@@ -52,41 +260,188 @@ async def search_endpoint(request_data: QueryRequest):
         # Handle Non-Tech Queries
         if category == "NON_TECH":
             logger.warning(f"Query REJECTED as Non-Tech: {user_query}")
-            return {
-                "status": "invalid",
-                "message": "This is a Tech-Only search engine. Please ask a technology-related question.",
-                "results": []
-            }
-
-        # 2. Improvement Step
-        # If improvement fails, we still want to search, so we wrap it safely
+        return outcome, build_response(user_query, outcome)
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.critical(f"System Error: {str(e)}")
+        return None, {
+            "status": "error", 
+            "message": "An unexpected server error occurred."
+        }
+
+@app.post("/search")
+async def search_endpoint(request_data: QueryRequest, request: Request):
+    _, response = await search(request_data.query.strip(), request_data.deadline_ms, request)
+    # Returning the Response ourselves skips FastAPI's jsonable_encoder pass
+    return FastJSONResponse(response)
+
+@app.get("/search")
+async def search_get_endpoint(
+    request: Request,
+    q: str = Query(..., min_length=2, description="The search term entered by the user"),
+    deadline_ms: Optional[float] = Query(
+        None, ge=config.REQUEST_DEADLINE_MIN_MS, description="Answer within this many milliseconds"
+    )
+):
+    """Cacheable form of POST /search.
+
+    Carries a weak ETag over the verdict, improved query and results, so a
+    client or proxy holding the same answer gets 304 Not Modified (and no
+    body) by sending it back in If-None-Match. Errors and answers cut short
+    by the deadline are marked no-store.
+    """
+    outcome, response = await search(q.strip(), deadline_ms, request)
+    if outcome is None or response["status"] == "error" or outcome["degraded"]:
+        return FastJSONResponse(response, headers={"Cache-Control": "no-store"})
+
+    tag = etag([response["status"], response.get("improved_query"), response["results"]])
+    # Vary goes on the 304 too, which never reaches the compressor
+    headers = {
+        "ETag": tag,
+        "Cache-Control": f"public, max-age={config.SEARCH_HTTP_MAX_AGE}",
+        "Vary": "Accept-Encoding"
+    }
+    if etag_matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(response, headers=headers)
+
+@app.post("/search/stream")
+async def search_stream_endpoint(request_data: QueryRequest, request: Request):
+    """Streaming twin of /search, as NDJSON (one JSON event per line).
+
+    Events arrive in order: classification, improved_query, one result per
+    DDG hit as it is fetched, then done. A NON_TECH query ends with an
+    "invalid" event and a failure with an "error" event.
+    """
+    user_query = request_data.query.strip()
+    logger.info(f"Received streaming query: {user_query}")
+    QUERY_LOG.write(user_query)
+    ticket = await admit(request, request_priority(user_query))
+
+    async def events():
         try:
-            improved = improve_query(user_query)
-            logger.info(f"Query improved to: {improved}")
+            async for event in stream_search(user_query):
+                yield json_bytes(event) + b"\n"
+                if event["event"] == "classification" and event["category"] != "TECH":
+                    logger.warning(f"Query REJECTED as Non-Tech: {user_query}")
+                    yield json_bytes({"event": "invalid", "message": NON_TECH_MESSAGE}) + b"\n"
         except Exception as e:
-            logger.error(f"Improvement failed: {e}")
-            improved = user_query
+            logger.critical(f"Streaming System Error: {str(e)}")
+            yield json_bytes({"event": "error", "message": "An unexpected server error occurred."}) + b"\n"
+
+    # no-cache/no-transform keeps proxies from buffering the stream
+    return AdmittedStreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"},
+        ticket=ticket
+    )
+
+@app.post("/search/paged")
+async def search_paged_endpoint(request_data: PagedQueryRequest, request: Request):
+    """First page of a paginated search.
+
+    Returns a signed, opaque next_cursor; pass it to GET /search/paged to
+    fetch the next page without re-running classification or improvement.
+    """
+    user_query = request_data.query.strip()
+    logger.info(f"Received paged query: {user_query}")
+    QUERY_LOG.write(user_query)
 
-        # 3. Execution Step (Search)
-        results = search_ddg(improved)
-        
+    try:
+        async with admitted(request, request_priority(user_query)):
+            outcome = await prepare_query(user_query)
+            if "ERROR" in outcome["category"]:
+                raise HTTPException(status_code=502, detail="AI Classification service unavailable")
+            if outcome["category"] == "NON_TECH":
+                logger.warning(f"Query REJECTED as Non-Tech: {user_query}")
+                return build_response(user_query, outcome)
+
+            improved = outcome["improved_query"]
+            try:
+                results, next_cursor = await PAGE_SESSIONS.page(improved, 0, request_data.page_size)
+            except PageFetchFailed:
+                raise HTTPException(status_code=502, detail="Search failed for this query.")
         return {
             "status": "success",
             "query_type": "TECH",
             "original_query": user_query,
             "improved_query": improved,
             "results": results,
-            "count": len(results)
+            "count": len(results),
+            "next_cursor": next_cursor
         }
-
     except HTTPException as he:
         raise he
     except Exception as e:
         logger.critical(f"System Error: {str(e)}")
         return {
-            "status": "error", 
+            "status": "error",
             "message": "An unexpected server error occurred."
         }
+
+@app.get("/search/paged")
+async def search_next_page_endpoint(cursor: str, request: Request):
+    """Next page for a cursor from /search/paged; next_cursor is null at the end"""
+    try:
+        improved, offset, page_size = decode_cursor(cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async with admitted(request, STANDARD):
+        try:
+            results, next_cursor = await PAGE_SESSIONS.page(improved, offset, page_size)
+        except PageFetchFailed:
+            # The cursor stays valid: retrying it resumes where this left off
+            raise HTTPException(status_code=502, detail="Search failed for this query.")
+    return {
+        "status": "success",
+        "query_type": "TECH",
+        "improved_query": improved,
+        "results": results,
+        "count": len(results),
+        "next_cursor": next_cursor
+    }
+
+@app.post("/search/batch")
+async def search_batch_endpoint(request_data: BatchQueryRequest, request: Request):
+    """Validates and searches many queries in one call.
+
+    Results come back in input order, one per item, each with its own
+    status (success / invalid / error). A failing item never fails the
+    batch; only an oversized or malformed batch is rejected (422).
+    """
+    queries = [item.query.strip() for item in request_data.queries]
+    logger.info(f"Received batch of {len(queries)} queries")
+    for query in queries:
+        QUERY_LOG.write(query)
+
+    try:
+        # A whole batch takes one slot, at the lowest priority
+        async with admitted(request, EXPENSIVE):
+            outcomes = await run_search_batch(queries)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.critical(f"Batch System Error: {str(e)}")
+        return {
+            "status": "error",
+            "message": "An unexpected server error occurred."
+        }
+
+    items = []
+    for index, (query, outcome) in enumerate(zip(queries, outcomes)):
+        items.append({"index": index, "query": query, **build_response(query, outcome)})
+    summary = {status: sum(1 for item in items if item["status"] == status)
+               for status in ("success", "invalid", "error")}
+    return {
+        "status": "success" if summary["error"] == 0 else "partial",
+        "count": len(items),
+        "summary": summary,
+        "items": items
+    }
 # from fastapi import FastAPI, HTTPException
 # from fastapi.middleware.cors import CORSMiddleware
 # from pydantic import BaseModel
@@ -0,0 +1,188 @@
+"""Per-stage latency histograms and outcome counters, in Prometheus text format.
+
+Deliberately tiny: everything is recorded from the event loop thread, so
+there are no locks, and an observation is a bisect plus two additions.
+
+    with stage("improve"):
+        ...
+
+records into techsearch_stage_seconds{stage="improve"} and, when called
+inside a request, into that request's Server-Timing header.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Stage timings for the current request; None outside a request
+_TIMINGS = ContextVar("stage_timings", default=None)
+
+# Seconds; spans an in-memory keyword hit up to a slow Gemini call
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_REGISTRY = []
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {} if labels else {(): 0}
+        _REGISTRY.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, values)} {total}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        self._values[label_values] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series = {}
+        _REGISTRY.append(self)
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for values, (counts, total) in sorted(self._series.items()):
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                running += count
+                lines.append(f"{self.name}_bucket{_label_text(names, values + (bound,))} {running}")
+            labels = _label_text(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {running}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("techsearch_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+REQUEST_SECONDS = Histogram("techsearch_request_seconds", "End-to-end request latency", ("route", "status"))
+REQUESTS_IN_FLIGHT = Gauge("techsearch_requests_in_flight", "Requests currently being handled")
+CLASSIFICATIONS = Counter(
+    "techsearch_classifications_total", "Query verdicts by category and where they came from",
+    ("category", "source"),
+)
+REWRITES = Counter(
+    "techsearch_rewrites_total", "Query rewrites by where they came from", ("source",),
+)
+FALLBACKS = Counter(
+    "techsearch_fallbacks_total", "Degraded paths taken instead of the normal one", ("stage",),
+)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        timings = _TIMINGS.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def record_classification(category, source):
+    CLASSIFICATIONS.inc("ERROR" if "ERROR" in category else category, source)
+
+
+def record_rewrite(source):
+    REWRITES.inc(source)
+
+
+def record_fallback(stage_name):
+    FALLBACKS.inc(stage_name)
+
+
+def server_timing(timings):
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def render():
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Counts in-flight requests, times them, and adds a Server-Timing header.
+
+    Only stages that finished before the response headers went out are
+    listed, so streamed responses carry no header. `on_first_request` is
+    called once, when the first HTTP request arrives.
+    """
+
+    def __init__(self, app, on_first_request=None):
+        self.app = app
+        self.on_first_request = on_first_request
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if self.on_first_request is not None:
+            self.on_first_request()
+            self.on_first_request = None
+
+        timings = {}
+        token = _TIMINGS.set(timings)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if timings:
+                    total = dict(timings, total=time.perf_counter() - start)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(total).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _TIMINGS.reset(token)
+            # The matched route template keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route, str(status[0]))
@@ -0,0 +1,202 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import config
+from async_engine import run_blocking
+from langchain_logic import DDG_URL, ddg_page
+
+logger = logging.getLogger("TechSearch")
+
+# Cursors are signed so a client cannot page through a query that never
+# passed classification. A random secret means cursors die with the process.
+_CURSOR_SECRET = (config.CURSOR_SECRET or os.urandom(32).hex()).encode()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class PageFetchFailed(Exception):
+    """DDG could not be reached; the session stays open so a retry can resume"""
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def encode_cursor(query, offset, page_size):
+    payload = json.dumps({"q": query, "o": offset, "n": page_size}, separators=(",", ":")).encode()
+    signature = hmac.new(_CURSOR_SECRET, payload, hashlib.sha256).digest()[:16]
+    return f"{_b64(payload)}.{_b64(signature)}"
+
+
+def decode_cursor(cursor):
+    """Returns (query, offset, page_size); raises InvalidCursor if tampered"""
+    try:
+        payload_part, signature_part = cursor.split(".", 1)
+        payload = _unb64(payload_part)
+        signature = _unb64(signature_part)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    expected = hmac.new(_CURSOR_SECRET, payload, hashlib.sha256).digest()[:16]
+    if not hmac.compare_digest(signature, expected):
+        raise InvalidCursor("Cursor signature mismatch")
+    data = json.loads(payload)
+    return data["q"], int(data["o"]), int(data["n"])
+
+
+class PageSession:
+    """One DDGS client plus everything fetched so far for one query.
+
+    An upstream page is requested only when a client pages past what is
+    buffered; it arrives whole and is kept for the pages after it. Like
+    iter_ddg, it goes to DDG_URL when that is set.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.ddgs = None
+        self.results = []
+        self.exhausted = False
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.upstream_fetches = 0
+        self.lock = asyncio.Lock()
+        # Requests using the session; an evicted one closes when the last leaves
+        self.users = 0
+        self.evicted = False
+        self._seen = set()
+        self._upstream_page = 0
+
+    def fill(self, want):
+        """Blocking: fetches upstream pages until `want` are buffered or DDG runs dry"""
+        want = min(want, config.PAGE_MAX_RESULTS)
+        while len(self.results) < want and not self.exhausted:
+            if self.ddgs is None and not DDG_URL:
+                from ddgs import DDGS
+
+                self.ddgs = DDGS()
+            self.upstream_fetches += 1
+            page = ddg_page(self.query, self._upstream_page + 1, config.PAGE_FETCH_SIZE, self.ddgs)
+            self._upstream_page += 1
+            fresh = [result for result in page if result["url"] not in self._seen]
+            self._seen.update(result["url"] for result in fresh)
+            self.results.extend(fresh)
+            # An upstream page with nothing new means DDG has run out
+            if not fresh:
+                self.exhausted = True
+        if len(self.results) >= config.PAGE_MAX_RESULTS:
+            self.exhausted = True
+
+    def close(self):
+        if self.ddgs is None:
+            return
+        exit_fn = getattr(self.ddgs, "__exit__", None)
+        if exit_fn is not None:
+            try:
+                exit_fn(None, None, None)
+            except Exception as e:
+                logger.error(f"Closing DDGS session failed: {e}")
+
+
+class PageSessionPool:
+    """Keeps PageSessions per normalised query, bounded by count, idle time and age"""
+
+    def __init__(self, max_sessions, idle_ttl, max_lifetime):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_lifetime = max_lifetime
+        self._sessions = OrderedDict()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def _sweep(self, now):
+        for key in list(self._sessions):
+            session = self._sessions[key]
+            if now - session.last_used > self.idle_ttl or now - session.created > self.max_lifetime:
+                self._evict(key)
+
+    def _evict(self, key):
+        session = self._sessions.pop(key)
+        session.evicted = True
+        # A session still in use is closed by release() once its last user leaves
+        if not session.users:
+            session.close()
+        self.evicted += 1
+
+    def release(self, session):
+        session.users -= 1
+        if session.evicted and not session.users:
+            session.close()
+
+    def acquire(self, query):
+        now = time.monotonic()
+        self._sweep(now)
+        key = " ".join(query.lower().split())
+        session = self._sessions.get(key)
+        if session is None:
+            session = PageSession(query)
+            self._sessions[key] = session
+            self.created += 1
+            while len(self._sessions) > self.max_sessions:
+                self._evict(next(iter(self._sessions)))
+        else:
+            self.reused += 1
+        self._sessions.move_to_end(key)
+        session.last_used = now
+        session.users += 1
+        return session
+
+    async def page(self, query, offset, page_size):
+        """Returns (results, next_cursor); next_cursor is None at the end.
+
+        Raises PageFetchFailed if DDG fails before the page is buffered.
+        """
+        session = self.acquire(query)
+        try:
+            async with session.lock:
+                if len(session.results) < offset + page_size and not session.exhausted:
+                    try:
+                        await run_blocking(session.fill, offset + page_size)
+                    except Exception as e:
+                        logger.error(f"DDG page fetch failed: {e}")
+                        raise PageFetchFailed(str(e)) from e
+        finally:
+            self.release(session)
+        results = session.results[offset:offset + page_size]
+        more = offset + page_size < len(session.results) or not session.exhausted
+        next_cursor = encode_cursor(query, offset + page_size, page_size) if more and results else None
+        return results, next_cursor
+
+    def close(self):
+        for key in list(self._sessions):
+            self._evict(key)
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "reused": self.reused,
+            "evicted": self.evicted,
+            "upstream_fetches": sum(s.upstream_fetches for s in self._sessions.values()),
+        }
+
+
+PAGE_SESSIONS = PageSessionPool(
+    max_sessions=config.PAGE_MAX_SESSIONS,
+    idle_ttl=config.PAGE_SESSION_IDLE_TTL,
+    max_lifetime=config.PAGE_SESSION_MAX_LIFETIME,
+)
@@ -0,0 +1,636 @@
+import asyncio
+import logging
+import os
+
+import config
+import deadline
+from admission import CHEAP, EXPENSIVE, STANDARD
+from async_engine import GEMINI_GUARD, call_gemini_async, classify_batch_async, search_ddg_stream
+from batcher import MicroBatcher
+from cache import FRESH, MISS, TieredCache, canonical_query
+from langchain_logic import (
+    KEYWORD_MATCHER, classify_prompt, combined_prompt, improve_prompt, parse_classification, parse_combined,
+    pick_improved,
+)
+from metrics import record_classification, record_fallback, record_rewrite, stage
+from local_index import LOCAL_INDEX
+from local_rewriter import LocalRewriter
+from search_providers import SEARCH_FANOUT
+from similarity import SimilarityCache
+from singleflight import SingleFlight
+from warmup import JsonlLog
+
+logger = logging.getLogger("TechSearch")
+
+SPECULATIVE_MODES = ("improve", "full")
+
+# Head queries dominate traffic, so DDG results are cached by query
+SEARCH_CACHE = TieredCache(
+    "search",
+    max_entries=config.SEARCH_CACHE_SIZE,
+    ttl=config.SEARCH_CACHE_TTL,
+    stale_ttl=config.SEARCH_CACHE_STALE_TTL,
+    db_path=config.SEARCH_CACHE_DB or config.SHARED_CACHE_PATH or None,
+    db_max_rows=config.SEARCH_CACHE_DB_MAX_ROWS,
+    db_busy_timeout=config.SHARED_CACHE_BUSY_TIMEOUT_MS / 1000,
+)
+
+# LLM answers keyed by canonical query; NON_TECH verdicts are kept too so
+# repeated off-topic spam never reaches Gemini. With SHARED_CACHE_PATH set,
+# one worker's Gemini answer serves every other worker too
+VERDICT_CACHE = TieredCache(
+    "verdict",
+    max_entries=config.VERDICT_CACHE_SIZE,
+    ttl=config.VERDICT_CACHE_TTL,
+    db_path=config.SHARED_CACHE_PATH or None,
+    db_max_rows=config.SHARED_CACHE_MAX_ROWS,
+    db_busy_timeout=config.SHARED_CACHE_BUSY_TIMEOUT_MS / 1000,
+)
+REWRITE_CACHE = TieredCache(
+    "rewrite",
+    max_entries=config.REWRITE_CACHE_SIZE,
+    ttl=config.REWRITE_CACHE_TTL,
+    db_path=config.SHARED_CACHE_PATH or None,
+    db_max_rows=config.SHARED_CACHE_MAX_ROWS,
+    db_busy_timeout=config.SHARED_CACHE_BUSY_TIMEOUT_MS / 1000,
+)
+# Catches paraphrases the exact-match memos above miss
+SIMILAR_CACHE = SimilarityCache(
+    config.SIMILAR_CACHE_SIZE,
+    config.SIMILAR_CACHE_TTL,
+    threshold=config.SIMILAR_CACHE_THRESHOLD,
+    char_ngrams=config.SIMILAR_CACHE_CHAR_NGRAMS,
+)
+
+# Training data for the next local model, written off the event loop
+VERDICT_LOG = JsonlLog(config.VERDICT_LOG_PATH, name="verdict-log")
+
+# Mechanical rewrites never need Gemini
+LOCAL_REWRITER = LocalRewriter() if config.LOCAL_REWRITE_ENABLED else None
+
+# Concurrent ambiguous queries share one structured Gemini request
+CLASSIFY_BATCHER = MicroBatcher(
+    classify_batch_async,
+    max_batch=config.LLM_BATCH_MAX,
+    window=config.LLM_BATCH_WINDOW_MS / 1000,
+)
+
+def _load_local_model(path):
+    if not path:
+        return None
+    if not os.path.exists(path):
+        logger.warning(f"Local intent model not found at {path}; using Gemini only")
+        return None
+    # numpy is only needed when a model is configured
+    from local_classifier import LocalClassifier
+    return LocalClassifier.load(path)
+
+LOCAL_MODEL = _load_local_model(config.LOCAL_MODEL_PATH)
+
+if LOCAL_INDEX is not None:
+    SEARCH_FANOUT.listeners.append(lambda provider, query, results: LOCAL_INDEX.feed(query, results, provider))
+
+# Identical queries arriving together share one in-flight run of each stage
+FLIGHTS = {stage: SingleFlight(stage) for stage in ("classify", "combined", "improve", "search")}
+
+# Time LLM stages leave for the search when the request has a deadline
+SEARCH_RESERVE = config.DEADLINE_SEARCH_RESERVE_MS / 1000
+
+# How the combined verdict + rewrite call has fared (see combined_stage)
+COMBINED_STATS = {"answered": 0, "unparseable": 0, "failed": 0}
+
+
+def new_outcome(query):
+    """What one pass of the pipeline produced; main.py shapes it into JSON"""
+    return {
+        "category": None,
+        "improved_query": query,
+        "results": [],
+        "speculation": None,
+        # "combined", "two_call" or "two_call_fallback" when Gemini had to classify
+        "llm_path": None,
+        # Stages skipped or cut short to meet the request deadline
+        "degraded": [],
+    }
+
+
+def request_priority(query):
+    """Admission priority from what is already known, without counting as a lookup"""
+    key = canonical_query(query)
+    verdict = KEYWORD_MATCHER.classify(query)
+    if verdict is None and key is not None:
+        verdict = VERDICT_CACHE.peek(key)
+    if verdict is None and LOCAL_MODEL is not None:
+        label, confidence = LOCAL_MODEL.predict(query)
+        verdict = label if confidence >= config.LOCAL_MODEL_THRESHOLD else None
+    if verdict is None:
+        return EXPENSIVE
+    if verdict != "TECH":
+        return CHEAP
+    improved = REWRITE_CACHE.peek(key) if key is not None else None
+    if improved is not None and SEARCH_CACHE.peek(search_key(improved)) is not None:
+        return CHEAP
+    return STANDARD
+
+
+def local_verdict(query):
+    """Keyword pass, then the local model if it is confident; None if neither"""
+    with stage("keyword"):
+        verdict = KEYWORD_MATCHER.classify(query)
+    if verdict is not None:
+        record_classification(verdict, "keyword")
+    elif LOCAL_MODEL is not None:
+        with stage("local_model"):
+            verdict = LOCAL_MODEL.classify(query, config.LOCAL_MODEL_THRESHOLD)
+        if verdict is not None:
+            record_classification(verdict, "local_model")
+    return verdict
+
+
+def local_verdicts(queries):
+    """local_verdict() for many queries, scoring the leftovers in one pass"""
+    with stage("keyword"):
+        verdicts = [KEYWORD_MATCHER.classify(query) for query in queries]
+    for verdict in filter(None, verdicts):
+        record_classification(verdict, "keyword")
+    if LOCAL_MODEL is not None:
+        pending = [i for i, verdict in enumerate(verdicts) if verdict is None]
+        with stage("local_model"):
+            labels = LOCAL_MODEL.classify_many([queries[i] for i in pending], config.LOCAL_MODEL_THRESHOLD)
+        for i, label in zip(pending, labels):
+            verdicts[i] = label
+            if label is not None:
+                record_classification(label, "local_model")
+    return verdicts
+
+
+def _record_verdict(query, key, verdict, source="llm"):
+    if key is not None:
+        VERDICT_CACHE.set(key, verdict)
+        SIMILAR_CACHE.remember(key, query, verdict=verdict)
+    # Same shape train_classifier.py reads
+    VERDICT_LOG.append({"query": query, "label": verdict, "source": source})
+
+
+def _memo_lookup(memo, key):
+    if key is None:
+        return None
+    state, value = memo.lookup(key)
+    return value if state == FRESH else None
+
+
+def _similar_lookup(query, field):
+    if SIMILAR_CACHE.max_entries <= 0:
+        return None
+    with stage("similar"):
+        return SIMILAR_CACHE.find(query, field)
+
+
+def _coalesced(stage, key, fn):
+    # Keys are None for queries too long to normalise; those run alone
+    if key is None:
+        return fn()
+    return FLIGHTS[stage].do(key, fn)
+
+
+def known_verdict(query, key):
+    """Verdict without calling Gemini (memo, similar query, breaker fallback), or None"""
+    verdict = _memo_lookup(VERDICT_CACHE, key)
+    if verdict is not None:
+        record_classification(verdict, "memo")
+        return verdict
+    verdict = _similar_lookup(query, "verdict")
+    if verdict is not None:
+        record_classification(verdict, "similar")
+        return verdict
+    if LOCAL_MODEL is not None and not GEMINI_GUARD.breaker.available():
+        # Gemini is failing fast anyway; take the model's best guess
+        verdict, _ = LOCAL_MODEL.predict(query)
+        record_classification(verdict, "local_fallback")
+        record_fallback("llm_classify")
+        return verdict
+    return None
+
+
+def deadline_verdict(query):
+    """Best verdict without Gemini, for when the deadline leaves no time to ask.
+
+    Fails closed: unless the local model is confident, the query gets
+    DEADLINE_FALLBACK_VERDICT (NON_TECH), never a free pass.
+    """
+    deadline.degrade("llm_classify_skipped")
+    if LOCAL_MODEL is not None:
+        verdict, confidence = LOCAL_MODEL.predict(query)
+        if confidence >= config.LOCAL_MODEL_THRESHOLD:
+            record_classification(verdict, "local_fallback")
+            return verdict
+    verdict = config.DEADLINE_FALLBACK_VERDICT
+    record_classification(verdict, "deadline")
+    return verdict
+
+
+async def llm_classify_stage(query):
+    """Gemini verdict for a query the keywords missed, memoised"""
+    with stage("llm_classify"):
+        key = canonical_query(query)
+        verdict = known_verdict(query, key)
+        if verdict is not None:
+            return verdict
+        try:
+            verdict = await deadline.within(
+                lambda: _coalesced("classify", key, lambda: _llm_classify(query, key)), SEARCH_RESERVE
+            )
+        except deadline.BudgetExhausted:
+            return deadline_verdict(query)
+    record_classification(verdict, "llm")
+    return verdict
+
+
+async def _llm_classify(query, key):
+    if config.LLM_BATCH_ENABLED:
+        label = await CLASSIFY_BATCHER.submit(query)
+        failed = label is None
+        verdict = label or "NON_TECH"
+    else:
+        raw = await call_gemini_async(classify_prompt(query))
+        failed = raw.startswith("ERROR")
+        verdict = parse_classification(raw)
+    # A failed call is not a verdict; let the next request retry
+    if failed:
+        record_fallback("llm_classify")
+    else:
+        _record_verdict(query, key, verdict)
+    return verdict
+
+
+async def llm_classify_many(queries):
+    """Verdicts for many ambiguous queries via shared batch prompts.
+
+    Unlike llm_classify_stage, a failed label comes back as "ERROR" so
+    batch callers can report it per item.
+    """
+    verdicts = {}
+    unresolved = []
+    for query in dict.fromkeys(queries):
+        verdict = _memo_lookup(VERDICT_CACHE, canonical_query(query))
+        if verdict is not None:
+            verdicts[query] = verdict
+        else:
+            unresolved.append(query)
+
+    size = max(1, config.LLM_BATCH_MAX)
+    chunks = [unresolved[i:i + size] for i in range(0, len(unresolved), size)]
+    with stage("llm_classify"):
+        answers = await asyncio.gather(*(classify_batch_async(chunk) for chunk in chunks), return_exceptions=True)
+    for chunk, labels in zip(chunks, answers):
+        if isinstance(labels, Exception):
+            logger.error(f"Batch classification failed: {labels}")
+            labels = [None] * len(chunk)
+        for query, label in zip(chunk, labels):
+            if label is None:
+                verdicts[query] = "ERROR"
+                record_classification("ERROR", "llm")
+            else:
+                record_classification(label, "llm")
+                verdicts[query] = label
+                _record_verdict(query, canonical_query(query), label)
+    return [verdicts[query] for query in queries]
+
+
+def local_rewrite(query):
+    """Rule-based rewrite, or None if only the LLM can improve the query"""
+    if LOCAL_REWRITER is None:
+        return None
+    with stage("local_rewrite"):
+        return LOCAL_REWRITER.rewrite(query)
+
+
+async def improve_stage(query):
+    with stage("improve"):
+        improved = local_rewrite(query)
+        if improved is not None:
+            record_rewrite("local")
+            return improved
+        key = canonical_query(query)
+        improved = _memo_lookup(REWRITE_CACHE, key)
+        if improved is not None:
+            record_rewrite("memo")
+            return improved
+        improved = _similar_lookup(query, "rewrite")
+        if improved is not None:
+            record_rewrite("similar")
+            return improved
+        try:
+            return await deadline.within(
+                lambda: _coalesced("improve", key, lambda: _improve(query, key)), SEARCH_RESERVE
+            )
+        except deadline.BudgetExhausted:
+            # Searching with the raw query beats missing the deadline
+            deadline.degrade("improve_skipped")
+            return query
+
+
+async def _improve(query, key):
+    # If improvement fails, we still want to search, so we wrap it safely
+    try:
+        raw = await call_gemini_async(improve_prompt(query))
+        improved = pick_improved(query, raw)
+        logger.info(f"Query improved to: {improved}")
+        record_rewrite("llm")
+    except Exception as e:
+        logger.error(f"Improvement failed: {e}")
+        record_fallback("improve")
+        return query
+    if raw.startswith("ERROR"):
+        record_fallback("improve")
+    elif key is not None:
+        REWRITE_CACHE.set(key, improved)
+        SIMILAR_CACHE.remember(key, query, rewrite=improved)
+    return improved
+
+
+async def combined_stage(query, key):
+    """(verdict, rewrite) from one JSON Gemini call, or None if the answer was unparseable"""
+    with stage("llm_combined"):
+        return await _coalesced("combined", key, lambda: _llm_combined(query, key))
+
+
+async def _llm_combined(query, key):
+    raw = await call_gemini_async(combined_prompt(query), json_output=True)
+    if raw.startswith("ERROR"):
+        # Gemini is failing: two more calls would only fail too. Same
+        # answer as a failed classify call, and not memoised.
+        COMBINED_STATS["failed"] += 1
+        record_fallback("llm_combined")
+        verdict = parse_classification(raw)
+        record_classification(verdict, "llm_combined")
+        return verdict, query
+    answer = parse_combined(raw)
+    if answer is None:
+        logger.warning(f"Unparseable combined answer for {query!r}: {raw[:200]!r}")
+        COMBINED_STATS["unparseable"] += 1
+        record_fallback("llm_combined")
+        return None
+    COMBINED_STATS["answered"] += 1
+    verdict, confidence, rewrite = answer
+    logger.info(f"Combined answer: {verdict} ({confidence:.2f}), rewrite {rewrite!r}")
+    record_classification(verdict, "llm_combined")
+    _record_verdict(query, key, verdict, source="llm_combined")
+    improved = query
+    if verdict == "TECH":
+        improved = pick_improved(query, rewrite)
+        record_rewrite("llm_combined")
+        if key is not None:
+            REWRITE_CACHE.set(key, improved)
+            SIMILAR_CACHE.remember(key, query, rewrite=improved)
+    return verdict, improved
+
+
+async def classify_and_improve(query, outcome):
+    """LLM-side verdict and, for TECH, rewrite of a query the local pass missed.
+
+    One combined Gemini call when enabled, else (or if its answer cannot be
+    parsed) the classify call followed by improve_stage. A failed combined
+    call is final: it gets the same NON_TECH a failed classify call would.
+    """
+    key = canonical_query(query)
+    with stage("llm_classify"):
+        verdict = known_verdict(query, key)
+    try:
+        if verdict is None and config.LLM_COMBINED_ENABLED:
+            answer = await deadline.within(lambda: combined_stage(query, key), SEARCH_RESERVE)
+            if answer is not None:
+                outcome["category"], outcome["improved_query"] = answer
+                outcome["llm_path"] = "combined"
+                return outcome
+        if verdict is None:
+            outcome["llm_path"] = "two_call_fallback" if config.LLM_COMBINED_ENABLED else "two_call"
+            with stage("llm_classify"):
+                verdict = await deadline.within(
+                    lambda: _coalesced("classify", key, lambda: _llm_classify(query, key)), SEARCH_RESERVE
+                )
+            record_classification(verdict, "llm")
+    except deadline.BudgetExhausted:
+        outcome["llm_path"] = None
+        verdict = deadline_verdict(query)
+    outcome["category"] = verdict
+    if verdict == "TECH":
+        outcome["improved_query"] = await improve_stage(query)
+    return outcome
+
+
+def search_key(query):
+    return " ".join(query.lower().split())
+
+
+async def fetch_results(query, left=None):
+    """(results, partial): the local index when it can answer on its own, else every provider.
+
+    The fetch may be shared by several requests, so the budget comes in as
+    `left` seconds rather than from the request context. partial is True
+    when that budget, not the fan-out's own deadline, cut providers short.
+    """
+    if LOCAL_INDEX is not None:
+        with stage("local_index"):
+            results = LOCAL_INDEX.answer(query)
+        if results:
+            return results, False
+    if left is None:
+        return await SEARCH_FANOUT.search(query), False
+    results, cut_short = await SEARCH_FANOUT.search_within(query, deadline=max(0.0, left))
+    return results, cut_short and left < SEARCH_FANOUT.deadline
+
+
+def _search_fetch(query, key):
+    """(fetch, should_store) for SEARCH_CACHE.
+
+    Every request awaiting a shared fetch sees whether it was cut short, so
+    each is marked degraded and the partial list is never cached.
+    """
+    partial = False
+
+    async def fetch():
+        nonlocal partial
+        left = deadline.remaining()
+        results, partial = await _coalesced("search", key, lambda: fetch_results(query, left))
+        if partial:
+            deadline.degrade("search_partial")
+        return results
+
+    def should_store(results):
+        # Never cache [] (every provider failed) or a deadline-truncated answer
+        return bool(results) and not partial
+
+    return fetch, should_store
+
+
+async def search_stage(query):
+    key = search_key(query)
+    fetch, should_store = _search_fetch(query, key)
+    with stage("search"):
+        return await SEARCH_CACHE.get_or_fetch(key, fetch, should_store=should_store)
+
+
+async def prepare_query(query):
+    """Classify and (for TECH) improve without searching; for paged search"""
+    outcome = new_outcome(query)
+    outcome["category"] = local_verdict(query)
+    if outcome["category"] is None:
+        return await classify_and_improve(query, outcome)
+    if outcome["category"] == "TECH":
+        outcome["improved_query"] = await improve_stage(query)
+    return outcome
+
+
+async def stream_search(query):
+    """run_search as a sequence of events, each emitted as soon as it is known.
+
+    Yields {"event": ...} dicts: "classification", then for TECH queries
+    "improved_query", one "result" per DDG hit, and finally "done".
+    """
+    verdict = local_verdict(query)
+    if verdict is None:
+        # The combined call answers both, so the rewrite comes for free here
+        outcome = await classify_and_improve(query, new_outcome(query))
+        category = outcome["category"]
+        yield {"event": "classification", "category": category, "source": "llm", "llm_path": outcome["llm_path"]}
+    else:
+        category = verdict
+        yield {"event": "classification", "category": category, "source": "local"}
+    if category != "TECH":
+        return
+
+    improved = outcome["improved_query"] if verdict is None else await improve_stage(query)
+    yield {"event": "improved_query", "improved_query": improved}
+
+    key = search_key(improved)
+    state, cached = SEARCH_CACHE.lookup(key)
+    if state != MISS:
+        if state != FRESH:
+            SEARCH_CACHE.revalidate(key, *_search_fetch(improved, key))
+        results = cached
+        for index, result in enumerate(results):
+            yield {"event": "result", "index": index, **result}
+    elif [p.name for p in SEARCH_FANOUT.providers] != ["ddg"]:
+        # Fused rankings are only known once every provider is in
+        results = await search_stage(improved)
+        for index, result in enumerate(results):
+            yield {"event": "result", "index": index, **result}
+    else:
+        results = []
+        async for result in search_ddg_stream(improved):
+            yield {"event": "result", "index": len(results), **result}
+            results.append(result)
+        if results:
+            SEARCH_CACHE.set(key, results)
+            if LOCAL_INDEX is not None:
+                LOCAL_INDEX.feed(improved, results)
+    yield {"event": "done", "count": len(results)}
+
+
+async def run_search(query, mode=None):
+    """Classify -> improve -> search, speculating when the mode allows it"""
+    mode = (mode or config.SPECULATIVE_MODE).lower()
+    outcome = new_outcome(query)
+
+    verdict = local_verdict(query)
+    if verdict is None and mode in SPECULATIVE_MODES and not config.LLM_COMBINED_ENABLED:
+        return await _run_speculative(query, mode, outcome)
+
+    if verdict is None:
+        await classify_and_improve(query, outcome)
+    else:
+        outcome["category"] = verdict
+        if verdict == "TECH":
+            outcome["improved_query"] = await improve_stage(query)
+    if outcome["category"] != "TECH":
+        return outcome
+
+    outcome["results"] = await search_stage(outcome["improved_query"])
+    return outcome
+
+
+async def _run_speculative(query, mode, outcome):
+    # The LLM verdict is the slow part, so start downstream work under it
+    tasks = {"improve": asyncio.create_task(improve_stage(query))}
+    if mode == "full":
+        tasks["raw_search"] = asyncio.create_task(search_stage(query))
+    report = {"mode": mode, "started": list(tasks), "used": [], "wasted": [], "cancelled": []}
+    outcome["speculation"] = report
+
+    try:
+        outcome["category"] = await llm_classify_stage(query)
+    except BaseException:
+        _cancel(tasks, list(tasks), report)
+        raise
+
+    if outcome["category"] != "TECH":
+        _cancel(tasks, list(tasks), report)
+        logger.info(f"Speculative work wasted on NON_TECH query: {report['wasted']}")
+        return outcome
+
+    outcome["improved_query"] = await tasks["improve"]
+    report["used"].append("improve")
+
+    raw_search = tasks.get("raw_search")
+    if raw_search is not None and outcome["improved_query"] == query:
+        # Rewrite was a no-op, so the speculative search is the real one
+        outcome["results"] = await raw_search
+        report["used"].append("raw_search")
+        return outcome
+
+    if raw_search is not None:
+        _cancel(tasks, ["raw_search"], report)
+    outcome["results"] = await search_stage(outcome["improved_query"])
+    return outcome
+
+
+def _cancel(tasks, names, report):
+    """Drops speculative tasks, noting which were cut short vs already paid for"""
+    for name in names:
+        task = tasks[name]
+        report["wasted"].append(name)
+        if not task.done():
+            task.cancel()
+            report["cancelled"].append(name)
+        elif not task.cancelled():
+            # Retrieve the result so a failure is not logged as unhandled
+            task.exception()
+
+
+async def run_search_batch(queries):
+    """run_search for many queries at once; outcomes come back in input order.
+
+    Keyword/local verdicts are computed for the whole batch up front,
+    ambiguous items share batched LLM calls, and improve + search run for at
+    most BATCH_CONCURRENCY items at a time. A failing item gets
+    category "ERROR" (LLM) or an "error" message; it never fails the batch.
+    """
+    outcomes = [new_outcome(query) for query in queries]
+    verdicts = local_verdicts(queries)
+
+    ambiguous = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    if ambiguous:
+        labels = await llm_classify_many([queries[i] for i in ambiguous])
+        for i, label in zip(ambiguous, labels):
+            verdicts[i] = label
+    for outcome, verdict in zip(outcomes, verdicts):
+        outcome["category"] = verdict
+
+    slots = asyncio.Semaphore(max(1, config.BATCH_CONCURRENCY))
+
+    async def finish(outcome, query):
+        async with slots:
+            try:
+                outcome["improved_query"] = await improve_stage(query)
+                outcome["results"] = await search_stage(outcome["improved_query"])
+            except Exception as e:
+                logger.error(f"Batch item failed for {query!r}: {e}")
+                outcome["error"] = str(e)
+
+    await asyncio.gather(*(
+        finish(outcome, query)
+        for outcome, query in zip(outcomes, queries)
+        if outcome["category"] == "TECH"
+    ))
+    return outcomes
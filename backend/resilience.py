@@ -0,0 +1,251 @@
+"""Circuit breaker, latency-adaptive timeouts and hedging for upstream calls.
+
+ResilientCaller wraps one upstream (Gemini) and owns all three:
+
+- the timeout for each attempt follows the observed p99 latency, bounded
+  by a floor and by the configured hard ceiling;
+- after enough consecutive failures the breaker opens and calls fail
+  immediately until a single probe call succeeds again;
+- optionally, an attempt still running at the observed p95 gets a
+  duplicate, and whichever answers first wins.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from metrics import Counter, Gauge
+
+logger = logging.getLogger("TechSearch")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = Gauge("techsearch_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("upstream",))
+BREAKER_REJECTED = Counter("techsearch_breaker_rejected_total", "Calls failed fast by an open breaker", ("upstream",))
+UPSTREAM_TIMEOUTS = Counter("techsearch_upstream_timeouts_total", "Attempts cut off by the adaptive timeout", ("upstream",))
+HEDGES = Counter("techsearch_hedges_total", "Duplicate attempts fired, and how many answered first", ("upstream", "result"))
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies (seconds)"""
+
+    def __init__(self, window):
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, pct):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures.
+
+    While open, calls are rejected; after `reset_timeout` seconds one probe
+    call is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+        BREAKER_STATE.set(0, name)
+
+    def _move(self, state):
+        if state != self.state:
+            logger.warning(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+            self.state = state
+            BREAKER_STATE.set(_STATE_VALUES[state], self.name)
+
+    def available(self):
+        """True unless open and still cooling down; does not take the probe slot"""
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return not (self.state == HALF_OPEN and self._probing)
+
+    def allow(self):
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._move(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        BREAKER_REJECTED.inc(self.name)
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._move(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+            self._move(OPEN)
+
+    def release(self):
+        # A cancelled call says nothing about upstream health
+        self._probing = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class ResilientCaller:
+    """Runs `make_attempt(timeout)` coroutines under breaker, timeout and hedging"""
+
+    def __init__(self, name, max_timeout, min_timeout=1.0, timeout_multiplier=3.0,
+                 adaptive=True, window=200, min_samples=20,
+                 failure_threshold=5, reset_timeout=30.0,
+                 hedge=False, hedge_percentile=95.0, hedge_min_delay=0.05, hedge_max_ratio=0.1):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.adaptive = adaptive
+        self.min_samples = min_samples
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_ratio = hedge_max_ratio
+        self.latency = LatencyTracker(window)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def timeout(self):
+        if not self.adaptive or len(self.latency) < self.min_samples:
+            return self.max_timeout
+        p99 = self.latency.percentile(99)
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None when hedging is off or over budget"""
+        if not self.hedge or len(self.latency) < self.min_samples:
+            return None
+        # Hedges are extra upstream load; cap them at a share of all calls
+        if self.hedges >= self.hedge_max_ratio * self.calls:
+            return None
+        return max(self.hedge_min_delay, self.latency.percentile(self.hedge_percentile))
+
+    async def _attempt(self, make_attempt, timeout):
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(make_attempt(timeout), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            UPSTREAM_TIMEOUTS.inc(self.name)
+            # Counted at the cutoff so a slowdown raises the next timeout
+            # instead of every later call being cut off too
+            self.latency.add(timeout)
+            raise TimeoutError(f"{self.name} gave no answer within {timeout:.2f}s")
+        self.latency.add(time.perf_counter() - start)
+        return result
+
+    async def call(self, make_attempt):
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.name} circuit open")
+        self.calls += 1
+        settled = False
+        try:
+            result = await self._run(make_attempt, self.timeout())
+            settled = True
+            self.breaker.record_success()
+            return result
+        except Exception:
+            settled = True
+            self.failures += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            if not settled:
+                self.breaker.release()
+
+    async def _run(self, make_attempt, timeout):
+        delay = self.hedge_delay()
+        first = asyncio.ensure_future(self._attempt(make_attempt, timeout))
+        if delay is None:
+            return await first
+
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                HEDGES.inc(self.name, "fired")
+                tasks.append(asyncio.ensure_future(self._attempt(make_attempt, timeout)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                            HEDGES.inc(self.name, "won")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self):
+        def ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "timeout_ms": ms(self.timeout()),
+            "latency_ms": {
+                "samples": len(self.latency),
+                "p50": ms(self.latency.percentile(50)),
+                "p95": ms(self.latency.percentile(95)),
+                "p99": ms(self.latency.percentile(99)),
+            },
+            "hedging": {
+                "enabled": self.hedge,
+                "delay_ms": ms(self.hedge_delay()),
+                "fired": self.hedges,
+                "won": self.hedge_wins,
+                "rate": round(self.hedges / self.calls, 4) if self.calls else 0.0,
+            },
+            "breaker": self.breaker.stats(),
+        }
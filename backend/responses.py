@@ -0,0 +1,164 @@
+"""Response encoding: fast JSON, negotiated compression and ETags.
+
+FastJSONResponse serialises with orjson (several times faster than the
+stdlib encoder, and compact). Endpoints on the hot path return it
+directly, which also skips FastAPI's jsonable_encoder walk over the dict.
+CompressionMiddleware gzips (or brotli-compresses, when the client prefers
+it) any complete body of at least COMPRESSION_MIN_BYTES; without the
+brotli package it falls back to gzip. Streamed responses pass through untouched.
+"""
+import gzip
+import hashlib
+import json
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+from metrics import Counter, stage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_BYTES = Counter(
+    "techsearch_compression_bytes_total", "Response body bytes before (in) and after (out) compression",
+    ("encoding", "side"),
+)
+
+# Worth compressing; images and the like are already compressed
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def json_bytes(content):
+    """Compact UTF-8 JSON; orjson when installed, else the stdlib encoder"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. an int too big for orjson; the stdlib copes
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    # Times the JSON encoding of every response as the "serialize" stage
+    def render(self, content):
+        with stage("serialize"):
+            return json_bytes(content)
+
+
+# --- ETAGS ---
+def etag(content):
+    """Weak ETag over the JSON form of content.
+
+    Weak because the body may carry diagnostics (llm_path, speculation)
+    that change between otherwise identical answers, and because the
+    compressed and plain bodies are different bytes.
+    """
+    return f'W/"{hashlib.blake2b(json_bytes(content), digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match, tag):
+    """Weak comparison of an If-None-Match header against our ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = tag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+# --- COMPRESSION ---
+def negotiate(accept_encoding):
+    """Best of br / gzip the client accepts, or None for identity"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = max(offered, key=lambda coding: weights.get(coding, wildcard))
+    return best if weights.get(best, wildcard) > 0 else None
+
+
+def compress(body, encoding, gzip_level, brotli_quality):
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps the output stable for identical bodies
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compresses complete response bodies of at least minimum_size bytes.
+
+    Only single-message bodies are compressed: streamed responses (NDJSON
+    search) go out as they are, since buffering them would defeat the
+    point. Responses already encoded or marked no-transform are skipped.
+    """
+
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if ("content-encoding" in headers or "no-transform" in headers.get("cache-control", "")
+                        or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                    passthrough = True
+                    return await send(message)
+                # Held back until we know whether the body gets compressed
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            passthrough = True
+            headers = MutableHeaders(raw=start["headers"])
+            if "accept-encoding" not in headers.get("vary", "").lower():
+                headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start)
+                return await send(message)
+
+            with stage("compress"):
+                compressed = compress(body, encoding, self.gzip_level, self.brotli_quality)
+            COMPRESSION_BYTES.inc(encoding, "in", amount=len(body))
+            COMPRESSION_BYTES.inc(encoding, "out", amount=len(compressed))
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            tag = headers.get("etag")
+            if tag and not tag.startswith("W/"):
+                headers["ETag"] = "W/" + tag
+            await send(start)
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
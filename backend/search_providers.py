@@ -0,0 +1,307 @@
+"""Pluggable search providers and the fan-out that merges them.
+
+A provider is anything with a `name` and an async `search(query, limit)`
+returning results shaped like format_ddg_result ({title, snippet, url}).
+SearchFanOut queries every configured provider at once, merges their
+rankings with reciprocal-rank fusion (deduplicated by canonical URL) and
+returns as soon as enough results are in or the deadline passes.
+"""
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import config
+from async_engine import run_blocking
+from langchain_logic import format_ddg_result, iter_ddg, iter_ddg_news
+from metrics import Counter, Histogram
+from resilience import LatencyTracker
+
+logger = logging.getLogger("TechSearch")
+
+# Standard RRF damping constant; larger values flatten rank differences
+RRF_K = 60
+
+PROVIDER_SECONDS = Histogram("techsearch_provider_seconds", "Search provider latency", ("provider",))
+PROVIDER_RESULTS = Counter(
+    "techsearch_provider_results_total", "Results each provider placed in the fused answer", ("provider",),
+)
+
+
+# --- PROVIDERS ---
+class SearchProvider:
+    name = "base"
+    # Results fetched from outside; these are what feed the local index
+    upstream = False
+
+    async def search(self, query, limit):
+        raise NotImplementedError
+
+
+def _ddg_text(query, limit):
+    # Unlike search_ddg this lets errors through, so they show in provider stats
+    return list(iter_ddg(query, limit))
+
+
+def _ddg_news(query, limit):
+    return list(iter_ddg_news(query, limit))
+
+
+class DDGTextProvider(SearchProvider):
+    """DuckDuckGo web results; the original (and default) backend"""
+    name = "ddg"
+    upstream = True
+
+    def __init__(self):
+        # Threads this provider may hold, including calls the deadline abandoned
+        self.inflight = asyncio.Semaphore(config.SEARCH_PROVIDER_MAX_INFLIGHT)
+
+    async def search(self, query, limit):
+        return await run_blocking(_ddg_text, query, limit, slots=self.inflight)
+
+
+class DDGNewsProvider(DDGTextProvider):
+    name = "ddg_news"
+
+    async def search(self, query, limit):
+        return await run_blocking(_ddg_news, query, limit, slots=self.inflight)
+
+
+_TOKEN = re.compile(r"[a-z0-9+#]+")
+
+
+class CorpusProvider(SearchProvider):
+    """Keyword search over a fixed JSONL corpus of {title, snippet, url} docs.
+
+    Docs are scored by the IDF of the query terms they contain; everything
+    lives in memory, so this answers in microseconds.
+    """
+    name = "corpus"
+
+    def __init__(self, path):
+        self.docs = []
+        self.postings = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._add(format_ddg_result(json.loads(line)))
+        logger.info(f"Loaded {len(self.docs)} corpus docs from {path}")
+
+    def _add(self, doc):
+        doc_id = len(self.docs)
+        self.docs.append(doc)
+        for token in set(_TOKEN.findall(f"{doc['title']} {doc['snippet']}".lower())):
+            self.postings.setdefault(token, []).append(doc_id)
+
+    async def search(self, query, limit):
+        scores = {}
+        for token in set(_TOKEN.findall(query.lower())):
+            postings = self.postings.get(token, ())
+            if postings:
+                idf = math.log(1 + len(self.docs) / len(postings))
+                for doc_id in postings:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf
+        best = sorted(scores, key=lambda doc_id: -scores[doc_id])[:limit]
+        return [self.docs[doc_id] for doc_id in best]
+
+
+class LocalIndexProvider(SearchProvider):
+    """Everything we fetched before (see local_index.py), as a fused source"""
+    name = "local_index"
+
+    def __init__(self):
+        from local_index import LOCAL_INDEX
+        if LOCAL_INDEX is None:
+            raise RuntimeError("LOCAL_INDEX_PATH is not set")
+        self.index = LOCAL_INDEX
+
+    async def search(self, query, limit):
+        return self.index.search(query, limit)
+
+
+# name -> factory; other modules register extra providers here
+PROVIDER_FACTORIES = {
+    "ddg": DDGTextProvider,
+    "ddg_news": DDGNewsProvider,
+    "corpus": lambda: CorpusProvider(config.SEARCH_CORPUS_PATH),
+    "local_index": LocalIndexProvider,
+}
+
+
+def register_provider(name, factory):
+    PROVIDER_FACTORIES[name] = factory
+
+
+def build_providers(names):
+    providers = []
+    for name in names:
+        factory = PROVIDER_FACTORIES.get(name)
+        if factory is None:
+            logger.error(f"Unknown search provider '{name}'; skipping")
+            continue
+        try:
+            providers.append(factory())
+        except Exception as e:
+            logger.error(f"Search provider '{name}' failed to start: {e}")
+    return providers
+
+
+# --- FUSION ---
+def canonical_url(url):
+    """Dedup key: https, no www., no fragment, no utm_* params, no trailing slash"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not k.lower().startswith("utm_")]
+    scheme = "https" if parts.scheme.lower() in ("http", "https") else parts.scheme.lower()
+    return urlunsplit((scheme, host, parts.path.rstrip("/"), urlencode(params), ""))
+
+
+def reciprocal_rank_fusion(ranked, weights=None, limit=None, k=RRF_K):
+    """Merges {provider: [result, ...]} into one ranking.
+
+    Each result scores sum(weight / (k + rank)) over the providers that
+    returned it. Returns (results, providers_per_result); ties keep the
+    order the providers were given in.
+    """
+    weights = weights or {}
+    scores, first, owners = {}, {}, {}
+    for name, results in ranked.items():
+        weight = weights.get(name, 1.0)
+        seen = set()
+        for rank, result in enumerate(results, 1):
+            if not result.get("url"):
+                continue
+            key = canonical_url(result["url"])
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            first.setdefault(key, result)
+            owners.setdefault(key, []).append(name)
+    order = sorted(scores, key=lambda key: -scores[key])[:limit]
+    return [first[key] for key in order], [owners[key] for key in order]
+
+
+# --- FAN-OUT ---
+class SearchFanOut:
+    def __init__(self, providers, deadline, early_results=0, weights=None):
+        self.providers = providers
+        self.deadline = deadline
+        self.early_results = early_results
+        self.weights = weights or {}
+        # Called with (provider, query, results) for every upstream answer
+        self.listeners = []
+        self.searches = 0
+        self.early_returns = 0
+        self._stats = {
+            p.name: {"calls": 0, "errors": 0, "empty": 0, "late": 0, "contributed": 0, "latency": LatencyTracker(200)}
+            for p in providers
+        }
+
+    async def _call(self, provider, query, limit):
+        stats = self._stats[provider.name]
+        stats["calls"] += 1
+        start = time.perf_counter()
+        try:
+            results = await provider.search(query, limit)
+        except Exception as e:
+            stats["errors"] += 1
+            logger.error(f"Search provider {provider.name} failed: {e}")
+            results = []
+        elapsed = time.perf_counter() - start
+        stats["latency"].add(elapsed)
+        PROVIDER_SECONDS.observe(elapsed, provider.name)
+        if not results:
+            stats["empty"] += 1
+        elif provider.upstream:
+            for listener in self.listeners:
+                listener(provider.name, query, results)
+        return results
+
+    async def search(self, query, limit=5):
+        """Fused top `limit` results from every provider that answered in time"""
+        results, _ = await self.search_within(query, limit)
+        return results
+
+    async def search_within(self, query, limit=5, deadline=None):
+        """search() with the deadline cut to `deadline` seconds if that is sooner.
+
+        Returns (results, cut_short): cut_short is True when the deadline,
+        rather than early_results, left providers unanswered.
+        """
+        self.searches += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.deadline if deadline is None else min(self.deadline, deadline))
+        cut_short = False
+        tasks = {asyncio.ensure_future(self._call(p, query, limit)): p.name for p in self.providers}
+        answers = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    cut_short = True
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    answers[tasks[task]] = task.result()
+                if pending and self.early_results and self._unique(answers) >= self.early_results:
+                    self.early_returns += 1
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+                self._stats[tasks[task]]["late"] += 1
+
+        # Provider order (not arrival order) breaks fusion ties
+        ranked = {p.name: answers[p.name] for p in self.providers if p.name in answers}
+        results, owners = reciprocal_rank_fusion(ranked, self.weights, limit)
+        for names in owners:
+            for name in names:
+                self._stats[name]["contributed"] += 1
+                PROVIDER_RESULTS.inc(name)
+        return results, cut_short
+
+    @staticmethod
+    def _unique(answers):
+        return len({canonical_url(r["url"]) for results in answers.values() for r in results if r.get("url")})
+
+    def stats(self):
+        def ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        providers = {}
+        for name, stats in self._stats.items():
+            latency = stats["latency"]
+            providers[name] = {
+                **{k: v for k, v in stats.items() if k != "latency"},
+                "weight": self.weights.get(name, 1.0),
+                "latency_ms": {"p50": ms(latency.percentile(50)), "p95": ms(latency.percentile(95))},
+            }
+        return {
+            "searches": self.searches,
+            "early_returns": self.early_returns,
+            "deadline_ms": ms(self.deadline),
+            "providers": providers,
+        }
+
+
+def _parse_weights(text):
+    weights = {}
+    for item in filter(None, text.split(",")):
+        name, value = item.split("=", 1)
+        weights[name.strip()] = float(value)
+    return weights
+
+
+SEARCH_FANOUT = SearchFanOut(
+    build_providers([name.strip() for name in config.SEARCH_PROVIDERS.split(",") if name.strip()]),
+    deadline=config.SEARCH_DEADLINE_MS / 1000,
+    early_results=config.SEARCH_EARLY_RESULTS,
+    weights=_parse_weights(config.SEARCH_PROVIDER_WEIGHTS),
+)
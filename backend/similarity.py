@@ -0,0 +1,159 @@
+"""Near-duplicate query cache: MinHash signatures bucketed with LSH.
+
+Paraphrases such as "how to root android phone" and "rooting an android
+phone how to" reduce to the same set of stemmed content words, so they
+share a verdict and a rewrite (and, through the rewrite, search results).
+
+A query's shingles are its stemmed content words plus, optionally, their
+character trigrams (which tolerate typos). Each entry's MinHash signature
+is split into bands; queries sharing any band are candidates, and a
+candidate is accepted only if its exact Jaccard similarity clears the
+threshold. A lookup costs one signature plus a few dict probes whatever
+the number of entries.
+"""
+import hashlib
+import struct
+import sys
+import time
+from collections import OrderedDict
+
+from local_index import query_terms, stem
+
+# One 64-byte blake2b digest per shingle gives all 32 MinHash values
+NUM_PERM = 32
+_UNPACK = struct.Struct(f"<{NUM_PERM}H").unpack
+# Candidates checked per band bucket; keeps hot buckets from costing O(n)
+MAX_BUCKET_SCAN = 16
+
+
+def _shingle_hashes(gram):
+    return _UNPACK(hashlib.blake2b(gram.encode(), digest_size=2 * NUM_PERM).digest())
+
+
+def shingles(query, char_ngrams=False):
+    # Interned: the same few thousand words recur across every entry
+    words = {sys.intern(stem(t)) for t in query_terms(query)}
+    if not char_ngrams:
+        return frozenset(words)
+    grams = set(words)
+    for word in words:
+        padded = f" {word} "
+        grams.update(sys.intern(padded[i:i + 3]) for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class SimilarityCache:
+    """LRU of canonical query -> payload dict, searchable by similarity"""
+
+    def __init__(self, max_entries, ttl, threshold=0.8, bands=8, char_ngrams=False):
+        if NUM_PERM % bands:
+            raise ValueError(f"bands must divide {NUM_PERM}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.char_ngrams = char_ngrams
+        # key -> [shingles, payload, expires_at]; oldest first. Band keys
+        # are recomputed on eviction rather than stored per entry
+        self._entries = OrderedDict()
+        # one dict per band: band key -> entry key, or {entry key: None} (an
+        # ordered set) once shared; most buckets hold one key, and a dict
+        # per bucket would triple the memory per entry
+        self._buckets = [{} for _ in range(bands)]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, grams):
+        signature = list(map(min, zip(*map(_shingle_hashes, grams))))
+        rows = self.rows
+        return tuple(hash(tuple(signature[i * rows:(i + 1) * rows])) for i in range(self.bands))
+
+    def remember(self, key, query, **fields):
+        """Stores or merges fields (e.g. verdict=..., rewrite=...) for a query"""
+        if key is None or self.max_entries <= 0:
+            return
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1].update(fields)
+            entry[2] = time.time() + self.ttl
+            self._entries.move_to_end(key)
+            return
+        grams = shingles(query, self.char_ngrams)
+        if not grams:
+            return
+        band_keys = self._band_keys(grams)
+        self._entries[key] = [grams, dict(fields), time.time() + self.ttl]
+        for bucket, band_key in zip(self._buckets, band_keys):
+            members = bucket.get(band_key)
+            if members is None:
+                bucket[band_key] = key
+            elif isinstance(members, dict):
+                members[key] = None
+            elif members != key:
+                bucket[band_key] = {members: None, key: None}
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        grams = self._entries.pop(key)[0]
+        for bucket, band_key in zip(self._buckets, self._band_keys(grams)):
+            members = bucket.get(band_key)
+            if members == key:
+                del bucket[band_key]
+            elif isinstance(members, dict):
+                members.pop(key, None)
+                if len(members) == 1:
+                    bucket[band_key] = next(iter(members))
+
+    def find(self, query, field):
+        """Payload value `field` from the most similar fresh entry, or None"""
+        grams = shingles(query, self.char_ngrams)
+        if not grams or not self._entries:
+            self.misses += 1
+            return None
+        now = time.time()
+        best, best_score = None, self.threshold
+        seen = set()
+        for bucket, band_key in zip(self._buckets, self._band_keys(grams)):
+            members = bucket.get(band_key)
+            if members is None:
+                continue
+            # Newest members are the likeliest to be fresh
+            candidates = reversed(members) if isinstance(members, dict) else (members,)
+            for i, key in enumerate(candidates):
+                if i >= MAX_BUCKET_SCAN:
+                    break
+                if key in seen:
+                    continue
+                seen.add(key)
+                other, payload, expires_at = self._entries[key]
+                if expires_at <= now or field not in payload:
+                    continue
+                score = len(grams & other) / len(grams | other)
+                if score >= best_score:
+                    best, best_score = payload[field], score
+                    if score == 1.0:
+                        break
+            if best_score == 1.0:
+                break
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
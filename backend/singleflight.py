@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key starts `fn()` as a task; anyone arriving while
+    it runs awaits the same task. Results and exceptions reach every waiter.
+    Waiters are shielded, so one of them being cancelled never cancels the
+    shared work for the others, but once the last waiter has gone the work
+    is cancelled too: nobody is left to use the answer.
+
+    The work runs in a fresh context, as TieredCache.revalidate does, so the
+    first caller's deadline, degradations and stage timings never leak into
+    the others; anything per-request goes in as an argument or comes back
+    in the result.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+        # task -> callers still awaiting it
+        self._waiters = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key, fn):
+        while True:
+            task = self._inflight.get(key)
+            if task is None or task.done():
+                task = asyncio.create_task(fn(), context=contextvars.Context())
+                self._inflight[key] = task
+                task.add_done_callback(lambda t, key=key: self._finished(key, t))
+                self.executions += 1
+            else:
+                self.coalesced += 1
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # Only the shared task was cancelled (e.g. by shutdown), not
+                # this waiter: start a fresh execution instead of failing
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+            finally:
+                self._leave(key, task)
+
+    def _leave(self, key, task):
+        left = self._waiters.pop(task) - 1
+        if left:
+            self._waiters[task] = left
+        elif not task.done():
+            # Last waiter cancelled: stop the work and let the next caller start afresh
+            self.abandoned += 1
+            task.cancel()
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            task.exception()
+
+    def stats(self):
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "inflight": len(self._inflight),
+        }
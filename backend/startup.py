@@ -0,0 +1,158 @@
+"""Where cold-start time goes: per-module import cost and init phases.
+
+main.py installs STARTUP before importing anything else. From then until
+the app is ready every module's execution is timed (like
+`python -X importtime`, but kept in memory), the lifespan hook times its
+init steps with STARTUP.phase(), and the first request marks
+time-to-first-request. GET /startup/stats serves the breakdown, and a
+summary is logged once the app is ready.
+
+Only stdlib imports here: this module has to load before everything else.
+"""
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("TechSearch")
+
+
+def _process_age():
+    """Seconds since this process started (Linux only), else None"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 is the start time in clock ticks; the name in (...) may hold spaces
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _TimedLoader:
+    """Wraps a module's real loader just long enough to time exec_module"""
+
+    def __init__(self, loader, report):
+        self.loader = loader
+        self.report = report
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Put the real loader back before the module's code can look at it
+        # (importlib.resources, pkgutil and friends use it)
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        self.report._time_import(module.__name__, self.loader.exec_module, module)
+
+
+class _ImportTimer:
+    """Meta path finder that defers to the others and times what they load"""
+
+    def __init__(self, report):
+        self.report = report
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            find = getattr(finder, "find_spec", None)
+            if finder is self or find is None:
+                continue
+            spec = find(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self.report)
+                return spec
+        return None
+
+
+class StartupReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        # Interpreter start-up plus whatever ran before us (e.g. uvicorn)
+        self.before_install = _process_age()
+        self.imports = {}  # module -> (cumulative, self) seconds
+        self.phases = {}
+        self.ready_at = None
+        self.first_request_at = None
+        self._stack = []
+        self._timer = None
+
+    def install(self):
+        if self._timer is None:
+            self._timer = _ImportTimer(self)
+            sys.meta_path.insert(0, self._timer)
+
+    def uninstall(self):
+        if self._timer is not None:
+            sys.meta_path.remove(self._timer)
+            self._timer = None
+
+    def _time_import(self, name, exec_module, module):
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.imports[name] = (elapsed, elapsed - children)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def mark_ready(self):
+        """End of the lifespan start-up; later (lazy) imports are not timed"""
+        if self.ready_at is None:
+            self.ready_at = time.perf_counter()
+            self.uninstall()
+            stats = self.stats(top=5)
+            heaviest = ", ".join(f"{name} {took:.0f}" for name, took in stats["by_package_ms"].items())
+            logger.info(f"Ready in {stats['ready_ms']:.0f} ms after main.py started "
+                        f"(imports {stats['imports_ms']:.0f} ms; heaviest packages ms: {heaviest})")
+
+    def mark_first_request(self):
+        if self.first_request_at is None:
+            self.first_request_at = time.perf_counter()
+
+    def stats(self, top=15):
+        def ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        def since_start(mark):
+            return ms(mark - self.started) if mark is not None else None
+
+        by_package = {}
+        for name, (_, own) in self.imports.items():
+            package = name.partition(".")[0]
+            by_package[package] = by_package.get(package, 0.0) + own
+        slowest = sorted(self.imports.items(), key=lambda item: -item[1][0])[:top]
+        return {
+            "before_main_ms": ms(self.before_install),
+            # Self times partition the total, nested imports included once
+            "imports_ms": ms(sum(own for _, own in self.imports.values())),
+            "phases_ms": {name: ms(seconds) for name, seconds in self.phases.items()},
+            "ready_ms": since_start(self.ready_at),
+            "first_request_ms": since_start(self.first_request_at),
+            "modules_imported": len(self.imports),
+            "by_package_ms": {
+                name: ms(seconds) for name, seconds in sorted(by_package.items(), key=lambda item: -item[1])[:top]
+            },
+            "slowest_modules_ms": {name: {"cumulative": ms(total), "self": ms(own)} for name, (total, own) in slowest},
+        }
+
+
+STARTUP = StartupReport()
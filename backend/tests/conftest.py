@@ -0,0 +1,105 @@
+"""Shared fixtures. No test talks to the network: Gemini is an httpx
+MockTransport and DuckDuckGo is swapped for a function returning canned
+results, both controlled through the `upstream` fixture."""
+import asyncio
+import json
+import os
+
+# Before any app module reads its configuration (or backend/.env)
+os.environ.update({
+    "GEMINI_API_KEY": "test-key",
+    "GEMINI_URL": "http://gemini.invalid/generate",
+    "DDG_URL": "http://ddg.invalid/search",
+    "CURSOR_SECRET": "test-cursor-secret",
+    "RATE_LIMIT_PER_S": "0",
+    "QUERY_LOG_PATH": "",
+    "WARMUP_LOG_PATHS": "",
+    "SHARED_CACHE_PATH": "",
+    "SEARCH_CACHE_DB": "",
+    "LOCAL_INDEX_PATH": "",
+    "LOCAL_MODEL_PATH": "",
+})
+
+import httpx
+import pytest
+
+import async_engine
+import main
+import pipeline
+import search_providers
+from admission import RATE_LIMITER
+from resilience import CircuitBreaker, LatencyTracker
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeUpstream:
+    """Canned Gemini and DDG answers; records every call"""
+
+    def __init__(self):
+        self.gemini_calls = []
+        self.ddg_calls = []
+        self.gemini_delay = 0.0
+        self.improve_delay = 0.0
+        self.gemini_status = 200
+        self.label = "TECH"
+        self.rewrite = None
+        # Raw answer to the combined prompt, e.g. something unparseable
+        self.combined = None
+
+    def gemini_text(self, prompt):
+        if prompt.startswith("Classify this search query"):
+            if self.combined is not None:
+                return self.combined
+            query = prompt.rsplit("Query: ", 1)[1]
+            rewrite = (self.rewrite or query) if self.label == "TECH" else ""
+            return json.dumps({"label": self.label, "confidence": 0.9, "rewritten_query": rewrite})
+        if prompt.startswith("Convert this"):
+            return self.rewrite or prompt.split(": ", 1)[1]
+        return self.label
+
+    async def gemini(self, request):
+        prompt = json.loads(request.content)["contents"][0]["parts"][0]["text"]
+        self.gemini_calls.append(prompt)
+        delay = self.improve_delay if prompt.startswith("Convert this") else self.gemini_delay
+        if delay:
+            await asyncio.sleep(delay)
+        if self.gemini_status != 200:
+            return httpx.Response(self.gemini_status, json={"error": "unavailable"})
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": self.gemini_text(prompt)}]}}]})
+
+    def ddg(self, query, limit):
+        self.ddg_calls.append(query)
+        return [{"title": f"{query} {i}", "snippet": "snippet", "url": f"https://example.com/{i}"} for i in range(limit)]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(search_providers, "_ddg_text", fake.ddg)
+    # Every test starts cold, and no answer leaks across via similar queries
+    for cache in (pipeline.SEARCH_CACHE, pipeline.VERDICT_CACHE, pipeline.REWRITE_CACHE):
+        cache.memory._data.clear()
+    monkeypatch.setattr(pipeline.SIMILAR_CACHE, "max_entries", 0)
+    RATE_LIMITER._buckets.clear()
+    # Nor do Gemini failures and latencies: a breaker opened by one test's
+    # 503s, or a timeout adapted to its delays, would leak into the next
+    guard = async_engine.GEMINI_GUARD
+    monkeypatch.setattr(guard, "breaker", CircuitBreaker(guard.name, guard.breaker.failure_threshold,
+                                                         guard.breaker.reset_timeout))
+    monkeypatch.setattr(guard, "latency", LatencyTracker(guard.latency._samples.maxlen))
+    for counter in ("calls", "failures", "timeouts", "hedges", "hedge_wins"):
+        monkeypatch.setattr(guard, counter, 0)
+    return fake
+
+
+@pytest.fixture
+async def client(upstream):
+    """ASGI client for the app, inside its lifespan, with fake upstreams"""
+    async_engine._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream.gemini))
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as http:
+            yield http
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from admission import CHEAP, EXPENSIVE, RATE_LIMITER, AdmissionController, Overloaded, RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+
+def test_bucket_allows_the_burst_then_429s():
+    limiter = RateLimiter(rate=1.0, burst=3, max_clients=100)
+    for _ in range(3):
+        limiter.check("10.0.0.1")
+    with pytest.raises(Overloaded) as shed:
+        limiter.check("10.0.0.1")
+    assert shed.value.status_code == 429
+    assert shed.value.retry_after >= 1
+    # Other clients have their own bucket
+    limiter.check("10.0.0.2")
+
+
+def test_zero_rate_disables_the_limiter():
+    limiter = RateLimiter(rate=0, burst=1, max_clients=100)
+    for _ in range(100):
+        limiter.check("10.0.0.1")
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setattr(RATE_LIMITER, "rate", 0.001)
+    monkeypatch.setattr(RATE_LIMITER, "burst", 2)
+
+
+async def test_cheap_queries_are_still_rate_limited(client, limited):
+    # Keyword-only queries skip the admission queue, not the rate limit
+    statuses = [(await client.post("/search", json={"query": "python list comprehension"})).status_code
+                for _ in range(4)]
+    assert statuses == [200, 200, 429, 429]
+
+
+async def test_forwarded_for_header_does_not_reset_the_bucket(client, limited):
+    statuses = []
+    for i in range(4):
+        response = await client.post(
+            "/search", json={"query": "python list comprehension"}, headers={"X-Forwarded-For": f"203.0.113.{i}"}
+        )
+        statuses.append(response.status_code)
+    assert statuses == [200, 200, 429, 429]
+
+
+async def test_every_search_route_draws_on_the_same_bucket(client, limited):
+    assert (await client.post("/search", json={"query": "python list comprehension"})).status_code == 200
+    assert (await client.get("/search", params={"q": "python list comprehension"})).status_code == 200
+    for request in (
+        client.post("/search/stream", json={"query": "python list comprehension"}),
+        client.post("/search/paged", json={"query": "python list comprehension"}),
+        client.post("/search/batch", json={"queries": [{"query": "python list comprehension"}]}),
+    ):
+        assert (await request).status_code == 429
+
+
+async def test_zero_max_active_turns_admission_off():
+    controller = AdmissionController(max_active=0, max_queue=0, queue_timeout=0.01)
+    tickets = await asyncio.gather(*(controller.enter(EXPENSIVE) for _ in range(10)))
+    assert tickets == [None] * 10
+    assert controller.stats()["bypassed"] == 10
+    assert await controller.enter(CHEAP) is None
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import async_engine
+
+pytestmark = pytest.mark.anyio
+
+
+class SlowSource:
+    """Blocking iterator yielding an item every few ms, until closed"""
+
+    def __init__(self):
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def __call__(self):
+        try:
+            while True:
+                time.sleep(0.005)
+                self.produced += 1
+                yield self.produced
+        finally:
+            self.closed.set()
+
+
+async def test_stream_consumer_leaving_stops_the_worker(client):
+    source = SlowSource()
+    stream = async_engine.stream_blocking(source)
+    assert [await anext(stream), await anext(stream)] == [1, 2]
+    await stream.aclose()
+
+    assert await asyncio.to_thread(source.closed.wait, 1.0)
+    produced = source.produced
+    await asyncio.sleep(0.05)
+    assert source.produced == produced
+
+
+async def test_failed_stream_search_ends_quietly(client, monkeypatch, caplog):
+    def broken(query):
+        raise ConnectionError("DDG unreachable")
+        yield
+
+    monkeypatch.setattr(async_engine, "iter_ddg", broken)
+    assert [result async for result in async_engine.search_ddg_stream("python asyncio")] == []
+    assert "DDG Search Error: DDG unreachable" in caplog.text
+
+
+class Stalled:
+    """Blocking call that holds its thread until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.running = 0
+        self.most = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        self.release.wait(2.0)
+        with self.lock:
+            self.running -= 1
+        return []
+
+
+async def test_abandoned_call_keeps_its_slot_until_the_thread_returns(client):
+    stalled = Stalled()
+    before = dict(async_engine.BLOCKING_STATS)
+    free = async_engine._search_slots._value
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(async_engine.run_blocking(stalled), 0.05)
+
+    assert async_engine.BLOCKING_STATS["orphaned"] == before["orphaned"] + 1
+    assert async_engine.BLOCKING_STATS["orphans_running"] == before["orphans_running"] + 1
+    assert async_engine._search_slots._value == free - 1
+
+    stalled.release.set()
+    for _ in range(100):
+        if async_engine._search_slots._value == free:
+            break
+        await asyncio.sleep(0.01)
+    assert async_engine.BLOCKING_STATS["orphans_running"] == before["orphans_running"]
+    assert async_engine._search_slots._value == free
+
+
+async def test_stalled_provider_cannot_take_every_worker(client, monkeypatch):
+    import config
+    import search_providers
+
+    stalled = Stalled()
+    monkeypatch.setattr(search_providers, "_ddg_text", stalled)
+    monkeypatch.setattr(config, "SEARCH_PROVIDER_MAX_INFLIGHT", 2)
+    fanout = search_providers.SearchFanOut([search_providers.DDGTextProvider()], deadline=0.02)
+
+    for _ in range(5):
+        results, cut_short = await fanout.search_within("python asyncio")
+        assert (results, cut_short) == ([], True)
+    assert stalled.most == 2
+    # Other work still gets a worker while the provider is stuck
+    assert await asyncio.wait_for(async_engine.run_blocking(lambda: "free"), 1.0) == "free"
+    stalled.release.set()
@@ -0,0 +1,19 @@
+import random
+
+from bench_pipeline import QUERY_POOLS, build_workload
+
+MIX = {"keyword": 0.5, "ambiguous": 0.3, "non_tech": 0.2}
+
+
+def test_workload_follows_the_mix_pools():
+    workload = build_workload(MIX, 50, False, random.Random(1))
+    assert len(workload) == 50
+    assert all(query in QUERY_POOLS[bucket] for bucket, query in workload)
+
+
+def test_unique_queries_never_repeat_across_levels():
+    # Each level draws the next block of suffixes, so no level hits an earlier one's cache
+    rng = random.Random(1)
+    levels = [build_workload(MIX, 40, True, rng, first=index * 40) for index in range(3)]
+    queries = [query for level in levels for _, query in level]
+    assert len(set(queries)) == len(queries) == 120
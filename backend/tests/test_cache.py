@@ -0,0 +1,46 @@
+import threading
+import time
+
+from cache import SqliteTier, TieredCache
+
+
+def test_puts_are_written_in_the_background(tmp_path, monkeypatch):
+    tier = SqliteTier(str(tmp_path / "cache.db"), max_rows=100)
+    writers = []
+    put = tier._put
+    monkeypatch.setattr(tier, "_put", lambda *args: writers.append(threading.current_thread().name) or put(*args))
+    now = time.time()
+    tier.put("python asyncio", ["result"], now + 60, now + 120)
+    tier.flush()
+    assert writers == ["cache-cache_0"]
+    assert tier.get("python asyncio")[0] == ["result"]
+    tier.close()
+
+
+def test_full_write_queue_drops_puts(tmp_path):
+    tier = SqliteTier(str(tmp_path / "cache.db"), max_rows=100, max_pending=0)
+    tier.put("python asyncio", ["result"], time.time() + 60, time.time() + 120)
+    tier.flush()
+    assert tier.get("python asyncio") is None
+    assert tier.stats()["dropped"] == 1
+    tier.close()
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = TieredCache("search", max_entries=10, ttl=60, db_path=path)
+    cache.set("python asyncio", ["result"])
+    # close() writes out whatever is still queued
+    cache.close()
+    reopened = TieredCache("search", max_entries=10, ttl=60, db_path=path)
+    assert reopened.lookup("python asyncio") == ("fresh", ["result"])
+    reopened.close()
+
+
+def test_stats_and_reads_after_close_do_not_raise(tmp_path):
+    tier = SqliteTier(str(tmp_path / "cache.db"), max_rows=100)
+    tier.close()
+    assert tier.stats()["rows"] is None
+    assert tier.get("python asyncio") is None
+    tier.put("python asyncio", ["result"], time.time() + 60, time.time() + 120)
+    tier.close()
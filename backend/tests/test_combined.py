@@ -0,0 +1,52 @@
+import pytest
+
+import async_engine
+import config
+import pipeline
+from cache import canonical_query
+
+pytestmark = pytest.mark.anyio
+
+QUERY = "how do i center a div"
+
+
+@pytest.fixture(autouse=True)
+def combined(monkeypatch):
+    monkeypatch.setattr(config, "LLM_COMBINED_ENABLED", True)
+    monkeypatch.setattr(config, "SPECULATIVE_MODE", "off")
+
+
+async def test_one_call_answers_both(client, upstream):
+    upstream.rewrite = "css center div"
+    outcome = await pipeline.run_search(QUERY)
+    assert (outcome["category"], outcome["improved_query"], outcome["llm_path"]) == ("TECH", "css center div", "combined")
+    assert len(upstream.gemini_calls) == 1
+
+
+async def test_failed_call_does_not_fall_back_to_two_more(client, upstream):
+    upstream.gemini_status = 503
+    outcome = await pipeline.run_search(QUERY)
+    assert outcome["category"] == "NON_TECH"
+    assert len(upstream.gemini_calls) == 1
+    assert upstream.ddg_calls == []
+    # A failure is not a verdict: the next request asks again
+    assert pipeline.VERDICT_CACHE.peek(canonical_query(QUERY)) is None
+
+
+async def test_unparseable_answer_falls_back_to_two_calls(client, upstream):
+    upstream.combined = "I think this is about CSS"
+    outcome = await pipeline.run_search(QUERY)
+    assert outcome["llm_path"] == "two_call_fallback"
+    assert outcome["category"] == "TECH"
+    assert [prompt.split()[0] for prompt in upstream.gemini_calls] == ["Classify", "Classify", "Convert"]
+
+
+@pytest.mark.parametrize("attempt", range(3))
+async def test_gemini_state_starts_fresh_in_every_test(client, upstream, attempt):
+    # Each run fails enough calls to open the breaker; the next must start closed
+    assert async_engine.GEMINI_GUARD.breaker.state == "closed"
+    assert async_engine.GEMINI_GUARD.stats()["latency_ms"]["samples"] == 0
+    upstream.gemini_status = 503
+    for _ in range(config.GEMINI_BREAKER_FAILURES):
+        await async_engine.call_gemini_async("Classify this as TECH or NON_TECH only: ocean tides")
+    assert async_engine.GEMINI_GUARD.breaker.state == "open"
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+import config
+import deadline
+import pipeline
+
+pytestmark = pytest.mark.anyio
+
+AMBIGUOUS = "how do ocean tides work"
+
+
+class StubModel:
+    def __init__(self, label, confidence):
+        self.answer = (label, confidence)
+
+    def predict(self, query):
+        return self.answer
+
+
+def test_fallback_verdict_fails_closed_without_a_model(monkeypatch):
+    monkeypatch.setattr(pipeline, "LOCAL_MODEL", None)
+    assert pipeline.deadline_verdict(AMBIGUOUS) == "NON_TECH"
+
+
+@pytest.mark.parametrize("confidence, expected", [(0.99, "TECH"), (0.5, "NON_TECH")])
+def test_fallback_verdict_trusts_only_a_confident_model(monkeypatch, confidence, expected):
+    monkeypatch.setattr(pipeline, "LOCAL_MODEL", StubModel("TECH", confidence))
+    assert pipeline.deadline_verdict(AMBIGUOUS) == expected
+
+
+@pytest.mark.parametrize("deadline_ms", [1, 1500, config.REQUEST_DEADLINE_MIN_MS - 1])
+async def test_deadline_below_the_floor_is_rejected(client, deadline_ms):
+    response = await client.post("/search", json={"query": AMBIGUOUS, "deadline_ms": deadline_ms})
+    assert response.status_code == 422
+    response = await client.get("/search", params={"q": AMBIGUOUS, "deadline_ms": deadline_ms})
+    assert response.status_code == 422
+
+
+async def test_slow_gemini_does_not_let_ambiguous_queries_through(client, upstream, monkeypatch):
+    # Gemini would say TECH, but too late: the query must not be searched
+    upstream.gemini_delay = 0.3
+    monkeypatch.setattr(pipeline, "LOCAL_MODEL", None)
+    monkeypatch.setattr(pipeline, "SEARCH_RESERVE", 0.15)
+    with deadline.budget(0.2) as budget:
+        outcome = await pipeline.run_search(AMBIGUOUS)
+    assert outcome["category"] == "NON_TECH"
+    assert outcome["results"] == []
+    assert "llm_classify_skipped" in budget.degraded
+    assert upstream.ddg_calls == []
+    await asyncio.sleep(0.35)  # let the shielded Gemini call finish
+
+
+class Provider:
+    upstream = False
+
+    def __init__(self, name, delay, count):
+        self.name, self.delay, self.count = name, delay, count
+
+    async def search(self, query, limit):
+        await asyncio.sleep(self.delay)
+        return [{"title": self.name, "snippet": "", "url": f"https://{self.name}.example/{i}"} for i in range(self.count)]
+
+
+async def test_shared_search_cut_short_marks_every_waiter_and_is_not_cached(client, upstream, monkeypatch):
+    from search_providers import SearchFanOut
+
+    fanout = SearchFanOut([Provider("fast", 0.0, 1), Provider("slow", 0.3, 3)], deadline=5.0, early_results=0)
+    monkeypatch.setattr(pipeline, "SEARCH_FANOUT", fanout)
+    monkeypatch.setattr(pipeline, "LOCAL_INDEX", None)
+
+    async def search(seconds):
+        with deadline.budget(seconds) as budget:
+            results = await pipeline.search_stage("python sockets")
+        return results, budget.degraded
+
+    (short, short_degraded), (long, long_degraded) = await asyncio.gather(search(0.1), search(30.0))
+    assert len(short) == len(long) == 1
+    assert short_degraded == long_degraded == ["search_partial"]
+    assert pipeline.SEARCH_CACHE.peek(pipeline.search_key("python sockets")) is None
@@ -0,0 +1,43 @@
+import pytest
+
+from keyword_matcher import KeywordMatcher
+from langchain_logic import KEYWORD_MATCHER
+
+
+@pytest.mark.parametrize(("query", "keyword"), [
+    ("python3 venv not activating", "python"),
+    ("rooting a pixel 7", "root"),
+    ("flashing twrp on samsung", "flash"),
+    ("debugging a segfault", "debug"),
+    ("logging config for django", "log"),
+    ("sharding databases", "database"),
+    ("ios17 battery drain", "ios"),
+    ("compiled binary too large", "compile"),
+    ("learn coding online", "coding"),
+])
+def test_variants_still_hit(query, keyword):
+    assert keyword in {hit.keyword for hit in KEYWORD_MATCHER.find(query)}
+    assert KEYWORD_MATCHER.classify(query) == "TECH"
+
+
+@pytest.mark.parametrize(("query", "keyword"), [
+    ("going home", "go"),
+    ("google maps", "go"),
+    ("javascript closures", "java"),
+    ("cat pictures", "c"),
+    ("iphone case", "ip"),
+])
+def test_keywords_only_match_whole_words(query, keyword):
+    assert keyword not in {hit.keyword for hit in KEYWORD_MATCHER.find(query)}
+
+
+def test_inflection_is_limited_to_the_inflected_categories():
+    matcher = KeywordMatcher({"NON_TECH": ["match"], "TECH": ["regex"]}, inflected=("TECH",))
+    assert matcher.classify("pattern matching regexes") == "TECH"
+    assert matcher.classify("football match") == "NON_TECH"
+
+
+def test_hit_spans_cover_the_whole_word():
+    query = "flashing roms"
+    spans = {query[hit.start:hit.end] for hit in KEYWORD_MATCHER.find(query)}
+    assert spans == {"flashing", "roms"}
@@ -0,0 +1,24 @@
+from local_index import LocalIndex
+
+RESULTS = [{"title": "Python asyncio", "snippet": "event loop tasks", "url": "https://example.com/asyncio"}]
+
+
+def test_feed_is_searchable_after_close_flushes_writes(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = LocalIndex(path, max_docs=100, max_age=3600)
+    index.feed("python asyncio", RESULTS)
+    index.close()
+    reopened = LocalIndex(path, max_docs=100, max_age=3600)
+    assert reopened.search("python asyncio") == RESULTS
+    reopened.close()
+
+
+def test_stats_and_reads_after_close_do_not_raise(tmp_path):
+    index = LocalIndex(str(tmp_path / "index.db"), max_docs=100, max_age=3600)
+    index.close()
+    assert index.stats()["docs"] is None
+    assert index.search("python asyncio") == []
+    assert index.answer("python asyncio") is None
+    index.feed("python asyncio", RESULTS)
+    assert index.stats()["dropped"] == 1
+    index.close()
@@ -0,0 +1,42 @@
+import pytest
+
+from local_rewriter import LocalRewriter
+
+
+@pytest.fixture
+def rewriter():
+    return LocalRewriter()
+
+
+@pytest.mark.parametrize("query", [
+    "hello world program in python",
+    "hello, world program in python",
+    "just in time compiler java",
+    "really simple syndication rss python",
+    "actually typed python",
+    "what does ts mean in react",
+    "ml to oz conversion python",
+])
+def test_meaningful_words_are_not_dropped_or_expanded(rewriter, query):
+    # Either left alone for the LLM, or rewritten without losing a word
+    improved = rewriter.rewrite(query)
+    assert improved is None or set(query.lower().replace(",", "").split()) <= set(improved.lower().split())
+
+
+@pytest.mark.parametrize(("query", "expected"), [
+    ("pls help k8s pod CrashLoopBackOff??", "kubernetes pod CrashLoopBackOff"),
+    ("hey guys, docker container exits immediately", "docker container exits immediately"),
+    ("hi, python list index out of range", "python list index out of range"),
+    ("hello! docker compose volumes not mounting", "docker compose volumes not mounting"),
+    ("py script cant find module", "python script cannot find module"),
+])
+def test_mechanical_rewrites(rewriter, query, expected):
+    assert rewriter.rewrite(query) == expected
+
+
+def test_greeting_is_only_stripped_at_the_start(rewriter):
+    assert rewriter.rewrite("python print hello, world") is None
+
+
+def test_rewrite_must_stay_tech(rewriter):
+    assert rewriter.rewrite("pls help what is the weather today") is None
@@ -0,0 +1,109 @@
+import pytest
+
+import config
+import pagination
+from pagination import InvalidCursor, PageSessionPool, _b64, _unb64, decode_cursor, encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("python asyncio tutorial", 10, 5)
+    assert decode_cursor(cursor) == ("python asyncio tutorial", 10, 5)
+
+
+def test_cursor_with_swapped_payload_is_rejected():
+    # A signature from a classified query must not vouch for another query
+    _, signature = encode_cursor("python asyncio tutorial", 5, 5).split(".")
+    payload, _ = encode_cursor("best pizza recipe", 5, 5).split(".")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(f"{payload}.{signature}")
+
+
+def test_cursor_with_edited_offset_is_rejected():
+    payload, signature = encode_cursor("python asyncio tutorial", 5, 5).split(".")
+    edited = _unb64(payload).replace(b'"o":5', b'"o":50')
+    with pytest.raises(InvalidCursor):
+        decode_cursor(f"{_b64(edited)}.{signature}")
+
+
+@pytest.mark.parametrize("cursor", ["", "no-dot", "abc.def", "!!!.???", "e30.AAAA"])
+def test_malformed_or_unsigned_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+async def test_forged_cursor_gets_400(client):
+    _, signature = encode_cursor("python asyncio tutorial", 5, 5).split(".")
+    payload, _ = encode_cursor("best pizza recipe", 5, 5).split(".")
+    response = await client.get("/search/paged", params={"cursor": f"{payload}.{signature}"})
+    assert response.status_code == 400
+
+
+class FakePages:
+    """Stands in for ddg_page: numbered results, or an error while `down`"""
+
+    def __init__(self):
+        self.calls = []
+        self.down = False
+
+    def __call__(self, query, page, max_results, ddgs=None):
+        self.calls.append((page, ddgs))
+        if self.down:
+            raise ConnectionError("DDG unreachable")
+        first = (page - 1) * max_results
+        return [{"title": str(i), "snippet": "", "url": f"https://example.com/{i}"}
+                for i in range(first, first + max_results)]
+
+
+@pytest.fixture
+def pages(monkeypatch, client):
+    fake = FakePages()
+    monkeypatch.setattr(pagination, "ddg_page", fake)
+    monkeypatch.setattr(config, "PAGE_FETCH_SIZE", 10)
+    pagination.PAGE_SESSIONS.close()
+    return fake
+
+
+async def test_upstream_page_is_shared_by_client_pages(client, pages):
+    first = (await client.post("/search/paged", json={"query": "python asyncio tutorial", "page_size": 5})).json()
+    second = (await client.get("/search/paged", params={"cursor": first["next_cursor"]})).json()
+    third = (await client.get("/search/paged", params={"cursor": second["next_cursor"]})).json()
+    assert [r["url"][-2:].strip("/") for r in first["results"] + second["results"] + third["results"]] == [
+        str(i) for i in range(15)
+    ]
+    # Two upstream pages for three client pages, through DDG_URL rather than a DDGS client
+    assert pages.calls == [(1, None), (2, None)]
+
+
+async def test_upstream_failure_is_an_error_not_an_empty_page(client, pages):
+    pages.down = True
+    response = await client.post("/search/paged", json={"query": "python asyncio tutorial", "page_size": 5})
+    assert response.status_code == 502
+
+    pages.down = False
+    first = (await client.post("/search/paged", json={"query": "python asyncio tutorial", "page_size": 10})).json()
+    pages.down = True
+    response = await client.get("/search/paged", params={"cursor": first["next_cursor"]})
+    assert response.status_code == 502
+    # The session was not marked exhausted: the same cursor works once DDG is back
+    pages.down = False
+    response = await client.get("/search/paged", params={"cursor": first["next_cursor"]})
+    assert response.json()["count"] == 10
+
+
+class Client:
+    closed = 0
+
+    def __exit__(self, *exc):
+        Client.closed += 1
+
+
+def test_session_evicted_while_in_use_is_closed_when_released():
+    pool = PageSessionPool(max_sessions=1, idle_ttl=60, max_lifetime=60)
+    busy = pool.acquire("python asyncio tutorial")
+    busy.ddgs = Client()
+    pool.acquire("rust borrow checker")
+    assert busy.evicted and Client.closed == 0
+    pool.release(busy)
+    assert Client.closed == 1
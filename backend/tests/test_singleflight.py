@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import config
+import deadline
+import pipeline
+from cache import canonical_query
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+class Work:
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "answer"
+
+
+async def test_concurrent_callers_share_one_execution():
+    flight, work = SingleFlight("test"), Work()
+    results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+    assert results == ["answer"] * 5
+    assert work.started == 1
+    assert flight.stats()["coalesced"] == 4
+
+
+async def test_work_survives_while_any_waiter_remains():
+    flight, work = SingleFlight("test"), Work()
+    first = asyncio.create_task(flight.do("k", work))
+    second = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "answer"
+    assert work.cancelled == 0
+
+
+async def test_work_is_cancelled_when_the_last_waiter_leaves():
+    flight, work = SingleFlight("test"), Work()
+    waiter = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    await asyncio.sleep(0)
+    assert work.cancelled == 1
+    assert flight.stats() == {"executions": 1, "coalesced": 0, "abandoned": 1, "inflight": 0}
+    # The next caller starts afresh rather than joining the cancelled run
+    assert await flight.do("k", work) == "answer"
+    assert work.started == 2
+
+
+async def test_shared_work_does_not_run_in_the_first_callers_context():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        deadline.degrade("inside_shared_work")
+        return deadline.remaining()
+
+    with deadline.budget(0.5) as first:
+        seen = await asyncio.gather(flight.do("k", work), flight.do("k", work))
+    assert seen == [None, None]
+    assert first.degraded == []
+
+
+@pytest.mark.parametrize("budget", [None, 5.0])
+async def test_cancelled_speculative_improve_stops_the_gemini_call(client, upstream, monkeypatch, budget):
+    monkeypatch.setattr(config, "SPECULATIVE_MODE", "improve")
+    monkeypatch.setattr(config, "LLM_COMBINED_ENABLED", False)
+    upstream.label = "NON_TECH"
+    upstream.improve_delay = 0.2
+    query = "how do ocean tides work"
+
+    with deadline.budget(budget):
+        outcome = await pipeline.run_search(query)
+    await asyncio.sleep(0.3)
+
+    assert outcome["category"] == "NON_TECH"
+    assert outcome["speculation"]["cancelled"] == ["improve"]
+    # Had the call carried on, its rewrite would now be memoised
+    assert pipeline.REWRITE_CACHE.peek(canonical_query(query)) is None
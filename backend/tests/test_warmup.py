@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+
+from warmup import QueryLog, top_queries
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["query"] for line in f]
+
+
+def test_queries_are_written_off_the_caller(tmp_path):
+    path = str(tmp_path / "queries.jsonl")
+    log = QueryLog(path)
+    for query in ("python asyncio", "rust lifetimes", "python asyncio"):
+        log.write(query)
+    log.close()
+    assert read(path) == ["python asyncio", "rust lifetimes", "python asyncio"]
+    assert log.stats()["written"] == 3
+    # Closed logs ignore writes instead of failing the request
+    log.write("late query")
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"), max_pending=0)
+    log.write("python asyncio")
+    log.close()
+    assert log.stats()["dropped"] == 1
+
+
+def test_log_rotates_at_max_bytes_and_warmup_reads_both(tmp_path):
+    path = str(tmp_path / "queries.jsonl")
+    log = QueryLog(path, max_bytes=200)
+    for i in range(6):
+        log.write(f"kubernetes pod error {i}")
+    log.close()
+
+    assert log.stats()["rotations"] >= 1
+    assert os.path.getsize(path) <= 200 and os.path.getsize(path + ".1") <= 200
+    current, rotated = read(path), read(path + ".1")
+    assert rotated + current == [f"kubernetes pod error {i}" for i in range(6 - len(rotated + current), 6)]
+    assert set(top_queries([path], 10)) == set(rotated + current)
+
+
+def test_verdicts_are_logged_off_the_event_loop(tmp_path, monkeypatch):
+    import pipeline
+    from warmup import JsonlLog
+
+    path = str(tmp_path / "verdicts.jsonl")
+    log = JsonlLog(path, name="verdict-log")
+    monkeypatch.setattr(pipeline, "VERDICT_LOG", log)
+    writers = []
+    append = log._append
+    monkeypatch.setattr(log, "_append", lambda line: writers.append(threading.current_thread().name) or append(line))
+
+    pipeline._record_verdict("how do ocean tides work", None, "NON_TECH")
+    log.close()
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [
+            {"query": "how do ocean tides work", "label": "NON_TECH", "source": "llm"}
+        ]
+    assert writers == ["verdict-log_0"]
@@ -0,0 +1,112 @@
+"""Train and evaluate the local intent classifier.
+
+Training data is JSONL with one {"query": ..., "label": "TECH"|"NON_TECH"}
+per line -- the same shape the verdict log (VERDICT_LOG_PATH) records for
+every Gemini classification.
+
+Usage:
+    python train_classifier.py train labelled.jsonl verdicts.jsonl --out intent_model.npz
+    python train_classifier.py eval intent_model.npz heldout.jsonl
+"""
+import argparse
+import json
+import random
+import time
+
+import config
+from local_classifier import LABELS, LocalClassifier, evaluate
+
+
+def load_examples(paths):
+    queries, labels = [], []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                if row.get("label") in LABELS and row.get("query"):
+                    queries.append(row["query"])
+                    labels.append(row["label"])
+    return queries, labels
+
+
+def keyword_examples():
+    # The keyword taxonomies are free, if terse, labelled data
+    from langchain_logic import NON_TECH_KEYWORDS, TECH_KEYWORDS
+    queries = [k.strip() for k in TECH_KEYWORDS] + [k.strip() for k in NON_TECH_KEYWORDS]
+    labels = ["TECH"] * len(TECH_KEYWORDS) + ["NON_TECH"] * len(NON_TECH_KEYWORDS)
+    return queries, labels
+
+
+def print_report(report):
+    for key, value in report.items():
+        print(f"  {key:<24} {value}")
+
+
+def cmd_train(args):
+    queries, labels = load_examples(args.data)
+    if args.with_keywords:
+        extra_queries, extra_labels = keyword_examples()
+        queries += extra_queries
+        labels += extra_labels
+    if not queries:
+        raise SystemExit("No labelled examples found")
+
+    pairs = list(zip(queries, labels))
+    random.Random(args.seed).shuffle(pairs)
+    cut = int(len(pairs) * (1 - args.holdout)) if args.holdout else len(pairs)
+    train, test = pairs[:cut], pairs[cut:]
+
+    start = time.perf_counter()
+    model = LocalClassifier.train(
+        [q for q, _ in train], [l for _, l in train],
+        dim=2 ** args.bits, epochs=args.epochs, lr=args.lr,
+    )
+    print(f"Trained on {len(train)} examples in {time.perf_counter() - start:.2f}s")
+    model.save(args.out)
+    print(f"Saved model to {args.out}")
+
+    if test:
+        print(f"Held-out evaluation ({len(test)} examples, threshold {args.threshold}):")
+        print_report(evaluate(model, [q for q, _ in test], [l for _, l in test], args.threshold))
+
+
+def cmd_eval(args):
+    model = LocalClassifier.load(args.model)
+    queries, labels = load_examples(args.data)
+    print(f"Evaluation ({len(queries)} examples, threshold {args.threshold}):")
+    print_report(evaluate(model, queries, labels, args.threshold))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train / evaluate the local intent classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train")
+    train.add_argument("data", nargs="*", help="JSONL files of labelled queries")
+    train.add_argument("--out", default="intent_model.npz")
+    train.add_argument("--with-keywords", action="store_true", help="add the keyword taxonomies as examples")
+    train.add_argument("--holdout", type=float, default=0.2)
+    train.add_argument("--bits", type=int, default=18, help="feature space is 2**bits")
+    train.add_argument("--epochs", type=int, default=100)
+    train.add_argument("--lr", type=float, default=0.5)
+    train.add_argument("--threshold", type=float, default=config.LOCAL_MODEL_THRESHOLD,
+                       help="confidence the server needs to trust the model (LOCAL_MODEL_THRESHOLD)")
+    train.add_argument("--seed", type=int, default=0)
+    train.set_defaults(func=cmd_train)
+
+    evaluate_cmd = sub.add_parser("eval")
+    evaluate_cmd.add_argument("model")
+    evaluate_cmd.add_argument("data", nargs="+")
+    evaluate_cmd.add_argument("--threshold", type=float, default=config.LOCAL_MODEL_THRESHOLD,
+                              help="confidence the server needs to trust the model (LOCAL_MODEL_THRESHOLD)")
+    evaluate_cmd.set_defaults(func=cmd_eval)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
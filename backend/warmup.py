@@ -0,0 +1,225 @@
+"""Startup cache warm-up from historical query logs, plus readiness.
+
+Every query handled is appended to QUERY_LOG_PATH (JSONL, {"query", "ts"}),
+rotated to QUERY_LOG_PATH.1 once it reaches QUERY_LOG_MAX_BYTES.
+On startup the most frequent WARMUP_TOP_N queries from WARMUP_LOG_PATHS are
+replayed through run_search in the background, at most WARMUP_RATE_PER_S,
+so verdicts, rewrites and search results are cached before real traffic
+asks for them. Any JSONL with a "query" field works, including the verdict
+log. /ready reports 503 until WARMUP_READY_FRACTION of them are done.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter as Tally
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from cache import canonical_query
+from metrics import Gauge
+
+logger = logging.getLogger("TechSearch")
+
+WARMUP_PROGRESS = Gauge("techsearch_warmup_progress", "Fraction of warm-up queries replayed")
+
+
+class JsonlLog:
+    """Append-only JSONL file of records.
+
+    Lines are written on a single background thread, as LocalIndex does, so
+    a slow disk never holds up the event loop; past `max_pending` queued
+    lines new ones are dropped. A file reaching `max_bytes` (0 = no cap)
+    is rotated to <path>.1, replacing the previous one.
+    """
+
+    def __init__(self, path, max_bytes=0, max_pending=1000, name="jsonl-log"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        if path:
+            self._file = open(path, "a", encoding="utf-8")
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    def append(self, record):
+        """Queues one line; never blocks the caller"""
+        if self._writer is None:
+            return
+        if self._pending >= self.max_pending:
+            self.dropped += 1
+            return
+        with self._pending_lock:
+            self._pending += 1
+        self._writer.submit(self._append, json.dumps(record) + "\n")
+
+    def _append(self, line):
+        try:
+            if self.max_bytes and self._file.tell() + len(line) > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+            self.written += 1
+        except Exception as e:
+            logger.error(f"Query log write failed: {e}")
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    def _rotate(self):
+        self._file.close()
+        os.replace(self.path, self.path + ".1")
+        self._file = open(self.path, "a", encoding="utf-8")
+        self.rotations += 1
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        return {
+            "path": self.path or None,
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": self._pending,
+            "rotations": self.rotations,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class QueryLog(JsonlLog):
+    """Log of incoming queries: {"query", "ts"} per line"""
+
+    def __init__(self, path, max_bytes=0, max_pending=1000):
+        super().__init__(path, max_bytes, max_pending, name="query-log")
+
+    def write(self, query):
+        self.append({"query": query, "ts": round(time.time(), 3)})
+
+
+def top_queries(paths, limit):
+    """Most frequent queries across JSONL logs (and their rotated .1), by canonical form"""
+    counts = Tally()
+    sample = {}
+    for path in paths:
+        if not os.path.exists(path):
+            logger.warning(f"Warm-up log not found: {path}")
+            continue
+        for part in (path + ".1", path):
+            if not os.path.exists(part):
+                continue
+            with open(part, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        query = json.loads(line).get("query")
+                    except ValueError:
+                        continue
+                    key = canonical_query(query) if isinstance(query, str) else None
+                    if key:
+                        counts[key] += 1
+                        sample.setdefault(key, query.strip())
+    return [sample[key] for key, _ in counts.most_common(limit)]
+
+
+class WarmUp:
+    def __init__(self, paths, top_n, rate, ready_fraction, ready_timeout):
+        self.paths = paths
+        self.top_n = top_n
+        self.rate = rate
+        self.ready_fraction = ready_fraction
+        self.ready_timeout = ready_timeout
+        self.state = "idle"
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.started_at = None
+        self.finished_at = None
+        self._task = None
+
+    def start(self, run_search):
+        if self.paths and self.top_n > 0:
+            self.started_at = time.monotonic()
+            self._task = asyncio.create_task(self._run(run_search))
+
+    async def _run(self, run_search):
+        self.state = "loading"
+        try:
+            queries = await asyncio.get_running_loop().run_in_executor(None, top_queries, self.paths, self.top_n)
+            self.total = len(queries)
+            self.state = "running"
+            logger.info(f"Warming caches with {self.total} logged queries at {self.rate}/s")
+            interval = 1.0 / self.rate if self.rate > 0 else 0.0
+            for query in queries:
+                tick = time.monotonic()
+                try:
+                    await run_search(query)
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Warm-up failed for {query!r}: {e}")
+                self.done += 1
+                WARMUP_PROGRESS.set(self.progress())
+                await asyncio.sleep(max(0.0, interval - (time.monotonic() - tick)))
+            self.state = "finished"
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except Exception as e:
+            self.state = "failed"
+            logger.error(f"Warm-up aborted: {e}")
+        finally:
+            self.finished_at = time.monotonic()
+            WARMUP_PROGRESS.set(self.progress())
+
+    def progress(self):
+        if self.state == "loading":
+            return 0.0
+        return self.done / self.total if self.total else 1.0
+
+    def ready(self):
+        """Whether the load balancer should send traffic yet"""
+        if self._task is None or self.state in ("finished", "failed", "cancelled"):
+            return True
+        if time.monotonic() - self.started_at >= self.ready_timeout:
+            # Better to serve cold than to stay out of rotation forever
+            return True
+        return self.state == "running" and self.progress() >= self.ready_fraction
+
+    def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def stats(self):
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at if self.started_at else 0.0
+        remaining = self.total - self.done
+        return {
+            "state": self.state,
+            "ready": self.ready(),
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "progress": round(self.progress(), 4),
+            "ready_fraction": self.ready_fraction,
+            "elapsed_s": round(elapsed, 1),
+            "eta_s": round(remaining / self.rate, 1) if self.rate > 0 and self.state == "running" else None,
+        }
+
+
+QUERY_LOG = QueryLog(config.QUERY_LOG_PATH, max_bytes=config.QUERY_LOG_MAX_BYTES)
+WARMUP = WarmUp(
+    [path.strip() for path in config.WARMUP_LOG_PATHS.split(",") if path.strip()],
+    top_n=config.WARMUP_TOP_N,
+    rate=config.WARMUP_RATE_PER_S,
+    ready_fraction=config.WARMUP_READY_FRACTION,
+    ready_timeout=config.WARMUP_READY_TIMEOUT,
+)